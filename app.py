@@ -5,22 +5,45 @@ This module provides the application factory pattern for creating Flask app inst
 Routes are organized in separate blueprint modules in the routes package.
 """
 
+import os
+
 from flask import Flask
+import borrow_export
+import bulk_import
+import database
+import metrics
+import overdue
+import sql_trace
 from database import init_database, add_sample_data
 from routes import register_blueprints
 
 
-def create_app():
+def create_app(config=None):
     """
     Application factory function to create and configure Flask app.
     
+    Args:
+        config: Optional mapping of settings applied on top of the defaults
+            (e.g. DATABASE, DB_POOL_MAX_SIZE)
+    
     Returns:
         Flask: Configured Flask application instance
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    if config:
+        app.config.update(config)
+    
+    # Per-endpoint latency and SQL statement metrics, scraped from /metrics
+    metrics.init_app(app)
+    
+    # Opt-in slow-query log and per-statement totals (SQL_TRACE_ENABLED)
+    sql_trace.init_app(app)
     
-    # Initialize the database
+    # Set up pooled connections, reused per request and released on teardown
+    database.init_app(app)
+    
+    # Initialize the database and bring the schema up to date
     init_database()
     
     # Add sample data for testing and demonstration
@@ -29,9 +52,21 @@ def create_app():
     # Register all route blueprints
     register_blueprints(app)
     
+    # Register CLI commands (flask import-books, flask export-borrows ...)
+    bulk_import.init_app(app)
+    borrow_export.init_app(app)
+    
+    # Keep overdue loans and their fees materialized (flask sweep-overdue)
+    overdue.init_app(app)
+    
     return app
 
 
 if __name__ == '__main__':
+    # Development server with the debugger; serve.py runs the app in production
     app = create_app()
+    # The reloader re-runs this file in a child process, which serves the
+    # requests; only that one gets an overdue sweeper
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        app.extensions['overdue'].start()
     app.run(debug=True, host='0.0.0.0', port=5000)
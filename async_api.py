@@ -0,0 +1,396 @@
+"""
+Async API module for Library Management System
+ASGI front end serving the search and late-fee API without a thread per client
+
+    uvicorn --factory async_api:create_asgi_app
+
+GET /api/search, GET /api/late_fee/<patron_id>/<book_id> and POST
+/api/late_fees are answered by coroutines that hand their database work to a
+bounded thread pool, so waiting clients cost a coroutine each rather than a
+worker thread. Every other request is passed on to the Flask app on a
+smaller pool of its own. Responses carry the same JSON as the Flask /api
+routes, and all requests are counted in /metrics under the Flask endpoint
+names.
+"""
+
+import asyncio
+import contextvars
+import io
+import json
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags
+
+import catalog_version
+import database
+import metrics
+from library_service import calculate_late_fees_batch
+from routes.api_routes import _cached_search_results, _parse_late_fee_request
+from services.library_service import calculate_late_fee_for_book
+
+DEFAULT_CHUNK_SIZE = 500
+NDJSON = 'application/x-ndjson'
+# Rows per body message of a late_fees response
+SEND_ROWS = 1000
+# Body chunks of a Flask response buffered ahead of the client
+WSGI_QUEUE_SIZE = 8
+
+Headers = List[Tuple[bytes, bytes]]
+
+class Request:
+    """The parts of an ASGI HTTP request the handlers read."""
+
+    def __init__(self, scope: Dict, body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.args: Dict[str, str] = {}
+        for key, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(key, value)   # first value wins, like request.args.get()
+        self.headers: Dict[str, str] = {}
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[name] = f'{self.headers[name]},{value}' if name in self.headers else value
+        self.body = body
+
+    def get_json(self):
+        """The JSON body, or None if it is missing, not JSON or malformed (get_json(silent=True))."""
+        mimetype = self.headers.get('content-type', '').split(';', 1)[0].strip().lower()
+        if not (mimetype == 'application/json'
+                or (mimetype.startswith('application/') and mimetype.endswith('+json'))):
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+class AsyncAPI:
+    """
+    ASGI application in front of a Flask app from create_app().
+
+    Blocking calls run on ``threads`` worker threads (default: the database
+    pool size, as more could only wait for a connection) inside the Flask
+    app's context, so the search cache, catalog validators and JSON settings
+    are the Flask app's own. Batch late-fee requests are split into chunks of
+    ``chunk_size`` that are computed concurrently and answered in order.
+
+    Requests passed on to Flask run on ``wsgi_threads`` threads of their own
+    (default: half of ``threads``, at least one). A Flask response keeps its
+    thread, and its pooled connection, until the client has read the body,
+    so slow downloads queue up there instead of taking the threads and
+    connections the API routes need.
+    """
+
+    def __init__(self, flask_app, threads: Optional[int] = None, chunk_size: Optional[int] = None,
+                 wsgi_threads: Optional[int] = None):
+        config = flask_app.config
+        self.flask_app = flask_app
+        self.threads = threads or config.setdefault('ASYNC_API_THREADS', database.POOL_OPTIONS['max_size'])
+        self.chunk_size = chunk_size or config.setdefault('ASYNC_API_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        self.wsgi_threads = wsgi_threads or config.setdefault('ASYNC_API_WSGI_THREADS',
+                                                              max(1, self.threads // 2))
+        self.metrics = config.get('METRICS_ENABLED', True)
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='async-api')
+        self.wsgi_executor = ThreadPoolExecutor(max_workers=self.wsgi_threads, thread_name_prefix='async-api-wsgi')
+        # (method, path pattern, Flask endpoint name for metrics, handler)
+        self.routes: List[Tuple[str, re.Pattern, str, Callable]] = [
+            ('GET', re.compile(r'/api/search'), 'api.search_books_api', self.search_books),
+            ('GET', re.compile(r'/api/late_fee/(?P<patron_id>[^/]+)/(?P<book_id>\d+)'), 'api.get_late_fee',
+             self.late_fee),
+            ('POST', re.compile(r'/api/late_fees'), 'api.get_late_fees_batch', self.late_fees_batch),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        max_length = self.flask_app.config.get('MAX_CONTENT_LENGTH')
+        body = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            size += len(body[-1])
+            if max_length is not None and size > max_length:
+                await self._respond(send, 413, self._json({'error': 'Request body too large'}))
+                return
+            if not message.get('more_body'):
+                break
+        request = Request(scope, b''.join(body))
+
+        for method, pattern, endpoint, handler in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match and request.method == method:
+                await self._handle(endpoint, handler, request, send, match.groupdict())
+                return
+        await self._wsgi(scope, request.body, send)
+
+    async def _handle(self, endpoint: str, handler: Callable, request: Request, send, params: Dict) -> None:
+        """Run a route handler, recording it in metrics as Flask's request hooks would."""
+        if not self.metrics:
+            await handler(request, send, **params)
+            return
+        status = 500
+
+        async def send_and_note_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        state = metrics.begin_request()
+        try:
+            await handler(request, send_and_note_status, **params)
+        finally:
+            metrics.end_request(state, endpoint, status)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def close(self) -> None:
+        """Stop the thread pools and close the pooled connections."""
+        self.wsgi_executor.shutdown(wait=True)
+        self.executor.shutdown(wait=True)
+        database.reset_pool()
+
+    def _in_context(self, fn, args):
+        with self.flask_app.app_context():
+            return fn(*args)
+
+    async def run(self, fn: Callable, *args):
+        """
+        Run fn(*args) on the thread pool, in the Flask app's context and a
+        copy of the caller's context variables (the request's SQL counter).
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run,
+                                                                self._in_context, fn, args)
+
+    def _json(self, obj) -> bytes:
+        """Serialize like jsonify(): the app's JSON provider, compact unless in debug mode."""
+        provider = self.flask_app.json
+        if (provider.compact is None and self.flask_app.debug) or provider.compact is False:
+            text = provider.dumps(obj, indent=2)
+        else:
+            text = provider.dumps(obj, separators=(',', ':'))
+        return f'{text}\n'.encode('utf-8')
+
+    async def _respond(self, send, status: int, body: bytes, headers: Headers = (),
+                       content_type: Optional[str] = None) -> None:
+        headers = list(headers)
+        if status != 304:
+            content_type = content_type or self.flask_app.json.mimetype
+            headers += [(b'content-type', content_type.encode('latin-1')),
+                        (b'content-length', str(len(body)).encode('ascii'))]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body if status != 304 else b''})
+
+    async def search_books(self, request: Request, send) -> None:
+        """GET /api/search, with the validators of catalog_conditional."""
+        await self.run(database.sync_catalog_version)
+        etag, last_modified = catalog_version.validators(database.DATABASE)
+        validators = [(b'etag', f'"{etag}"'.encode('latin-1')), (b'cache-control', b'no-cache')]
+        if last_modified is not None:
+            validators.append((b'last-modified', http_date(last_modified).encode('latin-1')))
+        if self._is_current(request, etag, last_modified):
+            await self._respond(send, 304, b'', validators)
+            return
+
+        search_term = request.args.get('q', '').strip()
+        search_type = request.args.get('type', 'title')
+        if not search_term:
+            await self._respond(send, 400, self._json({'error': 'Search term is required'}))
+            return
+
+        count, results = await self.run(_cached_search_results, search_term, search_type)
+        dumps = self.flask_app.json.dumps
+        body = b''.join((
+            b'{"count":', str(count).encode('ascii'),
+            b',"results":', results,
+            b',"search_term":', dumps(search_term).encode('utf-8'),
+            b',"search_type":', dumps(search_type).encode('utf-8'),
+            b'}\n',
+        ))
+        await self._respond(send, 200, body, validators)
+
+    @staticmethod
+    def _is_current(request: Request, etag: str, last_modified: Optional[int]) -> bool:
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match:
+            return parse_etags(if_none_match).contains_weak(etag)
+        since = parse_date(request.headers.get('if-modified-since'))
+        return since is not None and last_modified is not None and int(since.timestamp()) >= last_modified
+
+    async def late_fee(self, request: Request, send, patron_id: str, book_id: str) -> None:
+        """GET /api/late_fee/<patron_id>/<book_id>."""
+        result = await self.run(calculate_late_fee_for_book, patron_id, int(book_id))
+        status = 501 if 'not implemented' in result.get('status', '') else 200
+        await self._respond(send, status, self._json(result))
+
+    async def late_fees_batch(self, request: Request, send) -> None:
+        """
+        POST /api/late_fees: the batch is split into chunks that run
+        concurrently, all as of the same moment, and are joined in order.
+        Patron ids are sorted and deduplicated first, so the joined chunks
+        keep the single query's patron, borrow-date order.
+        """
+        loans, patron_ids, error = _parse_late_fee_request(request.get_json())
+        if error:
+            await self._respond(send, 400, self._json({'error': error}))
+            return
+
+        now = datetime.now()
+        items = loans if loans is not None else sorted(set(patron_ids))
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        if loans is not None:
+            calls = [self.run(_list_late_fees, chunk, None, now) for chunk in chunks]
+        else:
+            calls = [self.run(_list_late_fees, None, chunk, now) for chunk in chunks]
+        rows = list(chain.from_iterable(await asyncio.gather(*calls)))
+
+        dumps = self.flask_app.json.dumps
+        if self._wants_ndjson(request):
+            pieces = (dumps(row, separators=(',', ':')) + '\n' for row in rows)
+            await self._stream(send, pieces, NDJSON)
+            return
+        total = round(sum(row['fee_amount'] for row in rows), 2)
+        pieces = chain(['{"results":['],
+                       ((',' if i else '') + dumps(row, separators=(',', ':')) for i, row in enumerate(rows)),
+                       [f'],"count":{len(rows)},"total_fees":{total}}}\n'])
+        await self._stream(send, pieces, self.flask_app.json.mimetype)
+
+    @staticmethod
+    def _wants_ndjson(request: Request) -> bool:
+        fmt = request.args.get('format')
+        if fmt is not None:
+            return fmt == 'ndjson'
+        accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+        return accept.best_match(['application/json', NDJSON]) == NDJSON
+
+    async def _stream(self, send, pieces, content_type: str) -> None:
+        """Send text pieces as a chunked body, SEND_ROWS pieces per message."""
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', content_type.encode('latin-1'))]})
+        pieces = iter(pieces)
+        while True:
+            batch = ''.join(next(pieces, '') for _ in range(SEND_ROWS))
+            if not batch:
+                break
+            await send({'type': 'http.response.body', 'body': batch.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _wsgi(self, scope, body: bytes, send) -> None:
+        """
+        Serve a request with the Flask app on the WSGI thread pool.
+
+        The response body is iterated by a single pool thread, as generators
+        wrapped in stream_with_context must resume where they started, and
+        handed over through a small queue, so a slow client holds the thread
+        back instead of the body piling up in memory.
+        """
+        environ = _wsgi_environ(scope, body)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=WSGI_QUEUE_SIZE)
+        closed = threading.Event()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                  for name, value in headers]
+
+        def put(item) -> bool:
+            if closed.is_set():
+                return False
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            return True
+
+        def produce():
+            try:
+                iterable = self.flask_app(environ, start_response)
+                try:
+                    for chunk in iterable:
+                        if chunk and not put(chunk):
+                            return
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+            except BaseException as e:
+                put(e)
+            else:
+                put(None)
+
+        producer = loop.run_in_executor(self.wsgi_executor, produce)
+        try:
+            item = await queue.get()
+            if isinstance(item, BaseException):
+                raise item
+            await send({'type': 'http.response.start', 'status': started['status'],
+                        'headers': started['headers']})
+            while item is not None:
+                await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+                item = await queue.get()
+                if isinstance(item, BaseException):
+                    raise item
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Unblock a producer waiting on a full queue, then let it finish
+            closed.set()
+            while not queue.empty():
+                queue.get_nowait()
+            await producer
+
+def _list_late_fees(loans, patron_ids, now):
+    return list(calculate_late_fees_batch(loans, patron_ids, now))
+
+def _wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """PEP 3333 environ for an ASGI HTTP scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', ()):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def create_asgi_app(config=None) -> AsyncAPI:
+    """ASGI application factory: create_app(config) behind AsyncAPI."""
+    from app import create_app
+    return AsyncAPI(create_app(config))
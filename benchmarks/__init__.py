@@ -0,0 +1,6 @@
+"""
+Benchmarks for the Library Management System business-logic hot paths,
+and a load generator for the web application.
+Run with: python -m benchmarks.run --help
+          python -m benchmarks.load --help
+"""
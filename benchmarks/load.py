@@ -0,0 +1,478 @@
+"""
+Load generator for the web application
+Drives a weighted mix of borrow, return, search, late-fee and catalog
+requests from worker threads, in process through the Flask test client or
+against a running server, and reports throughput, errors and latency
+percentiles overall, per operation and per second of the run
+
+    python -m benchmarks.load --seed 100000 --threads 32 --ramp-up 30 --duration 60
+    python -m benchmarks.load --url http://127.0.0.1:5000 --books 100000 --patrons 25000
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from . import seed
+
+# Relative weights of the operations in a run
+DEFAULT_MIX = {
+    'borrow': 15,
+    'return': 15,
+    'search': 15,
+    'api_search': 25,
+    'late_fee': 20,
+    'catalog': 10,
+}
+SEARCH_TERMS = tuple(word.lower() for word in seed.NOUNS + seed.ADJECTIVES) + tuple(
+    f'{adjective} {noun}'.lower() for adjective, noun in zip(seed.ADJECTIVES, seed.NOUNS))
+PERCENTILES = (50.0, 75.0, 90.0, 95.0, 99.0, 99.9, 99.99, 100.0)
+DEFAULT_BOOKS = 1000   # for --url runs without --books
+
+# (method, path, form data or None) -> HTTP status; raises on transport errors
+Send = Callable[[str, str, Optional[Dict]], int]
+
+class LatencyHistogram:
+    """
+    HDR-style latency histogram with a fixed relative precision.
+
+    Values are recorded in whole microseconds into log-linear buckets: exact
+    below SUB_BUCKETS, then SUB_BUCKETS / 2 buckets per power of two, so any
+    recorded value is reported within 1 / (SUB_BUCKETS / 2) of itself
+    (about 1.6%) whatever its magnitude. Buckets are kept sparse.
+    """
+
+    SUB_BUCKET_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS
+        half = cls.SUB_BUCKETS // 2
+        return cls.SUB_BUCKETS + (shift - 1) * half + (value >> shift) - half
+
+    @classmethod
+    def _highest_value(cls, index: int) -> int:
+        """Largest value recorded into the bucket at index."""
+        if index < cls.SUB_BUCKETS:
+            return index
+        half = cls.SUB_BUCKETS // 2
+        shift, offset = divmod(index - cls.SUB_BUCKETS, half)
+        shift += 1
+        return ((offset + half + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value = max(round(seconds * 1_000_000), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def value_at_percentile(self, percentile: float) -> float:
+        """Latency in seconds at or below which percentile % of the values fall."""
+        if not self.count:
+            return 0.0
+        rank = max(1, min(self.count, int(percentile / 100 * self.count + 0.5)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_value(index), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def mean(self) -> float:
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+
+    def summary(self) -> Dict:
+        """Count, min/mean/max and the PERCENTILES, in milliseconds."""
+        return {
+            'count': self.count,
+            'min_ms': (self.min or 0) / 1000,
+            'mean_ms': self.mean() * 1000,
+            'max_ms': self.max / 1000,
+            'percentiles_ms': {str(p): self.value_at_percentile(p) * 1000 for p in PERCENTILES},
+        }
+
+class ZipfSampler:
+    """
+    Draw ranks 1..n with P(k) proportional to 1 / k**s; s = 0 is uniform.
+
+    The cumulative weights are computed once, so a draw is one bisect and
+    the sampler can be shared by every worker (each passes its own rng).
+    """
+
+    def __init__(self, n: int, s: float):
+        if n < 1:
+            raise ValueError('n must be at least 1')
+        self.n = n
+        self.s = s
+        self._cumulative = list(itertools.accumulate(k ** -s for k in range(1, n + 1)))
+
+    def sample(self, rng: random.Random) -> int:
+        return min(bisect_left(self._cumulative, rng.random() * self._cumulative[-1]), self.n - 1) + 1
+
+class Workload:
+    """
+    Turns the operation mix and the popularity distributions into requests.
+
+    Book ids 1..books and patron ids first_patron.. are drawn from Zipf
+    distributions, so rank 1 (book 1, the first patron) is the most popular.
+    Each worker remembers the loans it asked for, and returns pick from
+    those first, so returns mostly hit open loans.
+    """
+
+    def __init__(self, books: int, patrons: int, mix: Optional[Dict[str, float]] = None,
+                 book_skew: float = 1.1, patron_skew: float = 0.8, first_patron: int = seed.FIRST_PATRON):
+        self.mix = dict(mix or DEFAULT_MIX)
+        unknown = set(self.mix) - set(DEFAULT_MIX)
+        if unknown:
+            raise ValueError(f"unknown operations: {', '.join(sorted(unknown))}")
+        self.operations = [op for op, weight in self.mix.items() if weight > 0]
+        if not self.operations:
+            raise ValueError('the mix needs at least one operation with a positive weight')
+        self._op_cumulative = list(itertools.accumulate(self.mix[op] for op in self.operations))
+        self.books = ZipfSampler(books, book_skew)
+        self.patrons = ZipfSampler(patrons, patron_skew)
+        self.terms = ZipfSampler(len(SEARCH_TERMS), 1.0)
+        self.first_patron = first_patron
+
+    def _patron(self, rng: random.Random) -> str:
+        return str(self.first_patron + self.patrons.sample(rng) - 1)
+
+    def next_request(self, rng: random.Random, loans: deque) -> Tuple[str, str, str, Optional[Dict]]:
+        """(operation, method, path, form data) for the next request of a worker."""
+        op = self.operations[bisect_left(self._op_cumulative, rng.random() * self._op_cumulative[-1])]
+        if op == 'borrow':
+            form = {'patron_id': self._patron(rng), 'book_id': str(self.books.sample(rng))}
+            loans.append(form)
+            return op, 'POST', '/borrow', form
+        if op == 'return':
+            form = loans.popleft() if loans else {'patron_id': self._patron(rng),
+                                                  'book_id': str(self.books.sample(rng))}
+            return op, 'POST', '/return', form
+        if op in ('search', 'api_search'):
+            query = urlencode({'q': SEARCH_TERMS[self.terms.sample(rng) - 1], 'type': 'title'})
+            return op, 'GET', f"{'/api' if op == 'api_search' else ''}/search?{query}", None
+        if op == 'late_fee':
+            return op, 'GET', f'/api/late_fee/{self._patron(rng)}/{self.books.sample(rng)}', None
+        return op, 'GET', '/catalog', None
+
+class TestClientTransport:
+    """Requests through a Flask test client per worker, in this process."""
+
+    def __init__(self, app):
+        self.app = app
+        self.name = 'in-process'
+
+    def session(self) -> Send:
+        client = self.app.test_client()
+
+        def send(method, path, form):
+            response = client.open(path, method=method, data=form)
+            try:
+                response.get_data()
+                return response.status_code
+            finally:
+                response.close()
+        return send
+
+class HTTPTransport:
+    """Requests to a running server, over one keep-alive connection per worker."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f'not an http(s) URL: {base_url}')
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.name = base_url
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def session(self) -> Send:
+        state = {'conn': self._connect()}
+
+        def send(method, path, form):
+            body = urlencode(form) if form is not None else None
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+            try:
+                state['conn'].request(method, self.prefix + path, body=body, headers=headers)
+                response = state['conn'].getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                # Start over on a fresh connection for the next request
+                state['conn'].close()
+                state['conn'] = self._connect()
+                raise
+        return send
+
+class _WorkerStats:
+    def __init__(self):
+        self.latency: Dict[str, LatencyHistogram] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        # second of the run -> [requests, errors, histogram]
+        self.timeline: Dict[int, list] = {}
+
+    def record(self, op: str, second: int, elapsed: float, error: Optional[str]) -> None:
+        self.latency.setdefault(op, LatencyHistogram()).record(elapsed)
+        slot = self.timeline.get(second)
+        if slot is None:
+            slot = self.timeline[second] = [0, 0, LatencyHistogram()]
+        slot[0] += 1
+        slot[2].record(elapsed)
+        if error is not None:
+            slot[1] += 1
+            by_kind = self.errors.setdefault(op, {})
+            by_kind[error] = by_kind.get(error, 0) + 1
+
+def _start_offsets(threads: int, ramp_up: float) -> List[float]:
+    """Seconds after the start at which each worker begins sending."""
+    return [ramp_up * i / threads for i in range(threads)]
+
+def run_load(transport, workload: Workload, threads: int = 8, duration: float = 10.0,
+             ramp_up: float = 0.0, think_time: float = 0.0, rng_seed: int = 0,
+             max_requests: Optional[int] = None) -> Dict:
+    """
+    Run the workload and summarize it.
+
+    Workers start evenly spread over ramp_up seconds and all stop
+    ramp_up + duration seconds after the start (or once max_requests have
+    been sent in total), so the timeline shows latency as concurrency
+    climbs. Each worker is a closed loop: one request at a time, then
+    think_time seconds of pause. A response with status 400 or above, or a
+    transport error, counts as an error; redirects are successes.
+    """
+    offsets = _start_offsets(threads, ramp_up)
+    stats = [_WorkerStats() for _ in range(threads)]
+    budget = itertools.count() if max_requests is None else iter(range(max_requests))
+    stop = threading.Event()
+    started = time.perf_counter()
+    deadline = started + ramp_up + duration
+
+    def worker(index: int) -> None:
+        rng = random.Random(rng_seed * 1_000_003 + index)
+        loans: deque = deque()
+        mine = stats[index]
+        if stop.wait(offsets[index]):
+            return
+        send = transport.session()
+        while not stop.is_set() and time.perf_counter() < deadline:
+            if next(budget, None) is None:
+                break
+            op, method, path, form = workload.next_request(rng, loans)
+            t0 = time.perf_counter()
+            try:
+                status = send(method, path, form)
+                error = f'HTTP {status}' if status >= 400 else None
+            except Exception as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - t0
+            mine.record(op, int(t0 - started), elapsed, error)
+            if think_time:
+                stop.wait(think_time)
+
+    workers = [threading.Thread(target=worker, args=(i,), name=f'load-{i}', daemon=True)
+               for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    try:
+        for thread in workers:
+            thread.join()
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in workers:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    return _summarize(stats, offsets, elapsed, transport, workload, threads, duration, ramp_up, think_time)
+
+def _summarize(stats, offsets, elapsed, transport, workload, threads, duration, ramp_up, think_time) -> Dict:
+    overall = LatencyHistogram()
+    operations = {}
+    for op in workload.operations:
+        histogram = LatencyHistogram()
+        errors: Dict[str, int] = {}
+        for worker in stats:
+            if op in worker.latency:
+                histogram.merge(worker.latency[op])
+            for kind, count in worker.errors.get(op, {}).items():
+                errors[kind] = errors.get(kind, 0) + count
+        overall.merge(histogram)
+        operations[op] = dict(histogram.summary(), errors=sum(errors.values()), error_kinds=errors,
+                              throughput=histogram.count / elapsed if elapsed else 0.0)
+
+    timeline = []
+    for second in sorted({s for worker in stats for s in worker.timeline}):
+        requests = errors = 0
+        histogram = LatencyHistogram()
+        for worker in stats:
+            slot = worker.timeline.get(second)
+            if slot is not None:
+                requests += slot[0]
+                errors += slot[1]
+                histogram.merge(slot[2])
+        timeline.append({
+            'second': second,
+            'threads': sum(1 for offset in offsets if offset <= second + 1),
+            'requests': requests,
+            'errors': errors,
+            'p50_ms': histogram.value_at_percentile(50) * 1000,
+            'p99_ms': histogram.value_at_percentile(99) * 1000,
+            'max_ms': histogram.max / 1000,
+        })
+
+    total_errors = sum(op['errors'] for op in operations.values())
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'target': transport.name,
+            'threads': threads,
+            'duration': duration,
+            'ramp_up': ramp_up,
+            'think_time': think_time,
+            'mix': workload.mix,
+            'books': workload.books.n,
+            'patrons': workload.patrons.n,
+            'book_skew': workload.books.s,
+            'patron_skew': workload.patrons.s,
+        },
+        'elapsed': elapsed,
+        'requests': overall.count,
+        'errors': total_errors,
+        'error_rate': total_errors / overall.count if overall.count else 0.0,
+        'throughput': overall.count / elapsed if elapsed else 0.0,
+        'latency': overall.summary(),
+        'operations': operations,
+        'timeline': timeline,
+    }
+
+def format_report(report: Dict) -> str:
+    """Human-readable summary: totals, a percentile table per operation and the timeline."""
+    lines = [
+        f"{report['requests']} requests in {report['elapsed']:.1f}s against {report['meta']['target']}: "
+        f"{report['throughput']:.1f} req/s, {report['errors']} errors ({report['error_rate']:.2%})",
+        '',
+        f"{'operation':12} {'count':>8} {'req/s':>8} {'errors':>7} "
+        + ' '.join(f"{'p' + format(p, 'g'):>8}" for p in PERCENTILES) + '  (ms)',
+    ]
+    rows = list(report['operations'].items()) + [('all', dict(report['latency'], errors=report['errors'],
+                                                               throughput=report['throughput']))]
+    for op, summary in rows:
+        lines.append(f"{op:12} {summary['count']:>8} {summary['throughput']:>8.1f} {summary['errors']:>7} "
+                     + ' '.join(f'{value:>8.2f}' for value in summary['percentiles_ms'].values()))
+    kinds = [(op, kind, count) for op, summary in report['operations'].items()
+             for kind, count in sorted(summary['error_kinds'].items())]
+    if kinds:
+        lines.append('')
+        lines.extend(f'  {op}: {count} x {kind}' for op, kind, count in kinds)
+    lines.extend(['', f"{'second':>6} {'threads':>7} {'req/s':>7} {'errors':>6} {'p50':>8} {'p99':>8} {'max':>8}"])
+    for row in report['timeline']:
+        lines.append(f"{row['second']:>6} {row['threads']:>7} {row['requests']:>7} {row['errors']:>6} "
+                     f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+    return '\n'.join(lines)
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """Parse 'borrow=20,search=10'; operations left out keep no weight."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        op, sep, weight = part.partition('=')
+        if not sep:
+            raise ValueError(f'expected operation=weight, got {part!r}')
+        mix[op.strip()] = float(weight)
+    return mix
+
+def _in_process_app(database_path: Optional[str], size: int, workdir: str):
+    """Build the app for in-process runs, seeding size books and loans if size > 0."""
+    import database
+    from app import create_app
+
+    path = database_path or os.path.join(workdir, 'load.db')
+    if size:
+        now = datetime.now()
+        seed.seed_sqlite(path, size, now)
+        seed.seed_memory(size, now)
+    app = create_app({'DATABASE': path})
+    with database.db_connection() as conn:
+        books = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+    return app, books
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--url', help='Base URL of a running server (default: in process via the test client).')
+    parser.add_argument('--database', help='Database file for in-process runs (default: a temporary one).')
+    parser.add_argument('--seed', type=int, default=0, metavar='N',
+                        help='In process: seed N books and loans first (see benchmarks.seed).')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds at full concurrency.')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='Seconds over which workers start.')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Pause between requests of a worker.')
+    parser.add_argument('--mix', type=parse_mix, help='Operation weights, e.g. borrow=20,api_search=50.')
+    parser.add_argument('--books', type=int, help='Book ids to draw from (default: the catalog size).')
+    parser.add_argument('--patrons', type=int, help='Patron ids to draw from, starting at 100000.')
+    parser.add_argument('--book-skew', type=float, default=1.1, help='Zipf exponent of book popularity.')
+    parser.add_argument('--patron-skew', type=float, default=0.8, help='Zipf exponent of patron activity.')
+    parser.add_argument('--rng-seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help='Write the report as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='library-load-') as workdir:
+        if args.url:
+            transport, books = HTTPTransport(args.url), DEFAULT_BOOKS
+        else:
+            app, books = _in_process_app(args.database, args.seed, workdir)
+            transport = TestClientTransport(app)
+        books = args.books or max(books, 1)
+        patrons = args.patrons or len(seed.patron_ids(books))
+        workload = Workload(books, patrons, args.mix, args.book_skew, args.patron_skew)
+        report = run_load(transport, workload, threads=args.threads, duration=args.duration,
+                          ramp_up=args.ramp_up, think_time=args.think_time, rng_seed=args.rng_seed)
+        if not args.url:
+            import database
+            database.reset_pool()
+
+    print(format_report(report))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'report written to {args.output}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+Benchmark runner for the business-logic hot paths
+Times the SQLite-backed and in-memory services on seeded catalogs and
+compares the results against an earlier run
+
+    python -m benchmarks.run --sizes 10000 100000 --output results.json
+    python -m benchmarks.run --quick --compare results.json --fail-on-regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import database
+import library_service as sqlite_service
+import services.library_service as memory_service
+
+from . import seed
+
+SIZES = (10_000, 100_000, 1_000_000)
+BACKENDS = ('sqlite', 'memory')
+SEARCH_TERMS = ('garden', 'silent river', 'mirror 12', 'tow', 'voyage 4', 'hollow kingdom')
+
+class Case(NamedTuple):
+    """One timed operation: fn(i) is called for i = 0, 1, ... up to max_iterations."""
+    name: str
+    fn: Callable[[int], object]
+    max_iterations: int
+    setup: Optional[Callable[[], None]] = None
+    teardown: Optional[Callable[[], None]] = None
+
+def measure(case: Case, min_time: float, min_iterations: int = 5) -> Dict:
+    """Call case.fn until min_time has passed (within max_iterations) and summarize."""
+    if case.setup:
+        case.setup()
+    timings: List[float] = []
+    started = time.perf_counter()
+    try:
+        while len(timings) < case.max_iterations and (
+                len(timings) < min_iterations or time.perf_counter() - started < min_time):
+            t0 = time.perf_counter()
+            case.fn(len(timings))
+            timings.append(time.perf_counter() - t0)
+    finally:
+        if case.teardown:
+            case.teardown()
+    timings.sort()
+    return {
+        'case': case.name,
+        'iterations': len(timings),
+        'min': timings[0],
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'p95': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'ops_per_sec': len(timings) / sum(timings) if sum(timings) else float('inf'),
+    }
+
+def _borrow_pairs(size: int, count: int) -> List[tuple]:
+    """(patron_id, book_id) pairs for patrons with no seeded loans, on books with copies left."""
+    rng = random.Random(7)
+    return [(str(900000 + i), rng.randint(1, size)) for i in range(count)]
+
+def sqlite_cases(size: int, pool: int) -> List[Case]:
+    """Cases for library_service.py on the seeded database."""
+    rng = random.Random(1)
+    patrons = seed.patron_ids(size)
+    open_loans = [(str(seed.FIRST_PATRON + (i // seed.LOANS_PER_PATRON)), i + 1)
+                  for i in rng.sample(range(size), min(pool, size)) if i % seed.LOANS_PER_PATRON < 2]
+    pairs = _borrow_pairs(size, pool)
+
+    def borrow_all():
+        for patron_id, book_id in pairs:
+            sqlite_service.borrow_book_by_patron(patron_id, book_id)
+
+    def return_all():
+        for patron_id, book_id in pairs:
+            sqlite_service.return_book_by_patron(patron_id, book_id)
+
+    return [
+        Case('search_books_in_catalog',
+             lambda i: sqlite_service.search_books_in_catalog(SEARCH_TERMS[i % len(SEARCH_TERMS)], 'title'),
+             10_000),
+        Case('borrow_book_by_patron', lambda i: sqlite_service.borrow_book_by_patron(*pairs[i]),
+             len(pairs), teardown=return_all),
+        Case('return_book_by_patron', lambda i: sqlite_service.return_book_by_patron(*pairs[i]),
+             len(pairs), setup=borrow_all),
+        Case('calculate_late_fee_for_book',
+             lambda i: sqlite_service.calculate_late_fee_for_book(*open_loans[i % len(open_loans)]), 10_000),
+        Case('get_patron_status_report',
+             lambda i: sqlite_service.get_patron_status_report(str(rng.choice(patrons))), 10_000),
+        Case('get_all_books', lambda i: database.get_all_books(), 50),
+    ]
+
+def memory_cases(size: int, pool: int) -> List[Case]:
+    """Cases for services/library_service.py on the seeded globals."""
+    rng = random.Random(1)
+    patrons = seed.patron_ids(size)
+    open_loans = [(str(seed.FIRST_PATRON + (i // seed.LOANS_PER_PATRON)), i + 1)
+                  for i in rng.sample(range(size), min(pool, size)) if i % seed.LOANS_PER_PATRON < 2]
+    pairs = _borrow_pairs(size, pool)
+
+    def forget_pairs():
+        # Returned loans would block borrowing the same pair again
+        for patron_id, book_id in pairs:
+            key = f'{patron_id}_{book_id}'
+            if key in memory_service.borrowed_books:
+                if not memory_service.borrowed_books[key].get('returned'):
+                    memory_service.return_book_by_patron(patron_id, book_id)
+                memory_service._forget_loan(key)
+
+    def borrow_all():
+        for patron_id, book_id in pairs:
+            memory_service.borrow_book_by_patron(patron_id, book_id)
+
+    return [
+        Case('search_books_in_catalog',
+             lambda i: memory_service.search_books_in_catalog(title=SEARCH_TERMS[i % len(SEARCH_TERMS)]),
+             10_000),
+        Case('borrow_book_by_patron', lambda i: memory_service.borrow_book_by_patron(*pairs[i]),
+             len(pairs), teardown=forget_pairs),
+        Case('return_book_by_patron', lambda i: memory_service.return_book_by_patron(*pairs[i]),
+             len(pairs), setup=borrow_all, teardown=forget_pairs),
+        Case('calculate_late_fee_for_book',
+             lambda i: memory_service.calculate_late_fee_for_book(*open_loans[i % len(open_loans)]), 10_000),
+        Case('get_patron_status_report',
+             lambda i: memory_service.get_patron_status_report(str(rng.choice(patrons))), 10_000),
+        Case('get_all_books', lambda i: memory_service.get_all_books(), 50),
+    ]
+
+def run(sizes, backends, min_time: float, pool: int, workdir: str, log=print) -> Dict:
+    """Seed and benchmark every (backend, size) combination."""
+    results = []
+    now = datetime.now()
+    for size in sizes:
+        for backend in backends:
+            started = time.perf_counter()
+            if backend == 'sqlite':
+                seed.seed_sqlite(os.path.join(workdir, f'bench_{size}.db'), size, now)
+                cases = sqlite_cases(size, pool)
+            else:
+                seed.seed_memory(size, now)
+                cases = memory_cases(size, pool)
+            log(f'seeded {backend} with {size} books/loans in {time.perf_counter() - started:.1f}s')
+            for case in cases:
+                result = measure(case, min_time)
+                result.update(backend=backend, size=size)
+                results.append(result)
+                log(f"  {backend:6} {size:>9} {case.name:28} median {result['median'] * 1e6:10.1f} us"
+                    f"  ({result['iterations']} runs)")
+            if backend == 'memory':
+                memory_service.reset_globals()
+    database.reset_pool()
+    return {
+        'meta': {
+            'timestamp': now.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'min_time': min_time,
+        },
+        'results': results,
+    }
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    Match results by (backend, size, case) and report median ratios.
+
+    A ratio above 1 + threshold is flagged as a regression.
+    """
+    previous = {(r['backend'], r['size'], r['case']): r for r in baseline['results']}
+    rows = []
+    for result in current['results']:
+        old = previous.get((result['backend'], result['size'], result['case']))
+        if old is None or not old['median']:
+            continue
+        ratio = result['median'] / old['median']
+        rows.append({'backend': result['backend'], 'size': result['size'], 'case': result['case'],
+                     'baseline': old['median'], 'current': result['median'], 'ratio': ratio,
+                     'regression': ratio > 1 + threshold})
+    return rows
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES))
+    parser.add_argument('--quick', action='store_true', help='Only the smallest size, shorter runs.')
+    parser.add_argument('--backend', choices=BACKENDS, action='append',
+                        help='Backend to run (repeatable; default: all).')
+    parser.add_argument('--min-time', type=float, default=1.0, help='Seconds to spend per case.')
+    parser.add_argument('--pool', type=int, default=2000,
+                        help='Distinct loans prepared for the borrow/return cases.')
+    parser.add_argument('--output', '-o', help='Write results as JSON to this file.')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Slowdown (fraction of the baseline median) counted as a regression.')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    sizes = [min(args.sizes)] if args.quick else args.sizes
+    min_time = min(args.min_time, 0.2) if args.quick else args.min_time
+    with tempfile.TemporaryDirectory(prefix='library-bench-') as workdir:
+        report = run(sizes, args.backend or BACKENDS, min_time, args.pool, workdir)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            rows = compare(report, json.load(f), args.threshold)
+        for row in rows:
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['backend']:6} {row['size']:>9} {row['case']:28} "
+                  f"{row['baseline'] * 1e6:10.1f} -> {row['current'] * 1e6:10.1f} us "
+                  f"x{row['ratio']:.2f}{flag}")
+        if args.fail_on_regression and any(row['regression'] for row in rows):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
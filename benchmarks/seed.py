@@ -0,0 +1,94 @@
+"""
+Synthetic data for the benchmarks
+Seeds the same catalog and loans into SQLite or the in-memory services layer
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Tuple
+
+import database
+import migrations
+import services.library_service as memory_service
+
+ADJECTIVES = ('Silent', 'Hidden', 'Golden', 'Broken', 'Distant', 'Crimson', 'Quiet', 'Endless',
+              'Forgotten', 'Bright', 'Winter', 'Hollow', 'Savage', 'Gentle', 'Last', 'Northern')
+NOUNS = ('River', 'Garden', 'Empire', 'Stranger', 'Harbor', 'Machine', 'Forest', 'Letter',
+         'Kingdom', 'Mirror', 'Orchard', 'Voyage', 'Signal', 'Tower', 'Island', 'Promise')
+FIRST_NAMES = ('Ada', 'James', 'Maria', 'Chen', 'Amara', 'Olga', 'Ravi', 'Lucia', 'Tomas', 'Yuki')
+LAST_NAMES = ('Okafor', 'Lindqvist', 'Moreau', 'Tanaka', 'Haddad', 'Novak', 'Silva', 'Brennan')
+
+TOTAL_COPIES = 3
+FIRST_PATRON = 100000
+LOANS_PER_PATRON = 4   # the first two open, the rest returned
+
+def books(size: int, seed: int = 42) -> Iterator[Tuple[str, str, str]]:
+    """Yield (title, author, isbn) for a catalog of size books."""
+    rng = random.Random(seed)
+    for i in range(size):
+        title = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}'
+        author = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        yield title, author, str(9790000000000 + i)
+
+def loans(size: int, now: datetime, seed: int = 42) -> Iterator[Dict]:
+    """
+    Yield one loan per book: size // LOANS_PER_PATRON patrons, each with two
+    open loans (about half of them overdue) and two returned ones.
+    """
+    rng = random.Random(seed)
+    for i in range(size):
+        borrowed = now - timedelta(days=rng.randint(1, 40), seconds=rng.randint(0, 86399))
+        due = borrowed + timedelta(days=14)
+        returned = i % LOANS_PER_PATRON >= 2
+        yield {
+            'patron_id': str(FIRST_PATRON + i // LOANS_PER_PATRON),
+            'book_id': i + 1,
+            'borrow_date': borrowed,
+            'due_date': due,
+            'return_date': due - timedelta(days=1) if returned else None,
+        }
+
+def patron_ids(size: int) -> range:
+    """Numeric ids of the seeded patrons (format with str())."""
+    return range(FIRST_PATRON, FIRST_PATRON + max(size // LOANS_PER_PATRON, 1))
+
+def seed_sqlite(path: str, size: int, now: datetime) -> None:
+    """Create a fresh database at path with size books and loans."""
+    database.DATABASE = path
+    database.reset_pool()
+    database.init_database(migrate=False)
+    with database.db_connection() as conn:
+        conn.executemany('''
+            INSERT INTO books (id, title, author, isbn, total_copies, available_copies)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((i + 1, title, author, isbn, TOTAL_COPIES,
+               TOTAL_COPIES - (1 if i % LOANS_PER_PATRON < 2 else 0))
+              for i, (title, author, isbn) in enumerate(books(size))))
+        conn.executemany('''
+            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date)
+            VALUES (?, ?, ?, ?, ?)
+        ''', ((loan['patron_id'], loan['book_id'], loan['borrow_date'].isoformat(),
+               loan['due_date'].isoformat(),
+               loan['return_date'].isoformat() if loan['return_date'] else None)
+              for loan in loans(size, now)))
+        conn.commit()
+    # Indexes, the FTS index and patron summaries are built once, in bulk
+    migrations.apply_migrations()
+
+def seed_memory(size: int, now: datetime) -> None:
+    """Reset the in-memory services layer and load size books and loans."""
+    memory_service.reset_globals()
+    for i, (title, author, isbn) in enumerate(books(size)):
+        memory_service.insert_book({
+            'title': title, 'author': author, 'isbn': isbn, 'total_copies': TOTAL_COPIES,
+            'available_copies': TOTAL_COPIES - (1 if i % LOANS_PER_PATRON < 2 else 0),
+        })
+    for loan in loans(size, now):
+        memory_service.insert_borrow_record({
+            'patron_id': loan['patron_id'],
+            'book_id': loan['book_id'],
+            'borrow_date': loan['borrow_date'],
+            'due_date': loan['due_date'],
+            'returned': loan['return_date'] is not None,
+            'return_date': loan['return_date'],
+        })
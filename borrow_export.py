@@ -0,0 +1,88 @@
+"""
+Borrow history export module for Library Management System
+Streams borrow_records out as NDJSON or CSV without loading them into memory
+"""
+
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from typing import Iterator, Optional
+
+import click
+
+from database import BORROW_RECORD_FIELDS, iter_borrow_records
+
+FORMATS = ('ndjson', 'csv')
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parse an ISO date or datetime filter value ('' or None means no filter).
+
+    Raises:
+        ValueError: If the value is not an ISO 8601 date
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid date: {value!r} (expected YYYY-MM-DD or an ISO datetime).") from None
+
+def export_borrows(fmt: str = 'ndjson', patron_id: Optional[str] = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   batch_size: int = 1000) -> Iterator[str]:
+    """
+    Yield the export as text chunks: one line per record, CSV with a header row.
+
+    Each chunk covers at most batch_size records, so the generator can feed
+    a streamed HTTP response or a file directly.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt!r}")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n') if fmt == 'csv' else None
+    if writer:
+        writer.writerow(BORROW_RECORD_FIELDS)
+    pending = 0
+    for row in iter_borrow_records(patron_id, since, until, batch_size):
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(BORROW_RECORD_FIELDS, row)), separators=(',', ':')))
+            buffer.write('\n')
+        pending += 1
+        if pending == batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@click.command('export-borrows')
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default='ndjson', show_default=True)
+@click.option('--patron-id', default=None, help='Only this patron\'s records.')
+@click.option('--since', default=None, help='Borrowed on or after this ISO date/datetime.')
+@click.option('--until', default=None, help='Borrowed before this ISO date/datetime.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), default=None,
+              help='Write to this file instead of stdout.')
+def export_borrows_command(fmt, patron_id, since, until, output):
+    """Export borrow records as NDJSON or CSV."""
+    try:
+        since, until = parse_date(since), parse_date(until)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    stream = open(output, 'w', newline='', encoding='utf-8') if output else sys.stdout
+    try:
+        for chunk in export_borrows(fmt, patron_id, since, until):
+            stream.write(chunk)
+    finally:
+        if output:
+            stream.close()
+
+def init_app(app):
+    """Register the export-borrows CLI command."""
+    app.cli.add_command(export_borrows_command)
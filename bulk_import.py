@@ -0,0 +1,173 @@
+"""
+Bulk catalog import module for Library Management System
+Streams CSV/JSONL book feeds into the database in batched transactions
+"""
+
+import csv
+import json
+import os
+import time
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+import click
+
+import catalog_version
+import database
+from database import db_connection
+from library_service import validate_book_fields
+
+DEFAULT_BATCH_SIZE = 1000
+FIELDS = ('title', 'author', 'isbn', 'total_copies')
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield (line number, row) pairs from a CSV (with a header row) or JSONL stream.
+
+    Rows are parsed one at a time, so memory use does not grow with the feed.
+    Malformed JSON lines are yielded as None rows so they can be reported.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt!r}")
+
+def _parse_row(row: Optional[Dict]) -> Tuple[Optional[Tuple], Optional[str]]:
+    """Convert a raw row into (title, author, isbn, total_copies) or an error message."""
+    if row is None:
+        return None, "Malformed row."
+    title = str(row.get('title') or '')
+    author = str(row.get('author') or '')
+    isbn = str(row.get('isbn') or '').strip()
+    copies = row.get('total_copies')
+    if isinstance(copies, str):
+        try:
+            copies = int(copies.strip())
+        except ValueError:
+            pass
+    error = validate_book_fields(title, author, isbn, copies)
+    if error:
+        return None, error
+    return (title.strip(), author.strip(), isbn, copies), None
+
+def import_books(rows: Iterable[Tuple[int, Dict]], batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Validate and insert books in one transaction, batch_size rows per executemany.
+
+    Each batch is loaded into a temporary staging table; ISBNs already in the
+    catalog are found with a join against books and skipped by an anti-join
+    INSERT ... SELECT, and ISBNs repeated within the feed are caught with a
+    set. Any database error rolls the whole import back.
+
+    Returns:
+        dict: rows read, rows inserted, rejected rows (line, isbn, reason),
+        elapsed seconds and rows per second
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    started = time.perf_counter()
+    seen = set()
+    rejected: List[Dict] = []
+    total = 0
+    inserted = 0
+
+    with db_connection() as conn:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS import_staging (
+                    line INTEGER, title TEXT, author TEXT, isbn TEXT, total_copies INTEGER
+                )
+            ''')
+            batch = []
+            for line, row in rows:
+                total += 1
+                values, error = _parse_row(row)
+                if error is None and values[2] in seen:
+                    error = "Duplicate ISBN in import file."
+                if error:
+                    isbn = row.get('isbn') if isinstance(row, dict) else None
+                    rejected.append({'line': line, 'isbn': isbn, 'reason': error})
+                    continue
+                seen.add(values[2])
+                batch.append((line,) + values)
+                if len(batch) >= batch_size:
+                    inserted += _flush_batch(conn, batch, rejected)
+                    batch = []
+            if batch:
+                inserted += _flush_batch(conn, batch, rejected)
+            conn.execute('DROP TABLE temp.import_staging')
+            conn.commit()
+            if inserted:
+                catalog_version.bump(database.DATABASE)
+        except Exception:
+            conn.rollback()
+            conn.execute('DROP TABLE IF EXISTS temp.import_staging')
+            raise
+
+    elapsed = time.perf_counter() - started
+    rejected.sort(key=lambda r: r['line'])
+    return {
+        'rows': total,
+        'inserted': inserted,
+        'rejected': rejected,
+        'elapsed': elapsed,
+        'rows_per_sec': total / elapsed if elapsed > 0 else float(total),
+    }
+
+def _flush_batch(conn, batch: List[Tuple], rejected: List[Dict]) -> int:
+    """Stage one batch, record catalog duplicates and insert the rest."""
+    conn.execute('DELETE FROM temp.import_staging')
+    conn.executemany('''
+        INSERT INTO temp.import_staging (line, title, author, isbn, total_copies)
+        VALUES (?, ?, ?, ?, ?)
+    ''', batch)
+    for dup in conn.execute('''
+        SELECT s.line, s.isbn FROM temp.import_staging s
+        JOIN books b ON b.isbn = s.isbn
+    '''):
+        rejected.append({'line': dup['line'], 'isbn': dup['isbn'],
+                         'reason': "A book with this ISBN already exists."})
+    return conn.execute('''
+        INSERT INTO books (title, author, isbn, total_copies, available_copies)
+        SELECT title, author, isbn, total_copies, total_copies
+        FROM temp.import_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM books b WHERE b.isbn = s.isbn)
+        ORDER BY line
+    ''').rowcount
+
+def import_file(path: str, fmt: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """Import a CSV or JSONL file; the format defaults to the file extension."""
+    if fmt is None:
+        fmt = 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson') else 'csv'
+    with open(path, newline='', encoding='utf-8') as stream:
+        return import_books(read_rows(stream, fmt), batch_size)
+
+@click.command('import-books')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Input format (default: from the file extension).')
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True,
+              help='Rows per executemany batch.')
+def import_books_command(path, fmt, batch_size):
+    """Bulk-import books from a CSV or JSONL file."""
+    report = import_file(path, fmt, batch_size)
+    click.echo(f"Read {report['rows']} rows, inserted {report['inserted']}, "
+               f"rejected {len(report['rejected'])} "
+               f"in {report['elapsed']:.2f}s ({report['rows_per_sec']:.0f} rows/sec).")
+    for row in report['rejected']:
+        click.echo(f"  line {row['line']}: {row['reason']} (isbn={row['isbn']})")
+
+def init_app(app):
+    """Register the import-books CLI command."""
+    app.cli.add_command(import_books_command)
@@ -0,0 +1,62 @@
+"""
+Catalog version module for Library Management System
+In-process change counter behind the catalog's ETag / Last-Modified validators
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+def _new_epoch() -> str:
+    return f'{os.getpid():x}{int(time.time() * 1000):x}'
+
+# Distinguishes this process from earlier runs (and from the other workers of
+# a multi-process server), so a validator issued elsewhere never matches a
+# counter that started again from zero.
+EPOCH = _new_epoch()
+
+_lock = threading.Lock()
+_versions: Dict[str, Tuple[int, int]] = {}   # database -> (version, last_modified)
+
+def current(database: str) -> Tuple[int, int]:
+    """
+    Get (version, last_modified) for a database file.
+
+    last_modified is the wall-clock second of the latest change, never in
+    the future (RFC 7232 section 2.2.1). Several changes within one second
+    share it; the version, and so the ETag, still tells them apart.
+    """
+    with _lock:
+        state = _versions.get(database)
+        if state is None:
+            state = _versions[database] = (0, int(time.time()))
+        return state
+
+def bump(database: str) -> int:
+    """Record a catalog change committed to database; returns the new version."""
+    with _lock:
+        version, _ = _versions.get(database, (0, 0))
+        _versions[database] = (version + 1, int(time.time()))
+        return version + 1
+
+def validators(database: str) -> Tuple[str, Optional[int]]:
+    """
+    Strong entity tag and Last-Modified seconds for the current catalog state.
+
+    Last-Modified is None while the latest change is in the current second:
+    a second change within it would keep the same value, so a copy served
+    now could not be told from the next one by If-Modified-Since. Only the
+    ETag validates such responses.
+    """
+    version, last_modified = current(database)
+    if last_modified >= int(time.time()):
+        return f'{EPOCH}-{version}', None
+    return f'{EPOCH}-{version}', last_modified
+
+def reset() -> None:
+    """Start over under a new epoch, e.g. in a freshly forked worker process."""
+    global EPOCH
+    with _lock:
+        EPOCH = _new_epoch()
+        _versions.clear()
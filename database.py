@@ -3,119 +3,382 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import json
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import g, has_app_context
+
+import catalog_version
+import sql_trace
+from db_pool import ConnectionPool
+from lru_cache import LRUCache
+from metrics import InstrumentedConnection
+from fee_engine import FIRST_TIER_DAYS, FIRST_TIER_RATE, MAX_FEE, SECOND_TIER_RATE, calculate_late_fees_bulk
+from db_pragmas import DEFAULT_PROFILE, apply_pragmas, format_pragma_report, read_pragmas, resolve_pragmas
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Connection pool configuration (overridden by init_app from the Flask config)
+POOL_OPTIONS = {
+    'max_size': 5,
+    'timeout': 5.0,
+    'idle_timeout': 300.0,
+}
+
+# Pragmas applied to every new pooled connection (see db_pragmas)
+PRAGMA_PROFILE = DEFAULT_PROFILE
+PRAGMAS = resolve_pragmas(PRAGMA_PROFILE)
+
+# Set by init_app from CATALOG_CHECK_EXTERNAL_WRITES: other processes write to
+# DATABASE too (see sync_catalog_version)
+CHECK_EXTERNAL_WRITES = False
+
+# Read-through cache for get_book_by_id/get_book_by_isbn (see init_app for
+# the BOOK_CACHE_* settings). Books are cached by id; the ISBN side only maps
+# an ISBN to its id, so invalidating a book id covers both lookups.
+book_cache = LRUCache(max_size=1024, ttl=30.0)
+
+_pool: Optional[ConnectionPool] = None
+_fts_databases: Dict[str, bool] = {}
+# id(conn) -> the PRAGMA data_version sync_catalog_version last saw on it,
+# for pooled connections; dropped by _retire_connection
+_data_versions: Dict[int, int] = {}
+_pool_lock = threading.Lock()
+
 def get_db_connection():
-    """Get a database connection."""
+    """Get a new, unpooled database connection. The caller must close it."""
     conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row  # This enables column access by name
     return conn
 
-def init_database():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
-    
-    # Create books table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            isbn TEXT UNIQUE NOT NULL,
-            total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
-        )
-    ''')
-    
-    # Create borrow_records table
+def get_pool() -> ConnectionPool:
+    """Get the connection pool for DATABASE, rebuilding it if DATABASE changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DATABASE, on_connect=_configure_connection,
+                                   on_close=_retire_connection, factory=InstrumentedConnection,
+                                   **POOL_OPTIONS)
+        return _pool
+
+def _py_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+def _configure_connection(conn: sqlite3.Connection) -> None:
+    """Apply the configured pragma profile to a freshly opened connection."""
+    sql_trace.attach(conn)
+    apply_pragmas(conn, PRAGMAS)
+    # Unicode-aware lower() (SQLite's built-in one only folds ASCII)
+    conn.create_function('py_lower', 1, _py_lower, deterministic=True)
+
+def _retire_connection(conn: sqlite3.Connection) -> None:
+    """Forget the per-connection state of a pooled connection about to be closed."""
+    sql_trace.detach(conn)
+    _data_versions.pop(id(conn), None)
+
+def reset_pool() -> None:
+    """Close all pooled connections so the next call starts a fresh pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = None
+        _fts_databases.clear()
+    book_cache.clear()
+
+@contextmanager
+def db_connection():
+    """
+    Yield a pooled database connection.
+
+    Inside a Flask app context the same connection is reused for the whole
+    request and returned to the pool by close_db() on teardown; otherwise it
+    is returned as soon as the block exits.
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            pool = get_pool()
+            conn = pool.acquire()
+            g._db_conn = conn
+            g._db_pool = pool
+        yield conn
+    else:
+        with get_pool().connection() as conn:
+            yield conn
+
+def close_db(exception=None):
+    """Return the app context's connection to the pool."""
+    conn = g.pop('_db_conn', None)
+    pool = g.pop('_db_pool', None)
+    if conn is not None:
+        pool.release(conn)
+
+def init_app(app):
+    """
+    Configure the database layer from app.config and register teardown.
+
+    Reads DATABASE, DB_POOL_*, BOOK_CACHE_*, CATALOG_CHECK_EXTERNAL_WRITES
+    and the pragma settings: SQLITE_PRAGMA_PROFILE
+    names a preset from db_pragmas.PRAGMA_PRESETS and SQLITE_PRAGMAS holds
+    per-pragma overrides. The effective pragmas are logged once at startup
+    and kept in app.extensions['database'].
+    """
+    global DATABASE, PRAGMA_PROFILE, PRAGMAS, CHECK_EXTERNAL_WRITES
+    DATABASE = app.config.setdefault('DATABASE', DATABASE)
+    CHECK_EXTERNAL_WRITES = app.config.setdefault('CATALOG_CHECK_EXTERNAL_WRITES', False)
+    POOL_OPTIONS['max_size'] = app.config.setdefault('DB_POOL_MAX_SIZE', POOL_OPTIONS['max_size'])
+    POOL_OPTIONS['timeout'] = app.config.setdefault('DB_POOL_TIMEOUT', POOL_OPTIONS['timeout'])
+    POOL_OPTIONS['idle_timeout'] = app.config.setdefault('DB_POOL_IDLE_TIMEOUT', POOL_OPTIONS['idle_timeout'])
+    PRAGMA_PROFILE = app.config.setdefault('SQLITE_PRAGMA_PROFILE', DEFAULT_PROFILE)
+    PRAGMAS = resolve_pragmas(PRAGMA_PROFILE, app.config.setdefault('SQLITE_PRAGMAS', {}))
+    book_cache.enabled = app.config.setdefault('BOOK_CACHE_ENABLED', book_cache.enabled)
+    book_cache.max_size = app.config.setdefault('BOOK_CACHE_MAX_SIZE', book_cache.max_size)
+    book_cache.ttl = app.config.setdefault('BOOK_CACHE_TTL', book_cache.ttl)
+    reset_pool()
+    app.teardown_appcontext(close_db)
+
+    with get_pool().connection() as conn:
+        effective = read_pragmas(conn)
+    app.extensions['database'] = {'pragma_profile': PRAGMA_PROFILE, 'pragmas': effective}
+    app.logger.info(format_pragma_report(PRAGMA_PROFILE, effective))
+
+def init_database(migrate: bool = True):
+    """
+    Initialize the database with required tables.
+
+    Then applies the pending migrations (indexes, patron_summary and later
+    schema changes), which the other helpers rely on. Bulk loaders pass
+    migrate=False and apply them once the rows are in.
+    """
+    with db_connection() as conn:
+        # Create books table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                isbn TEXT UNIQUE NOT NULL,
+                total_copies INTEGER NOT NULL,
+                available_copies INTEGER NOT NULL
+            )
+        ''')
+        
+        # Create borrow_records table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS borrow_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patron_id TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                borrow_date TEXT NOT NULL,
+                due_date TEXT NOT NULL,
+                return_date TEXT,
+                FOREIGN KEY (book_id) REFERENCES books (id)
+            )
+        ''')
+        
+        conn.commit()
+    if migrate:
+        import migrations  # migrations imports this module for db_connection
+        migrations.apply_migrations()
+
+def rebuild_patron_summary(conn: sqlite3.Connection) -> None:
+    """Recompute patron_summary from borrow_records (backfill for existing databases)."""
+    conn.execute('DELETE FROM patron_summary')
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patron_id TEXT NOT NULL,
-            book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
-        )
+        INSERT INTO patron_summary (patron_id, active_count, total_borrowed, earliest_due_date)
+        SELECT patron_id,
+               SUM(return_date IS NULL),
+               COUNT(*),
+               MIN(CASE WHEN return_date IS NULL THEN due_date END)
+        FROM borrow_records
+        GROUP BY patron_id
     ''')
-    
-    conn.commit()
-    conn.close()
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
-    conn = get_db_connection()
-    book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-    
-    if book_count == 0:
-        # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
+    with db_connection() as conn:
+        book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
         
-        for title, author, isbn, copies in sample_books:
+        if book_count == 0:
+            # Add sample books
+            sample_books = [
+                ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                ('1984', 'George Orwell', '9780451524935', 1)
+            ]
+            
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
+            
+            # Make 1984 unavailable by adding a borrow record
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
-        
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
-    
-    conn.close()
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
+            
+            conn.commit()
 
 # Helper Functions for Database Operations
 
 def get_all_books() -> List[Dict]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
+    with db_connection() as conn:
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
     return [dict(book) for book in books]
 
+def iter_books_page(after: Optional[Tuple[str, int]] = None, limit: int = 50) -> Iterator[Dict]:
+    """
+    Yield up to limit books ordered by (title, id), starting after the given key.
+
+    Keyset pagination: the (title, id) of the last book on the previous page
+    is the cursor for the next one, so each page is an index range scan no
+    matter how deep into the catalog it is. Rows are yielded as they are
+    read so callers can start rendering before the page is complete.
+    """
+    with db_connection() as conn:
+        if after is None:
+            cursor = conn.execute('SELECT * FROM books ORDER BY title, id LIMIT ?', (limit,))
+        else:
+            cursor = conn.execute('''
+                SELECT * FROM books WHERE (title, id) > (?, ?)
+                ORDER BY title, id LIMIT ?
+            ''', (after[0], after[1], limit))
+        for book in cursor:
+            yield dict(book)
+
+def get_books_page(after: Optional[Tuple[str, int]] = None, limit: int = 50) -> List[Dict]:
+    """Get one keyset-paginated page of books (see iter_books_page)."""
+    return list(iter_books_page(after, limit))
+
+def _has_books_fts(conn: sqlite3.Connection) -> bool:
+    """Check whether the books_fts index exists (it needs FTS5 with trigram support)."""
+    if _fts_databases.get(DATABASE):
+        return True
+    found = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'").fetchone() is not None
+    if found:
+        _fts_databases[DATABASE] = True
+    return found
+
+def search_books(search_term: str, search_type: str, limit: Optional[int] = None) -> List[Dict]:
+    """
+    Search books by title or author (case-insensitive substring) or ISBN (exact).
+
+    Title/author terms of three or more characters are answered from the
+    books_fts trigram index and ranked by bm25; shorter terms, or databases
+    without FTS5, fall back to a scan of books ordered by title.
+    """
+    sql_limit = -1 if limit is None else limit
+    with db_connection() as conn:
+        if search_type == 'isbn':
+            rows = conn.execute('SELECT * FROM books WHERE isbn = ? LIMIT ?',
+                                (search_term, sql_limit)).fetchall()
+        elif search_type not in ('title', 'author'):
+            return []
+        elif len(search_term) >= 3 and _has_books_fts(conn):
+            # Quote the term as one FTS5 string so operators in it are literal
+            match = '%s : "%s"' % (search_type, search_term.replace('"', '""'))
+            rows = conn.execute('''
+                SELECT b.* FROM books_fts
+                JOIN books b ON b.id = books_fts.rowid
+                WHERE books_fts MATCH ?
+                ORDER BY bm25(books_fts), b.title, b.id
+                LIMIT ?
+            ''', (match, sql_limit)).fetchall()
+        else:
+            rows = conn.execute(f'''
+                SELECT * FROM books WHERE instr(py_lower({search_type}), ?) > 0
+                ORDER BY title, id LIMIT ?
+            ''', (search_term.lower(), sql_limit)).fetchall()
+    return [dict(book) for book in rows]
+
 def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    """Get a specific book by ID (served from book_cache when possible)."""
+    book = book_cache.get(('id', DATABASE, book_id))
+    if book is None:
+        generation = book_cache.generation()
+        with db_connection() as conn:
+            row = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+        if not row:
+            return None
+        book = dict(row)
+        book_cache.set(('id', DATABASE, book_id), book, generation)
+    return dict(book)
 
 def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
+    """Get a specific book by ISBN (served from book_cache when possible)."""
+    book_id = book_cache.get(('isbn', DATABASE, isbn))
+    if book_id is not None:
+        book = book_cache.get(('id', DATABASE, book_id))
+        if book is not None:
+            return dict(book)
+    generation = book_cache.generation()
+    with db_connection() as conn:
+        row = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    if not row:
+        return None
+    book = dict(row)
+    book_cache.set(('isbn', DATABASE, isbn), book['id'], generation)
+    book_cache.set(('id', DATABASE, book['id']), book, generation)
+    return dict(book)
+
+def invalidate_book(book_id: int) -> None:
+    """Drop a book from book_cache after its row changed and bump the catalog version."""
+    book_cache.invalidate(('id', DATABASE, book_id))
+    catalog_version.bump(DATABASE)
+
+def sync_catalog_version() -> bool:
+    """
+    Catch up with catalog changes committed by other processes.
+
+    The catalog version and the book cache only see writes made through this
+    process. When CHECK_EXTERNAL_WRITES is set (several server workers on one
+    database), this compares the connection's PRAGMA data_version, which
+    changes whenever another connection commits, with the value it saw last,
+    and on a change bumps the catalog version and drops the book cache. A
+    connection's first check always counts as a change. Commits from other
+    connections of this process are counted too; that only costs cache misses.
+
+    Returns:
+        bool: True if the version was bumped
+    """
+    if not CHECK_EXTERNAL_WRITES:
+        return False
+    with db_connection() as conn:
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if _data_versions.get(id(conn)) == data_version:
+            return False
+        _data_versions[id(conn)] = data_version
+    book_cache.clear()
+    catalog_version.bump(DATABASE)
+    return True
 
 def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
-        FROM borrow_records br 
-        JOIN books b ON br.book_id = b.id 
-        WHERE br.patron_id = ? AND br.return_date IS NULL
-        ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
+    with db_connection() as conn:
+        records = conn.execute('''
+            SELECT br.*, b.title, b.author 
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ? AND br.return_date IS NULL
+            ORDER BY br.borrow_date
+        ''', (patron_id,)).fetchall()
     
     borrowed_books = []
     for record in records:
@@ -130,72 +393,324 @@ def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
     
     return borrowed_books
 
+BORROW_RECORD_FIELDS = ('id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date')
+
+def iter_borrow_records(patron_id: Optional[str] = None, since: Optional[datetime] = None,
+                        until: Optional[datetime] = None, batch_size: int = 1000) -> Iterator[Tuple]:
+    """
+    Yield borrow records in id order as tuples of BORROW_RECORD_FIELDS.
+
+    Rows are pulled from the cursor batch_size at a time, so memory use does
+    not depend on the number of records. since/until filter on borrow_date
+    (since inclusive, until exclusive).
+    """
+    conditions, params = [], []
+    if patron_id is not None:
+        conditions.append('patron_id = ?')
+        params.append(patron_id)
+    if since is not None:
+        conditions.append('borrow_date >= ?')
+        params.append(since.isoformat())
+    if until is not None:
+        conditions.append('borrow_date < ?')
+        params.append(until.isoformat())
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with db_connection() as conn:
+        cursor = conn.execute(
+            f"SELECT {', '.join(BORROW_RECORD_FIELDS)} FROM borrow_records {where} ORDER BY id", params)
+        cursor.arraysize = batch_size
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+
+# R5 late fee in SQL, mirroring fee_engine.late_fee_for_days(). Days overdue
+# are whole days between due_date and :now, computed from the difference in
+# milliseconds so an exact multiple of a day never rounds down; returned
+# loans owe nothing (as in calculate_late_fee_for_book).
+LATE_DAYS_SQL = '''
+    CASE WHEN br.return_date IS NULL
+         THEN MAX(CAST(ROUND((julianday(:now) - julianday(br.due_date)) * 86400000) AS INTEGER), 0) / 86400000
+         ELSE 0 END
+'''
+LATE_FEE_SQL = f'''
+    ROUND(MIN(MIN(days_overdue, {FIRST_TIER_DAYS}) * {FIRST_TIER_RATE}
+              + MAX(days_overdue - {FIRST_TIER_DAYS}, 0) * {SECOND_TIER_RATE}, {MAX_FEE}), 2)
+'''
+
+def get_patron_loans_with_fees(patron_id: str, now: Optional[datetime] = None) -> Tuple[List[Dict], float]:
+    """
+    Get every loan of a patron (open and returned) with its late fee, and
+    the patron's total, computed in a single query.
+
+    Returns:
+        tuple: (loans ordered by borrow date, total late fees)
+    """
+    now = now or datetime.now()
+    with db_connection() as conn:
+        rows = conn.execute(f'''
+            WITH loans AS (
+                SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date, br.return_date,
+                       {LATE_DAYS_SQL} AS days_overdue
+                FROM borrow_records br
+                JOIN books b ON br.book_id = b.id
+                WHERE br.patron_id = :patron_id
+            )
+            SELECT loans.*, {LATE_FEE_SQL} AS late_fee,
+                   ROUND(SUM({LATE_FEE_SQL}) OVER (), 2) AS total_late_fees
+            FROM loans
+            ORDER BY borrow_date
+        ''', {'now': now.isoformat(), 'patron_id': patron_id}).fetchall()
+    
+    loans = []
+    for row in rows:
+        loans.append({
+            'book_id': row['book_id'],
+            'title': row['title'],
+            'author': row['author'],
+            'borrow_date': datetime.fromisoformat(row['borrow_date']),
+            'due_date': datetime.fromisoformat(row['due_date']),
+            'return_date': datetime.fromisoformat(row['return_date']) if row['return_date'] else None,
+            'days_overdue': row['days_overdue'],
+            'late_fee': row['late_fee']
+        })
+    total = rows[0]['total_late_fees'] if rows else 0.00
+    return loans, total
+
+def iter_late_fees(loans: Optional[List[Tuple[str, int]]] = None,
+                   patron_ids: Optional[List[str]] = None,
+                   now: Optional[datetime] = None, batch_size: int = 1000) -> Iterator[Dict]:
+    """
+    Yield late fees for many open loans from a single query.
+
+    Pass either loans, a list of (patron_id, book_id) pairs answered in
+    request order (the oldest open loan per pair, or a row with no due_date
+    when there is none), or patron_ids to get every open loan of those
+    patrons ordered by patron and borrow date. The identifiers are bound as
+    one JSON array and expanded with json_each, so the query text does not
+    depend on the batch size. The query returns due dates only; the fees of
+    each batch_size rows are computed together by
+    fee_engine.calculate_late_fees_bulk().
+
+    Yields:
+        dict: patron_id, book_id, due_date (ISO text or None), days_overdue,
+        fee_amount and is_overdue
+    """
+    if (loans is None) == (patron_ids is None):
+        raise ValueError("Pass exactly one of loans or patron_ids")
+    now = now or datetime.now()
+    params = {}
+    if loans is not None:
+        params['loans'] = json.dumps([[str(patron_id), book_id] for patron_id, book_id in loans])
+        source = '''
+            requested AS (
+                SELECT CAST(key AS INTEGER) AS seq,
+                       CAST(json_extract(value, '$[0]') AS TEXT) AS patron_id,
+                       json_extract(value, '$[1]') AS book_id
+                FROM json_each(:loans)
+            ),
+            matched AS (
+                SELECT r.seq, r.patron_id, r.book_id, br.due_date,
+                       ROW_NUMBER() OVER (PARTITION BY r.seq ORDER BY br.borrow_date) AS n
+                FROM requested r
+                LEFT JOIN borrow_records br
+                    ON br.patron_id = r.patron_id AND br.book_id = r.book_id AND br.return_date IS NULL
+            ),
+            open_loans AS (
+                SELECT seq, patron_id, book_id, due_date FROM matched WHERE n = 1
+            )
+        '''
+        order = 'seq'
+    else:
+        params['patron_ids'] = json.dumps([str(patron_id) for patron_id in patron_ids])
+        source = '''
+            open_loans AS (
+                SELECT patron_id, book_id, due_date, borrow_date FROM borrow_records
+                WHERE return_date IS NULL
+                  AND patron_id IN (SELECT value FROM json_each(:patron_ids))
+            )
+        '''
+        order = 'patron_id, borrow_date'
+
+    with db_connection() as conn:
+        cursor = conn.execute(f'''
+            WITH {source}
+            SELECT patron_id, book_id, due_date FROM open_loans ORDER BY {order}
+        ''', params)
+        cursor.arraysize = batch_size
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                return
+            due_dates = [datetime.fromisoformat(row['due_date']) if row['due_date'] else now for row in rows]
+            fees = calculate_late_fees_bulk(due_dates, now)
+            for row, due, days, fee in zip(rows, due_dates, fees['days_overdue'].tolist(),
+                                           fees['fee_amount'].tolist()):
+                yield {
+                    'patron_id': row['patron_id'],
+                    'book_id': row['book_id'],
+                    'due_date': row['due_date'],
+                    'days_overdue': days,
+                    'fee_amount': fee,
+                    'is_overdue': due < now
+                }
+
 def get_patron_borrow_count(patron_id: str) -> int:
     """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
-    return count
+    with db_connection() as conn:
+        row = conn.execute(
+            'SELECT active_count FROM patron_summary WHERE patron_id = ?', (patron_id,)).fetchone()
+    return row['active_count'] if row else 0
 
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            INSERT INTO books (title, author, isbn, total_copies, available_copies)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (title, author, isbn, total_copies, available_copies))
+            conn.commit()
+            book_cache.invalidate(('isbn', DATABASE, isbn))
+            catalog_version.bump(DATABASE)
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
 
 def update_book_availability(book_id: int, change: int) -> bool:
     """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                UPDATE books SET available_copies = available_copies + ? WHERE id = ?
+            ''', (change, book_id))
+            conn.commit()
+            invalidate_book(book_id)
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
 
 def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
     """Update the return date for a borrow record."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (return_date.isoformat(), patron_id, book_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            return False
+
+# Transactional Units of Work
+
+def borrow_atomic(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime,
+                  max_borrowed: int = 5) -> Tuple[str, Optional[Dict]]:
+    """
+    Check and record a borrow in a single BEGIN IMMEDIATE transaction.
+
+    The copy is taken with a conditional UPDATE so two patrons racing for the
+    last copy can never both succeed.
+
+    Returns:
+        tuple: (status, book) where status is one of 'ok', 'not_found',
+        'unavailable', 'limit_reached' or 'error'
+    """
+    with db_connection() as conn:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+            if not book:
+                conn.rollback()
+                return 'not_found', None
+            if book['available_copies'] <= 0:
+                conn.rollback()
+                return 'unavailable', dict(book)
+            
+            summary = conn.execute(
+                'SELECT active_count FROM patron_summary WHERE patron_id = ?', (patron_id,)).fetchone()
+            if summary and summary['active_count'] >= max_borrowed:
+                conn.rollback()
+                return 'limit_reached', dict(book)
+            
+            taken = conn.execute('''
+                UPDATE books SET available_copies = available_copies - 1
+                WHERE id = ? AND available_copies > 0
+            ''', (book_id,)).rowcount
+            if not taken:
+                conn.rollback()
+                return 'unavailable', dict(book)
+            
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            conn.commit()
+            invalidate_book(book_id)
+            return 'ok', dict(book)
+        except sqlite3.Error:
+            conn.rollback()
+            return 'error', None
+
+def return_atomic(patron_id: str, book_id: int, return_date: datetime) -> Tuple[str, Optional[Dict]]:
+    """
+    Close a patron's open loan and restock the book in a single transaction.
+
+    Returns:
+        tuple: (status, book) where status is one of 'ok', 'not_found',
+        'not_borrowed' or 'error'. On success the book dict also carries the
+        loan's 'due_date' so the caller can compute the late fee without
+        another query.
+    """
+    with db_connection() as conn:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
+            if not book:
+                conn.rollback()
+                return 'not_found', None
+            
+            record = conn.execute('''
+                SELECT id, due_date FROM borrow_records 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+                ORDER BY borrow_date LIMIT 1
+            ''', (patron_id, book_id)).fetchone()
+            if not record:
+                conn.rollback()
+                return 'not_borrowed', dict(book)
+            
+            conn.execute('UPDATE borrow_records SET return_date = ? WHERE id = ?',
+                         (return_date.isoformat(), record['id']))
+            conn.execute('UPDATE books SET available_copies = available_copies + 1 WHERE id = ?',
+                         (book_id,))
+            conn.commit()
+            invalidate_book(book_id)
+            
+            result = dict(book)
+            result['due_date'] = datetime.fromisoformat(record['due_date'])
+            return 'ok', result
+        except sqlite3.Error:
+            conn.rollback()
+            return 'error', None
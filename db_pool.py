@@ -0,0 +1,159 @@
+"""
+Connection pool module for Library Management System
+Keeps SQLite connections open and hands them out to the database helpers
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes free before the timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections.
+
+    At most ``max_size`` connections are checked out at once; callers block
+    for up to ``timeout`` seconds waiting for a free one. Idle connections are
+    reused most-recently-used first, closed once they have been idle longer
+    than ``idle_timeout`` and pinged before reuse when they have been idle
+    longer than ``health_check_interval``. ``factory`` is the connection
+    class passed to sqlite3.connect(). ``on_connect`` runs on every new
+    connection and ``on_close`` on every connection just before the pool
+    closes it, possibly with the pool lock held.
+    """
+
+    def __init__(self, database: str, max_size: int = 5, timeout: float = 5.0,
+                 idle_timeout: float = 300.0, health_check_interval: float = 30.0,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 on_close: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 factory: Type[sqlite3.Connection] = sqlite3.Connection):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.on_connect = on_connect
+        self.on_close = on_close
+        self.factory = factory
+        self.stats = {'created': 0, 'reused': 0, 'evicted': 0, 'discarded': 0}
+        self._idle: List[Tuple[sqlite3.Connection, float]] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._generation = 0
+        self._checked_out = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection configured like get_db_connection()."""
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               uri=self.database.startswith('file:'), factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        self._count('created')
+        return conn
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        if self.on_close is not None:
+            self.on_close(conn)
+        conn.close()
+
+    def _count(self, event: str) -> None:
+        with self._lock:
+            self.stats[event] += 1
+
+    def _evict_idle(self, now: float) -> None:
+        """Close connections idle longer than idle_timeout (oldest are first); caller holds the lock."""
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.pop(0)
+            self._close(conn)
+            self.stats['evicted'] += 1
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _take_idle(self) -> Optional[sqlite3.Connection]:
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                self._evict_idle(now)
+                if not self._idle:
+                    return None
+                conn, last_used = self._idle.pop()
+            if now - last_used <= self.health_check_interval or self._is_healthy(conn):
+                self._count('reused')
+                return conn
+            self._close(conn)
+            self._count('discarded')
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, opening one if none is idle."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolExhaustedError(
+                f"No database connection available after {self.timeout} seconds.")
+        try:
+            conn = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._checked_out[id(conn)] = self._generation
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection, rolling back anything left uncommitted."""
+        with self._lock:
+            generation = self._checked_out.pop(id(conn), None)
+        if generation is None:
+            raise ValueError("Connection was not checked out from this pool.")
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            keep = generation == self._generation
+        except sqlite3.Error:
+            keep = False
+        if keep:
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        else:
+            self._close(conn)
+            self._count('discarded')
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that checks a connection out and always returns it."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self) -> None:
+        """Close idle connections; checked-out ones are closed when released."""
+        with self._lock:
+            self._generation += 1
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        """Return a consistent copy of the created/reused/evicted/discarded counters."""
+        with self._lock:
+            return dict(self.stats)
+
+    def size(self) -> Tuple[int, int]:
+        """Return (idle, checked out) connection counts."""
+        with self._lock:
+            return len(self._idle), len(self._checked_out)
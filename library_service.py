@@ -4,46 +4,67 @@ Contains all the core business logic for the Library Management System
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 from database import (
     get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
     insert_book, insert_borrow_record, update_book_availability,
     update_borrow_record_return_date, get_all_books,
-    get_patron_borrowed_books  # <-- 加这一行
+    get_patron_borrowed_books,  # <-- 加这一行
+    borrow_atomic, return_atomic, search_books, get_patron_loans_with_fees,
+    iter_late_fees
 )
+from fee_engine import late_fee_for_days
+from overdue import tracker as overdue_tracker
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+MAX_BORROWED_BOOKS = 5
+SEARCH_RESULT_LIMIT = 100
+
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
     """
-    Add a new book to the catalog.
-    Implements R1: Book Catalog Management
+    Check a new book's fields against the R1 rules.
+    Shared by add_book_to_catalog and the bulk importer.
     
-    Args:
-        title: Book title (max 200 chars)
-        author: Book author (max 100 chars)
-        isbn: 13-digit ISBN
-        total_copies: Number of copies (positive integer)
-        
     Returns:
-        tuple: (success: bool, message: str)
+        str: The first validation error message, or None if the fields are valid
     """
-    # Input validation
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     
     if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+        return "ISBN must be exactly 13 digits."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
+    
+    return None
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    """
+    Add a new book to the catalog.
+    Implements R1: Book Catalog Management
+    
+    Args:
+        title: Book title (max 200 chars)
+        author: Book author (max 100 chars)
+        isbn: 13-digit ISBN
+        total_copies: Number of copies (positive integer)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    # Input validation
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -73,32 +94,27 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
+    # Create borrow record
+    borrow_date = datetime.now()
+    due_date = borrow_date + timedelta(days=14)
+    
+    # Availability check, limit check, borrow record and stock update run in
+    # one transaction so concurrent borrowers cannot take the same last copy
+    status, book = borrow_atomic(patron_id, book_id, borrow_date, due_date, MAX_BORROWED_BOOKS)
+    if status == 'not_found':
         return False, "Book not found."
     
-    if book['available_copies'] <= 0:
+    if status == 'unavailable':
         return False, "This book is currently not available."
     
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-    
-    # Create borrow record
-    borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
+    if status == 'limit_reached':
+        return False, f"You have reached the maximum borrowing limit of {MAX_BORROWED_BOOKS} books."
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    if status != 'ok':
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    # Let the overdue sweeper know when this loan falls due
+    overdue_tracker.track(due_date)
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -117,36 +133,21 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be a 6-digit number."
 
-    # Step 2: Check if book exists
-    book = get_book_by_id(book_id)
-    if not book:
+    # Steps 2-5 run as one transaction: check the book and the open loan,
+    # set the return date and restock the copy
+    return_date = datetime.now()
+    status, book = return_atomic(patron_id, book_id, return_date)
+    if status == 'not_found':
         return False, "Book not found."
 
-    # Step 3: Verify that this patron borrowed this book and not yet returned
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    borrowed_book = None
-    for b in borrowed_books:
-        # 有的数据库返回结构里可能没有 'return_date'，所以我们要用 get() 防止 KeyError
-        if b["book_id"] == book_id and b.get("return_date") is None:
-            borrowed_book = b
-            break
-
-    if not borrowed_book:
+    if status == 'not_borrowed':
         return False, "This book was not borrowed by this patron or has already been returned."
 
-    # Step 4: Update return date
-    return_date = datetime.now()
-    success = update_borrow_record_return_date(patron_id, book_id, return_date)
-    if not success:
+    if status != 'ok':
         return False, "Database error occurred while updating return record."
 
-    # Step 5: Update availability (+1)
-    availability_success = update_book_availability(book_id, +1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
-
-    # Step 6: Calculate late fee (R5)
-    fee_info = calculate_late_fee_for_book(patron_id, book_id)
+    # Step 6: Calculate late fee (R5) from the loan's due date
+    fee_info = _late_fee_for_due_date(book["due_date"], return_date)
     fee = fee_info.get("fee_amount", 0.00)
     days = fee_info.get("days_overdue", 0)
 
@@ -175,7 +176,7 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     # Find the specific borrowed book
     borrowed_book = None
     for b in borrowed_books:
-       if b["book_id"] == book_id and b["return_date"] is None:
+       if b["book_id"] == book_id and b.get("return_date") is None:
           borrowed_book = b
           break
     if not borrowed_book:
@@ -184,23 +185,52 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
             "days_overdue": 0,
             "status": "No active borrow record found for this patron and book"
         }
-    due_date = borrowed_book["due_date"]
-    now = datetime.now()
+    return _late_fee_for_due_date(borrowed_book["due_date"], datetime.now())
+
+def calculate_late_fees_batch(loans: Optional[List[Tuple[str, int]]] = None,
+                              patron_ids: Optional[List[str]] = None,
+                              now: Optional[datetime] = None) -> Iterator[Dict]:
+    """
+    Late fees for many loans at once, with calculate_late_fee_for_book's
+    result for each one plus its patron_id, book_id and due_date.
+
+    Args:
+        loans: (patron_id, book_id) pairs, answered in the order given
+        patron_ids: Patrons whose open loans should all be reported
+        now: Time the fees are calculated at (default: now)
+
+    Yields:
+        dict: One result per requested pair, or per open loan of the patrons
+    """
+    for row in iter_late_fees(loans=loans, patron_ids=patron_ids, now=now):
+        if row["due_date"] is None:
+            status = "No active borrow record found for this patron and book"
+        elif not row["is_overdue"]:
+            status = "Book is not overdue"
+        else:
+            status = "Late fee calculated successfully"
+        yield {
+            "patron_id": row["patron_id"],
+            "book_id": row["book_id"],
+            "due_date": row["due_date"],
+            "fee_amount": row["fee_amount"],
+            "days_overdue": row["days_overdue"],
+            "status": status
+        }
+
+def _late_fee_for_due_date(due_date: datetime, now: datetime) -> Dict:
+    """Apply the R5 fee rules to a loan due at due_date, as of now."""
     if now <= due_date:
-                return {
+        return {
             "fee_amount": 0.00,
             "days_overdue": 0,
             "status": "Book is not overdue"
         }
-    # Calculate days overdue
+    # Calculate days overdue and the fee according to R5 rules
     days_overdue = (now - due_date).days
-    # Calculate fee according to R5 rules
-    first_7_days = min(days_overdue, 7)
-    additional_days = max(days_overdue - 7, 0)
-    fee = first_7_days * 0.50 + additional_days * 1.00     
-    fee = min(fee, 15.00)  # cap at $15
+    fee = late_fee_for_days(days_overdue)
     return {
-        "fee_amount": round(fee, 2),
+        "fee_amount": fee,
         "days_overdue": days_overdue,
         "status": "Late fee calculated successfully"
     }
@@ -213,38 +243,28 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     - search_type: "title", "author", "isbn"
     - partial match for title/author (case-insensitive)
     - exact match for ISBN
+    
+    Title/author results are ranked by relevance (bm25) and capped at
+    SEARCH_RESULT_LIMIT.
     """
     search_term = search_term.strip()
     if not search_term:
         return []
 
-    all_books = get_all_books()
-    results = []
-
-    if search_type.lower() == "title":
-        for book in all_books:
-            if search_term.lower() in book["title"].lower():
-                results.append(book)
-    elif search_type.lower() == "author":
-        for book in all_books:
-            if search_term.lower() in book["author"].lower():
-                results.append(book)
-    elif search_type.lower() == "isbn":
-        for book in all_books:
-            if search_term == book["isbn"]:
-                results.append(book)
-    else:
+    search_type = search_type.lower()
+    if search_type not in ("title", "author", "isbn"):
         # Invalid search_type, return empty
         return []
 
-    return results
+    # Matching, ranking and the result limit are pushed down into SQL
+    return search_books(search_term, search_type, SEARCH_RESULT_LIMIT)
 
 
 def get_patron_status_report(patron_id: str) -> Dict:
     """
     Get status report for a patron.
-    
-    TODO: Implement R7 as per requirements
+    Implements R7: current loans with fees, total owed, and full borrowing
+    history (returned loans included, with no fee owed).
     """
     report = {
         "patron_id": patron_id,
@@ -253,34 +273,33 @@ def get_patron_status_report(patron_id: str) -> Dict:
         "num_currently_borrowed": 0,
         "borrow_history": []
     }
-    borrowed_books = get_patron_borrowed_books(patron_id)
-    for book in borrowed_books:
-             # Add current borrowed book info
-        if book["return_date"] is None:
-            fee_info = calculate_late_fee_for_book(patron_id, book["book_id"])
+    # All of the patron's loans with per-loan fees and the total, in one query
+    loans, total_late_fees = get_patron_loans_with_fees(patron_id)
+    
+    for loan in loans:
+        # Add current borrowed book info
+        if loan["return_date"] is None:
             report["current_borrowed"].append({
-                "book_id": book["book_id"],
-                "title": book["title"],
-                "author": book["author"],
-                "borrow_date": book["borrow_date"],
-                "due_date": book["due_date"],
-                "late_fee": fee_info.get("fee_amount", 0.00)
+                "book_id": loan["book_id"],
+                "title": loan["title"],
+                "author": loan["author"],
+                "borrow_date": loan["borrow_date"],
+                "due_date": loan["due_date"],
+                "late_fee": loan["late_fee"]
             })
-            report["total_late_fees"] += fee_info.get("fee_amount", 0.00)
             report["num_currently_borrowed"] += 1
         
         # Add to borrow history
         report["borrow_history"].append({
-            "book_id": book["book_id"],
-            "title": book["title"],
-            "author": book["author"],
-            "borrow_date": book["borrow_date"],
-            "due_date": book["due_date"],
-            "return_date": book["return_date"],
-            "late_fee": calculate_late_fee_for_book(patron_id, book["book_id"]).get("fee_amount", 0.00)
+            "book_id": loan["book_id"],
+            "title": loan["title"],
+            "author": loan["author"],
+            "borrow_date": loan["borrow_date"],
+            "due_date": loan["due_date"],
+            "return_date": loan["return_date"],
+            "late_fee": loan["late_fee"]
         })
     
-    # Round total late fees
-    report["total_late_fees"] = round(report["total_late_fees"], 2)
+    report["total_late_fees"] = total_late_fees
     
     return report
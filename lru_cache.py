@@ -0,0 +1,98 @@
+"""
+Cache module for Library Management System
+Bounded LRU cache with per-entry expiry for hot database lookups
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache.
+
+    Holds at most ``max_size`` entries; the least recently used one is
+    evicted when a new key would exceed that. Entries older than ``ttl``
+    seconds are treated as missing (``ttl=None`` keeps them until evicted).
+    While ``enabled`` is False every lookup is a miss and nothing is stored.
+
+    A read-through caller takes generation() before reading the source and
+    passes it to set(); the value is then dropped if an invalidate() or
+    clear() ran in between, so a row read just before a concurrent write
+    is never cached after that write's invalidation.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 60.0,
+                 enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+        self._clock = clock
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default on a miss."""
+        with self._lock:
+            entry = self._entries.get(key) if self.enabled else None
+            if entry is not None:
+                value, stored_at = entry
+                if self.ttl is not None and self._clock() - stored_at > self.ttl:
+                    del self._entries[key]
+                    self.stats['expired'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+            self.stats['misses'] += 1
+            return default
+
+    def generation(self) -> int:
+        """Number of invalidate() and clear() calls so far (see set())."""
+        with self._lock:
+            return self._generation
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Store value under key, evicting the least recently used entry if full.
+
+        With generation, nothing is stored unless generation() still returns
+        that value, i.e. no invalidation has happened since it was read.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (value, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drop key from the cache if present."""
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(key, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def clear(self) -> None:
+        """Drop every entry (statistics are kept)."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def hit_rate(self) -> float:
+        """Fraction of lookups served from the cache so far."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
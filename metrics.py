@@ -0,0 +1,318 @@
+"""
+Metrics module for Library Management System
+Request latency and SQL statement counters, exported in Prometheus text format
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import Response, current_app, g, request
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+QUANTILES = (0.5, 0.95, 0.99)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)   # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate the q-quantile by linear interpolation inside its bucket,
+        the way Prometheus' histogram_quantile() does.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Registry:
+    """Thread-safe store of labelled counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.help: Dict[str, Tuple[str, str]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self.help[name] = ('counter', help_text)
+        self.counters.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]) -> None:
+        self.help[name] = ('histogram', help_text)
+        self.histograms.setdefault(name, {})
+        self._buckets[name] = buckets
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters[name]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self._buckets[name])
+            histogram.observe(value)
+
+    def value(self, name: str, **labels: str) -> float:
+        """Current value of one counter series (0 if never incremented)."""
+        with self._lock:
+            return self.counters[name].get(tuple(sorted(labels.items())), 0)
+
+    def get_histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        with self._lock:
+            return self.histograms[name].get(tuple(sorted(labels.items())))
+
+    def reset(self) -> None:
+        """Drop every recorded series (the metric definitions stay)."""
+        with self._lock:
+            for series in self.counters.values():
+                series.clear()
+            for series in self.histograms.values():
+                series.clear()
+
+    def render(self, samples: Sequence[Tuple[str, str, str, Labels, float]] = (),
+               const_labels: Labels = ()) -> str:
+        """
+        Prometheus text exposition of every series, plus point-in-time
+        samples given as (name, type, help, labels, value). const_labels
+        are put first on every line.
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in self.counters.items():
+                _header(lines, name, *self.help[name])
+                for labels, value in sorted(series.items()):
+                    lines.append(f'{name}{_format_labels(const_labels + labels)} {_format_value(value)}')
+            for name, series in self.histograms.items():
+                _header(lines, name, *self.help[name])
+                quantiles = []
+                for labels, histogram in sorted(series.items()):
+                    labels = const_labels + labels
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else _format_value(bound)
+                        lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+                    quantiles.extend((labels, q, histogram.quantile(q)) for q in QUANTILES)
+                if quantiles:
+                    _header(lines, f'{name}_quantile', 'gauge',
+                            f'{self.help[name][1]} (quantiles estimated from the histogram)')
+                    for labels, q, value in quantiles:
+                        lines.append(f'{name}_quantile{_format_labels(labels + (("quantile", str(q)),))} '
+                                     f'{_format_value(value)}')
+        seen = set()
+        for name, kind, help_text, labels, value in samples:
+            if name not in seen:
+                _header(lines, name, kind, help_text)
+                seen.add(name)
+            lines.append(f'{name}{_format_labels(const_labels + labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def _header(lines: List[str], name: str, kind: str, help_text: str) -> None:
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+REGISTRY = Registry()
+REGISTRY.counter('library_http_requests_total', 'HTTP requests by endpoint and status code.')
+REGISTRY.histogram('library_http_request_duration_seconds', 'Request latency by endpoint.', LATENCY_BUCKETS)
+REGISTRY.histogram('library_http_request_sql_statements', 'SQL statements per request by endpoint.',
+                   QUERY_COUNT_BUCKETS)
+REGISTRY.histogram('library_http_request_sql_seconds', 'SQL time per request by endpoint.', LATENCY_BUCKETS)
+
+# [statements, seconds] for the request being handled in this context
+_request_sql: ContextVar[Optional[List[float]]] = ContextVar('request_sql', default=None)
+_sql_lock = threading.Lock()
+_sql_totals = [0, 0.0]
+
+def record_sql(elapsed: float) -> None:
+    """Count one SQL statement, process-wide and for the current request."""
+    current = _request_sql.get()
+    with _sql_lock:
+        _sql_totals[0] += 1
+        _sql_totals[1] += elapsed
+        if current is not None:     # may be shared by several threads (async_api)
+            current[0] += 1
+            current[1] += elapsed
+
+# Called as observer(conn, sql, parameters, elapsed) after every statement run
+# through an InstrumentedConnection; parameters is None for executemany and
+# executescript. See sql_trace.
+_sql_observers: List[Callable] = []
+
+def add_sql_observer(observer: Callable) -> None:
+    if observer not in _sql_observers:
+        _sql_observers.append(observer)
+
+def remove_sql_observer(observer: Callable) -> None:
+    if observer in _sql_observers:
+        _sql_observers.remove(observer)
+
+def _statement_done(conn: sqlite3.Connection, sql: str, parameters, elapsed: float) -> None:
+    record_sql(elapsed)
+    for observer in _sql_observers:
+        observer(conn, sql, parameters, elapsed)
+
+def sql_totals() -> Tuple[int, float]:
+    """(statements, seconds) executed by this process so far."""
+    with _sql_lock:
+        return _sql_totals[0], _sql_totals[1]
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that times execute/executemany/executescript.
+
+    Used as the connection factory of the database pool. The time measured
+    is the call itself, which runs the statement up to its first row; rows
+    fetched later from the cursor are not included.
+    """
+
+    def execute(self, sql, parameters=(), /):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _statement_done(self, sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, parameters, /):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            _statement_done(self, sql, None, time.perf_counter() - started)
+
+    def executescript(self, sql_script, /):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _statement_done(self, sql_script, None, time.perf_counter() - started)
+
+def begin_request():
+    """
+    Start timing a request and counting its SQL statements in the current
+    context; pass the result to end_request(). Threads the request's work
+    is handed to must run in a copy of this context to be counted.
+    """
+    return time.perf_counter(), _request_sql.set([0, 0.0])
+
+def end_request(state, endpoint: str, status: int) -> None:
+    """Record a request started with begin_request() under its endpoint and status code."""
+    started, token = state
+    elapsed = time.perf_counter() - started
+    statements, sql_seconds = _request_sql.get() or (0, 0.0)
+    _request_sql.reset(token)
+    REGISTRY.inc('library_http_requests_total', endpoint=endpoint, status=str(status))
+    REGISTRY.observe('library_http_request_duration_seconds', elapsed, endpoint=endpoint)
+    REGISTRY.observe('library_http_request_sql_statements', statements, endpoint=endpoint)
+    REGISTRY.observe('library_http_request_sql_seconds', sql_seconds, endpoint=endpoint)
+
+def _before_request():
+    g._metrics_state = begin_request()
+
+def _after_request(response):
+    state = g.pop('_metrics_state', None)
+    if state is not None:
+        end_request(state, request.endpoint or 'unmatched', response.status_code)
+    return response
+
+def _samples():
+    """Values read at scrape time: SQL totals, cache statistics and pool usage."""
+    import database  # database imports this module for InstrumentedConnection
+
+    statements, seconds = sql_totals()
+    samples = [
+        ('library_sql_statements_total', 'counter', 'SQL statements executed.', (), statements),
+        ('library_sql_seconds_total', 'counter', 'Seconds spent in SQL execute calls.', (), seconds),
+    ]
+    caches = [('book', database.book_cache)]
+    if 'search_cache' in current_app.extensions:
+        caches.append(('search', current_app.extensions['search_cache']))
+    for name, cache in caches:
+        for event in ('hits', 'misses', 'evictions'):
+            samples.append(('library_cache_events_total', 'counter', 'Cache lookups and evictions.',
+                            (('cache', name), ('event', event)), cache.stats[event]))
+    for name, cache in caches:
+        samples.append(('library_cache_hit_ratio', 'gauge', 'Fraction of cache lookups that hit.',
+                        (('cache', name),), cache.hit_rate()))
+    for name, cache in caches:
+        samples.append(('library_cache_entries', 'gauge', 'Entries currently cached.',
+                        (('cache', name),), len(cache)))
+    pool = database.get_pool()
+    idle, in_use = pool.size()
+    for state, count in (('idle', idle), ('in_use', in_use)):
+        samples.append(('library_db_pool_connections', 'gauge', 'Pooled database connections.',
+                        (('state', state),), count))
+    for event, count in pool.stats_snapshot().items():
+        samples.append(('library_db_pool_events_total', 'counter', 'Connections opened, reused and closed.',
+                        (('event', event),), count))
+    return samples
+
+def metrics_view():
+    """
+    Prometheus scrape endpoint for this process.
+
+    Every series carries a pid label. Under a multi-worker server (serve.py)
+    each scrape is answered by whichever worker takes the request, with that
+    worker's own counters; sum over pid in queries, and scrape the workers
+    often enough (or run one worker) for every pid to be seen.
+    """
+    return Response(REGISTRY.render(_samples(), const_labels=(('pid', str(os.getpid())),)),
+                    content_type=CONTENT_TYPE)
+
+def init_app(app):
+    """
+    Register the request hooks and the /metrics endpoint (METRICS_ENABLED,
+    default True). SQL statements are counted by InstrumentedConnection, the
+    database pool's connection class, whether or not this is enabled.
+    """
+    if not app.config.setdefault('METRICS_ENABLED', True):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,220 @@
+"""
+Schema migration module for Library Management System
+Applies ordered, versioned schema changes on top of init_database()
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Tuple, Union
+
+from database import db_connection, rebuild_patron_summary
+
+# A migration step is either a single SQL statement or a callable taking the
+# connection, for changes that need data-dependent logic.
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+def _create_books_fts(conn: sqlite3.Connection) -> None:
+    """Trigram FTS5 index over books.title/author, kept in sync by triggers."""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, content='books', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 or older than 3.34: search falls back to scans
+        return
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    # Only title/author changes touch the index, not availability updates
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+def _create_patron_summary(conn: sqlite3.Connection) -> None:
+    """
+    Per-patron loan totals kept current by triggers on borrow_records, so every
+    write path (including raw SQL) updates them in the same transaction.
+
+    late_fees/fees_as_of hold the total owed as of the last overdue sweep
+    (overdue.sweep); any change to the patron's loans clears fees_as_of.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS patron_summary (
+            patron_id TEXT PRIMARY KEY,
+            active_count INTEGER NOT NULL DEFAULT 0,
+            total_borrowed INTEGER NOT NULL DEFAULT 0,
+            earliest_due_date TEXT,
+            late_fees REAL NOT NULL DEFAULT 0,
+            fees_as_of TEXT
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS patron_summary_ai AFTER INSERT ON borrow_records BEGIN
+            INSERT INTO patron_summary (patron_id, active_count, total_borrowed, earliest_due_date)
+            VALUES (new.patron_id, new.return_date IS NULL, 1,
+                    CASE WHEN new.return_date IS NULL THEN new.due_date END)
+            ON CONFLICT (patron_id) DO UPDATE SET
+                active_count = active_count + excluded.active_count,
+                total_borrowed = total_borrowed + 1,
+                earliest_due_date = CASE
+                    WHEN earliest_due_date IS NULL THEN excluded.earliest_due_date
+                    WHEN excluded.earliest_due_date < earliest_due_date THEN excluded.earliest_due_date
+                    ELSE earliest_due_date END,
+                fees_as_of = NULL;
+        END
+    ''')
+    # Returning a book may remove the earliest due date; the open loans of one
+    # patron are few and found through idx_borrow_records_open_by_patron
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS patron_summary_au
+        AFTER UPDATE OF return_date, due_date ON borrow_records BEGIN
+            UPDATE patron_summary SET
+                active_count = active_count + (new.return_date IS NULL) - (old.return_date IS NULL),
+                earliest_due_date = (
+                    SELECT MIN(due_date) FROM borrow_records
+                    WHERE patron_id = new.patron_id AND return_date IS NULL
+                ),
+                fees_as_of = NULL
+            WHERE patron_id = new.patron_id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS patron_summary_ad AFTER DELETE ON borrow_records BEGIN
+            UPDATE patron_summary SET
+                active_count = active_count - (old.return_date IS NULL),
+                total_borrowed = total_borrowed - 1,
+                earliest_due_date = (
+                    SELECT MIN(due_date) FROM borrow_records
+                    WHERE patron_id = old.patron_id AND return_date IS NULL
+                ),
+                fees_as_of = NULL
+            WHERE patron_id = old.patron_id;
+        END
+    ''')
+
+# Ordered list of (version, description, steps). Append new migrations with
+# the next version number; never edit or renumber ones that have shipped.
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, 'Index open loans by patron', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_by_patron
+        ON borrow_records (patron_id, book_id) WHERE return_date IS NULL
+        ''',
+    ]),
+    (2, 'Index loans by book and return date', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_book_return
+        ON borrow_records (book_id, return_date)
+        ''',
+    ]),
+    (3, 'Index books by (title, id) for keyset pagination', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_books_title_id ON books (title, id)
+        ''',
+    ]),
+    (4, 'Full-text index on book title and author', [
+        _create_books_fts,
+    ]),
+    # The triggers only see loans recorded after them; the rebuild fills the
+    # table in for the rest
+    (5, 'Summarize loans per patron', [
+        _create_patron_summary,
+        rebuild_patron_summary,
+    ]),
+    # Read by the overdue sweep (overdue.py): open loans by due date, and the
+    # loans it has already marked overdue
+    (6, 'Track overdue loans', [
+        'ALTER TABLE borrow_records ADD COLUMN overdue_since TEXT',
+        'ALTER TABLE borrow_records ADD COLUMN current_fee REAL NOT NULL DEFAULT 0',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+        ON borrow_records (due_date) WHERE return_date IS NULL
+        ''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_overdue
+        ON borrow_records (overdue_since) WHERE return_date IS NULL AND overdue_since IS NOT NULL
+        ''',
+    ]),
+    # Every loan of one patron, open or returned: the status report's fee
+    # query and the patron-filtered borrow export
+    (7, 'Index loans by patron and borrow date', [
+        '''
+        CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_borrowed
+        ON borrow_records (patron_id, borrow_date)
+        ''',
+    ]),
+]
+
+def ensure_version_table(conn: sqlite3.Connection) -> None:
+    """Create the schema_version bookkeeping table if it is missing."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the highest applied migration version (0 for a fresh database)."""
+    ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) as version FROM schema_version').fetchone()
+    return row['version'] or 0
+
+def apply_migrations(migrations: List[Tuple[int, str, List[Step]]] = None) -> List[int]:
+    """
+    Apply every migration newer than the current schema version.
+
+    Each migration runs in its own transaction together with its
+    schema_version row, so a failing step leaves the database at the
+    previous version and the error propagates to the caller.
+
+    Returns:
+        list: Versions applied by this call, in order
+    """
+    if migrations is None:
+        migrations = MIGRATIONS
+    applied = []
+    with db_connection() as conn:
+        current = get_schema_version(conn)
+        for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+            if version <= current:
+                continue
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                # Another process may have applied it while we waited for the lock
+                if conn.execute('SELECT 1 FROM schema_version WHERE version = ?',
+                                (version,)).fetchone():
+                    conn.rollback()
+                    continue
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(step)
+                conn.execute('''
+                    INSERT INTO schema_version (version, description, applied_at)
+                    VALUES (?, ?, ?)
+                ''', (version, description, datetime.now().isoformat()))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    return applied
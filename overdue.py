@@ -0,0 +1,237 @@
+"""
+Overdue tracking module for Library Management System
+Materializes overdue_since and current_fee for open loans on a schedule
+"""
+
+import heapq
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import click
+
+from database import db_connection
+from fee_engine import calculate_late_fees_bulk
+
+DEFAULT_SWEEP_INTERVAL = 300.0
+MIN_SWEEP_WAIT = 1.0
+TRACKER_WINDOW = 1000
+
+logger = logging.getLogger(__name__)
+
+def sweep(now: Optional[datetime] = None) -> Dict:
+    """
+    Mark newly overdue loans and bring every overdue loan's fee up to date.
+
+    Only loans already past due are touched, found through the due_date
+    index on open loans, so a sweep costs O(overdue loans). Their fees are
+    computed in one fee_engine.calculate_late_fees_bulk() pass and only the
+    changed ones written back. The patrons involved get their
+    patron_summary fee total refreshed as well.
+
+    Returns:
+        dict: 'as_of', 'newly_overdue' (id, patron_id, book_id, due_date of
+        loans that became overdue since the last sweep) and 'fees_updated'
+    """
+    now = now or datetime.now()
+    params = {'now': now.isoformat()}
+    with db_connection() as conn:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            newly_overdue = conn.execute('''
+                UPDATE borrow_records SET overdue_since = due_date
+                WHERE return_date IS NULL AND due_date < :now AND overdue_since IS NULL
+                RETURNING id, patron_id, book_id, due_date
+            ''', params).fetchall()
+            overdue = conn.execute('''
+                SELECT id, due_date, current_fee FROM borrow_records
+                WHERE return_date IS NULL AND due_date < :now
+            ''', params).fetchall()
+            fees = calculate_late_fees_bulk([datetime.fromisoformat(row['due_date']) for row in overdue], now)
+            changed = [(fee, row['id']) for row, fee in zip(overdue, fees['fee_amount'].tolist())
+                       if fee != row['current_fee']]
+            conn.executemany('UPDATE borrow_records SET current_fee = ? WHERE id = ?', changed)
+            fees_updated = len(changed)
+            conn.execute('''
+                UPDATE patron_summary SET
+                    late_fees = (
+                        SELECT ROUND(COALESCE(SUM(br.current_fee), 0), 2) FROM borrow_records br
+                        WHERE br.patron_id = patron_summary.patron_id AND br.return_date IS NULL
+                    ),
+                    fees_as_of = :now
+                WHERE patron_id IN (
+                    SELECT patron_id FROM borrow_records
+                    WHERE return_date IS NULL AND due_date < :now
+                )
+            ''', params)
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    return {
+        'as_of': now,
+        'newly_overdue': [dict(row) for row in sorted(newly_overdue, key=lambda r: r['due_date'])],
+        'fees_updated': fees_updated,
+    }
+
+def get_overdue_loans(limit: Optional[int] = None) -> List[Dict]:
+    """
+    Get open loans marked overdue by the last sweep, longest overdue first.
+
+    Reads the materialized overdue_since/current_fee columns through the
+    partial index on overdue loans, so only overdue rows are visited.
+    """
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT br.id, br.patron_id, br.book_id, b.title, br.due_date,
+                   br.overdue_since, br.current_fee
+            FROM borrow_records br
+            JOIN books b ON br.book_id = b.id
+            WHERE br.return_date IS NULL AND br.overdue_since IS NOT NULL
+            ORDER BY br.overdue_since
+            LIMIT ?
+        ''', (limit if limit is not None else -1,)).fetchall()
+    return [dict(row) for row in rows]
+
+class OverdueTracker:
+    """
+    Min-heap of the next due dates among open loans that are not overdue yet.
+
+    Holds the earliest ``window`` of them, read in order from the due_date
+    index; new loans due inside that window are pushed by track(). The heap
+    only decides when the next sweep is worth running, so a due date it
+    misses (or one of a loan returned early) costs a late or an extra sweep,
+    never a wrong result.
+    """
+
+    def __init__(self, window: int = TRACKER_WINDOW):
+        self.window = window
+        self._heap: List[datetime] = []
+        self._horizon: Optional[datetime] = None
+        self._complete = False
+        self._lock = threading.Lock()
+
+    def _refill(self, now: datetime) -> None:
+        with db_connection() as conn:
+            rows = conn.execute('''
+                SELECT due_date FROM borrow_records
+                WHERE return_date IS NULL AND due_date >= ?
+                ORDER BY due_date LIMIT ?
+            ''', (now.isoformat(), self.window)).fetchall()
+        # Rows come sorted by due date, which is already a valid heap
+        self._heap = [datetime.fromisoformat(row['due_date']) for row in rows]
+        self._complete = len(self._heap) < self.window
+        self._horizon = self._heap[-1] if self._heap else None
+
+    def track(self, due_date: datetime) -> None:
+        """Record the due date of a new loan."""
+        with self._lock:
+            if self._complete or (self._horizon is not None and due_date <= self._horizon):
+                heapq.heappush(self._heap, due_date)
+
+    def next_due(self, now: datetime) -> Optional[datetime]:
+        """Earliest due date after now, or None if no open loan is still due."""
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+            if not self._heap and not self._complete:
+                self._refill(now)
+            return self._heap[0] if self._heap else None
+
+    def reset(self) -> None:
+        """Forget every due date; the next call to next_due() reloads them."""
+        with self._lock:
+            self._heap = []
+            self._horizon = None
+            self._complete = False
+
+# Shared by the borrow path and the sweeper of this process
+tracker = OverdueTracker()
+
+class OverdueSweeper:
+    """
+    Runs sweep() in a background thread, at least every ``interval`` seconds
+    and soon after the next loan tracked by the OverdueTracker falls due.
+
+    ``on_overdue`` is called with the loans each sweep newly marked overdue,
+    e.g. to send notifications.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SWEEP_INTERVAL,
+                 on_overdue: Optional[Callable[[List[Dict]], None]] = None,
+                 overdue_tracker: Optional[OverdueTracker] = None):
+        self.interval = interval
+        self.on_overdue = on_overdue
+        self.tracker = overdue_tracker or tracker
+        self.last_result: Optional[Dict] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict:
+        """Run one sweep now and notify on_overdue of newly overdue loans."""
+        result = sweep(now)
+        self.last_result = result
+        if result['newly_overdue'] and self.on_overdue is not None:
+            self.on_overdue(result['newly_overdue'])
+        return result
+
+    def seconds_until_next(self, now: datetime) -> float:
+        """Time to wait before the next sweep."""
+        wait = self.interval
+        next_due = self.tracker.next_due(now)
+        if next_due is not None:
+            wait = min(wait, (next_due - now).total_seconds())
+        return max(wait, MIN_SWEEP_WAIT)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                wait = self.seconds_until_next(datetime.now())
+            except Exception:
+                logger.exception("Overdue sweep failed")
+                wait = self.interval
+            self._stop.wait(wait)
+
+    def start(self) -> None:
+        """Start the background thread (no-op if it is already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='overdue-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the background thread to finish and wait for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+@click.command('sweep-overdue')
+def sweep_overdue_command():
+    """Mark overdue loans and update their fees once (for cron-style scheduling)."""
+    result = sweep()
+    click.echo(f"{len(result['newly_overdue'])} newly overdue, {result['fees_updated']} fees updated.")
+
+def _log_newly_overdue(loans: List[Dict]) -> None:
+    logger.info("%d loan(s) became overdue", len(loans))
+
+def init_app(app):
+    """
+    Set up the overdue sweeper in app.extensions['overdue'] and its CLI command.
+
+    OVERDUE_SWEEP_INTERVAL sets the maximum time between sweeps. The
+    background thread is started here only if OVERDUE_SWEEP_BACKGROUND is
+    true (default False), so CLI commands, tests and embedded apps run
+    without one; the serving entry points (serve.py, app.py) start it in the
+    process that handles requests.
+    """
+    sweeper = OverdueSweeper(app.config.setdefault('OVERDUE_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL),
+                             on_overdue=_log_newly_overdue)
+    app.extensions['overdue'] = sweeper
+    app.cli.add_command(sweep_overdue_command)
+    if app.config.setdefault('OVERDUE_SWEEP_BACKGROUND', False):
+        sweeper.start()
@@ -2,11 +2,56 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from services.library_service import calculate_late_fee_for_book, search_books_in_catalog
+from itertools import chain
+
+from flask import Blueprint, current_app, jsonify, request, stream_with_context
+import borrow_export
+import catalog_version
+import database
+import overdue
+from database import get_books_page
+from lru_cache import LRUCache
+from library_service import calculate_late_fees_batch, search_books_in_catalog
+from services.library_service import calculate_late_fee_for_book
+from .pagination import BookPage, decode_cursor, parse_page_size
+from .conditional import catalog_conditional
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+MAX_LATE_FEE_BATCH = 10000
+
+def _init_search_cache(state):
+    """
+    Give each app its own /api/search response cache, sized by
+    SEARCH_CACHE_MAX_SIZE and switched off with SEARCH_CACHE_ENABLED = False.
+    """
+    config = state.app.config
+    state.app.extensions['search_cache'] = LRUCache(
+        max_size=config.setdefault('SEARCH_CACHE_MAX_SIZE', 512), ttl=None,
+        enabled=config.setdefault('SEARCH_CACHE_ENABLED', True))
+
+api_bp.record_once(_init_search_cache)
+
+def _cached_search_results(search_term: str, search_type: str):
+    """
+    Get (count, results as JSON bytes) for a search, running it only on a miss.
+
+    Entries are keyed by the catalog version read before searching and the
+    normalized query (title/author matching ignores case). A catalog change
+    moves every later lookup to new keys, so results computed before the
+    change are never served after it; the old entries age out of the LRU.
+    """
+    cache = current_app.extensions['search_cache']
+    version = (database.DATABASE, catalog_version.current(database.DATABASE)[0])
+    normalized_type = search_type.lower()
+    key = (version, normalized_type, search_term if normalized_type == 'isbn' else search_term.lower())
+    entry = cache.get(key)
+    if entry is None:
+        books = search_books_in_catalog(search_term, search_type)
+        entry = (len(books), current_app.json.dumps(books, separators=(',', ':')).encode('utf-8'))
+        cache.set(key, entry)
+    return entry
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
     """
@@ -16,7 +61,83 @@ def get_late_fee(patron_id, book_id):
     result = calculate_late_fee_for_book(patron_id, book_id)
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
+def _parse_late_fee_request(payload):
+    """
+    Validate a /api/late_fees body.
+
+    Returns:
+        tuple: (loans, patron_ids, error); exactly one of loans/patron_ids is
+        set when error is None
+    """
+    if not isinstance(payload, dict) or ('loans' in payload) == ('patron_ids' in payload):
+        return None, None, 'Body must be a JSON object with either "loans" or "patron_ids".'
+    items = payload.get('loans', payload.get('patron_ids'))
+    if not isinstance(items, list) or not items:
+        return None, None, 'Expected a non-empty list.'
+    if len(items) > MAX_LATE_FEE_BATCH:
+        return None, None, f'At most {MAX_LATE_FEE_BATCH} entries per request.'
+
+    if 'patron_ids' in payload:
+        if not all(isinstance(p, (str, int)) and not isinstance(p, bool) for p in items):
+            return None, None, 'patron_ids must be strings.'
+        return None, [str(p) for p in items], None
+
+    loans = []
+    for item in items:
+        patron_id = item.get('patron_id') if isinstance(item, dict) else None
+        book_id = item.get('book_id') if isinstance(item, dict) else None
+        if not isinstance(patron_id, (str, int)) or isinstance(patron_id, bool) \
+                or not isinstance(book_id, int) or isinstance(book_id, bool):
+            return None, None, 'Each loan needs a patron_id and an integer book_id.'
+        loans.append((str(patron_id), book_id))
+    return loans, None, None
+
+@api_bp.route('/late_fees', methods=['POST'])
+def get_late_fees_batch():
+    """
+    Calculate late fees for many loans in one request.
+    Batch API endpoint for R5: Late Fee Calculation
+    
+    Body: {"loans": [{"patron_id": ..., "book_id": ...}, ...]} or
+    {"patron_ids": [...]} for every open loan of those patrons. All fees come
+    from one query and are streamed back, as a single JSON object or, with
+    ?format=ndjson (or Accept: application/x-ndjson), one JSON line per loan.
+    """
+    loans, patron_ids, error = _parse_late_fee_request(request.get_json(silent=True))
+    if error:
+        return jsonify({'error': error}), 400
+    
+    results = calculate_late_fees_batch(loans, patron_ids)
+    # Run the query now, so database errors still produce a normal error response
+    first = next(results, None)
+    rows = chain([first], results) if first is not None else iter(())
+    dumps = current_app.json.dumps
+    ndjson = request.args.get('format') == 'ndjson' or (
+        request.args.get('format') is None
+        and request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+        == 'application/x-ndjson')
+    
+    if ndjson:
+        def generate():
+            for row in rows:
+                yield dumps(row, separators=(',', ':')) + '\n'
+        return current_app.response_class(stream_with_context(generate()),
+                                          mimetype='application/x-ndjson')
+    
+    def generate():
+        count = 0
+        total = 0.0
+        yield '{"results":['
+        for row in rows:
+            yield (',' if count else '') + dumps(row, separators=(',', ':'))
+            count += 1
+            total += row['fee_amount']
+        yield f'],"count":{count},"total_fees":{round(total, 2)}}}\n'
+    return current_app.response_class(stream_with_context(generate()),
+                                      mimetype=current_app.json.mimetype)
+
 @api_bp.route('/search')
+@catalog_conditional
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -28,12 +149,79 @@ def search_books_api():
     if not search_term:
         return jsonify({'error': 'Search term is required'}), 400
     
-    # Use business logic function
-    books = search_books_in_catalog(search_term, search_type)
+    # Cached results are stored pre-serialized; the body is assembled around
+    # them with the same sorted, compact layout jsonify() produces
+    count, results = _cached_search_results(search_term, search_type)
+    dumps = current_app.json.dumps
+    body = b''.join((
+        b'{"count":', str(count).encode('ascii'),
+        b',"results":', results,
+        b',"search_term":', dumps(search_term).encode('utf-8'),
+        b',"search_type":', dumps(search_type).encode('utf-8'),
+        b'}\n',
+    ))
+    return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
+@api_bp.route('/books')
+def list_books_api():
+    """
+    List the catalog one keyset page at a time.
+    JSON interface for R2: Book Catalog Display
+    
+    Pass the returned `next_after` back as `after` to fetch the next page;
+    it is null on the last page.
+    """
+    limit = parse_page_size(request.args.get('limit'))
+    try:
+        after = decode_cursor(request.args.get('after'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    page = BookPage(get_books_page(after, limit + 1), limit)
+    books = list(page)
     
     return jsonify({
-        'search_term': search_term,
-        'search_type': search_type,
-        'results': books,
-        'count': len(books)
+        'books': books,
+        'count': len(books),
+        'next_after': page.next_cursor
+    })
+
+@api_bp.route('/export/borrows')
+def export_borrows_api():
+    """
+    Stream every borrow record as NDJSON (default) or CSV.
+    
+    Query parameters: `format` (ndjson or csv), `patron_id`, and `since` /
+    `until` ISO dates bounding the borrow date (until is exclusive).
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in borrow_export.FORMATS:
+        return jsonify({'error': f'format must be one of: {", ".join(borrow_export.FORMATS)}'}), 400
+    try:
+        since = borrow_export.parse_date(request.args.get('since'))
+        until = borrow_export.parse_date(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    chunks = borrow_export.export_borrows(fmt, request.args.get('patron_id') or None, since, until)
+    response = current_app.response_class(stream_with_context(chunks), mimetype=borrow_export.MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=borrows.{fmt}'
+    return response
+
+@api_bp.route('/overdue')
+def list_overdue_api():
+    """
+    List overdue loans, longest overdue first, as of the last overdue sweep.
+    
+    Query parameters: `limit` (default 50, at most 500). `as_of` is null
+    until this process has run a sweep.
+    """
+    loans = overdue.get_overdue_loans(parse_page_size(request.args.get('limit')))
+    sweeper = current_app.extensions.get('overdue')
+    last = sweeper.last_result if sweeper else None
+    return jsonify({
+        'as_of': last['as_of'].isoformat() if last else None,
+        'loans': loans,
+        'count': len(loans),
+        'total_fees': round(sum(loan['current_fee'] for loan in loans), 2)
     })
@@ -44,8 +44,9 @@ def return_book():
         flash('Invalid book ID.', 'error')
         return render_template('return_book.html')
     
-    # Use business logic function
-    success, message = return_book_by_patron(patron_id, book_id)
+    # Use business logic function; a successful return also carries the late fee
+    result = return_book_by_patron(patron_id, book_id)
+    success, message = result[0], result[-1]
     
     flash(message, 'success' if success else 'error')
     return render_template('return_book.html')
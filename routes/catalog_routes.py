@@ -2,9 +2,11 @@
 Catalog Routes - Book catalog related endpoints
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
+from flask import Blueprint, current_app, render_template, request, redirect, stream_template, url_for, flash
+from database import iter_books_page
 from services.library_service import add_book_to_catalog
+from .pagination import BookPage, decode_cursor, parse_page_size
+from .conditional import catalog_conditional
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +16,27 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@catalog_conditional
 def catalog():
     """
-    Display all books in the catalog.
+    Display the catalog one page at a time.
     Implements R2: Book Catalog Display
+    
+    Query parameters: `after` (cursor from the previous page's "Next" link)
+    and `limit` (page size). With CATALOG_STREAM_TEMPLATE enabled the page is
+    streamed so the first rows reach the browser while the rest are read.
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    limit = parse_page_size(request.args.get('limit'))
+    try:
+        after = decode_cursor(request.args.get('after'))
+    except ValueError as e:
+        flash(str(e), 'error')
+        after = None
+    
+    books = BookPage(iter_books_page(after, limit + 1), limit)
+    if current_app.config.get('CATALOG_STREAM_TEMPLATE'):
+        return stream_template('catalog.html', books=books, limit=limit)
+    return render_template('catalog.html', books=books, limit=limit)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -0,0 +1,52 @@
+"""
+Conditional GET helpers - ETag / Last-Modified validators for catalog-backed pages
+"""
+
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Optional
+
+from flask import make_response, request, session
+
+import catalog_version
+import database
+
+
+def _is_current(etag: str, last_modified: Optional[int]) -> bool:
+    """Check the request's validators; If-None-Match wins over If-Modified-Since."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and int(since.timestamp()) >= last_modified
+
+
+def catalog_conditional(view):
+    """
+    Answer GETs of a catalog-backed view with 304 Not Modified while the
+    catalog is unchanged since the client's copy.
+
+    The validators come from the in-process catalog_version counter, so the
+    check runs before the view: a current client costs no query and no
+    template rendering (with several server processes, one PRAGMA checks for
+    their writes first). Requests carrying flashed messages are served in
+    full and without validators, since their body is not the shared one.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        database.sync_catalog_version()
+        if session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        etag, last_modified = catalog_version.validators(database.DATABASE)
+        if _is_current(etag, last_modified):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
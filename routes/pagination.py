@@ -0,0 +1,83 @@
+"""
+Pagination helpers - opaque keyset cursors shared by the HTML and JSON catalog
+"""
+
+import base64
+import binascii
+import json
+from typing import Dict, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(book: Dict) -> str:
+    """Encode the (title, id) keyset position of a book as a URL-safe token."""
+    raw = json.dumps([book['title'], book['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Decode a token produced by encode_cursor.
+
+    Returns None for an empty token (first page).
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        title, book_id = json.loads(raw.decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid page cursor.") from e
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        raise ValueError("Invalid page cursor.")
+    return title, book_id
+
+
+def parse_page_size(value: Optional[str]) -> int:
+    """Parse a ?limit= value, falling back to the default and capping at MAX_PAGE_SIZE."""
+    try:
+        size = int(value) if value else DEFAULT_PAGE_SIZE
+    except ValueError:
+        size = DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class BookPage:
+    """
+    Iterates over at most `limit` books from a source that was asked for
+    limit + 1 rows, recording the last book shown and whether more follow.
+
+    Works for both a fully rendered and a streamed template: `has_more` and
+    `next_cursor` are final once iteration has finished.
+    """
+
+    def __init__(self, rows, limit: int):
+        self.limit = limit
+        self.last = None
+        self.has_more = False
+        self._rows = iter(rows)
+        self._first = next(self._rows, None)
+
+    def __bool__(self):
+        return self._first is not None
+
+    def __iter__(self):
+        book = self._first
+        count = 0
+        while book is not None:
+            if count == self.limit:
+                self.has_more = True
+                return
+            self.last = book
+            count += 1
+            yield book
+            book = next(self._rows, None)
+
+    @property
+    def next_cursor(self) -> Optional[str]:
+        return encode_cursor(self.last) if self.has_more and self.last else None
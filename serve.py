@@ -0,0 +1,183 @@
+"""
+Serve module for Library Management System
+Production entry point: the app under gunicorn with worker processes and threads
+
+    python serve.py --threads 8 --bind 0.0.0.0:5000
+
+By default there is a single worker process: the borrow, return, add-book and
+late-fee routes still keep their state in the in-memory globals of
+services.library_service, so each worker would see its own copy of it. Run
+more workers (--workers / WEB_CONCURRENCY) only once those routes use the
+database; serve.py logs a warning when asked to.
+The app is loaded once in the master and forked into the workers. Each
+worker then sets up its own database connections and overdue sweeper
+(post_fork / post_worker_init) and is replaced after --max-requests
+requests. Send the master SIGHUP to replace every worker gracefully: workers
+finish their requests (up to --graceful-timeout seconds) before exiting.
+With preloading, code changes need a full restart (or --no-preload).
+Metrics are per worker: /metrics answers with the counters of whichever
+worker takes the scrape, labelled with its pid.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import Dict, Optional
+
+import catalog_version
+import database
+import overdue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BIND = '0.0.0.0:5000'
+DEFAULT_WORKERS = 1
+DEFAULT_THREADS = 8
+DEFAULT_MAX_REQUESTS = 1000
+DEFAULT_MAX_REQUESTS_JITTER = 100
+DEFAULT_TIMEOUT = 30
+DEFAULT_GRACEFUL_TIMEOUT = 30
+DEFAULT_KEEPALIVE = 5
+
+def default_workers() -> int:
+    """WEB_CONCURRENCY if set, else a single worker (see the module docstring)."""
+    if os.environ.get('WEB_CONCURRENCY'):
+        return int(os.environ['WEB_CONCURRENCY'])
+    return DEFAULT_WORKERS
+
+def warn_if_multiprocess(workers: int) -> bool:
+    """Log a warning if several workers would each hold their own in-memory service state."""
+    if workers <= 1:
+        return False
+    logger.warning('Serving with %d workers: /borrow, /return, /add_book and /api/late_fee keep '
+                   'per-process state in services.library_service, so workers will disagree. '
+                   'Use one worker with more --threads instead.', workers)
+    return True
+
+def load_app(config: Optional[Dict] = None):
+    """
+    Create the app for serving.
+
+    Runs in the master when preloading: the schema setup happens once, and
+    the connections it opened are closed before any worker is forked, since
+    SQLite connections must not cross a fork. The overdue sweeper is not
+    started here; post_worker_init starts one per worker if
+    OVERDUE_SWEEP_BACKGROUND (default True) asks for it.
+    """
+    from app import create_app
+
+    config = dict(config or {})
+    run_sweeper = config.get('OVERDUE_SWEEP_BACKGROUND', True)
+    app = create_app(dict(config, OVERDUE_SWEEP_BACKGROUND=False))
+    app.config['OVERDUE_SWEEP_BACKGROUND'] = run_sweeper
+    database.reset_pool()
+    return app
+
+def post_fork(server, worker):
+    """Start the worker without the master's per-process state."""
+    database.reset_pool()
+    catalog_version.reset()
+    overdue.tracker.reset()
+
+def post_worker_init(worker):
+    """Start this worker's overdue sweeper once its app is loaded."""
+    app = worker.wsgi
+    if app.config.get('OVERDUE_SWEEP_BACKGROUND'):
+        app.extensions['overdue'].start()
+
+def worker_exit(server, worker):
+    """Stop the sweeper and close the pooled connections of an exiting worker."""
+    app = getattr(worker, 'wsgi', None)
+    sweeper = app.extensions.get('overdue') if app is not None else None
+    if sweeper is not None:
+        sweeper.stop(timeout=5)
+    database.reset_pool()
+
+def gunicorn_options(bind: str = DEFAULT_BIND, workers: Optional[int] = None, threads: int = DEFAULT_THREADS,
+                     max_requests: int = DEFAULT_MAX_REQUESTS,
+                     max_requests_jitter: int = DEFAULT_MAX_REQUESTS_JITTER,
+                     timeout: int = DEFAULT_TIMEOUT, graceful_timeout: int = DEFAULT_GRACEFUL_TIMEOUT,
+                     keepalive: int = DEFAULT_KEEPALIVE, preload: bool = True,
+                     pidfile: Optional[str] = None, access_log: Optional[str] = None) -> Dict:
+    """
+    gunicorn settings for the app. threads > 1 selects the threaded (gthread)
+    worker; the jitter keeps workers from all being recycled at once.
+    """
+    options = {
+        'bind': [bind],
+        'workers': workers or default_workers(),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'preload_app': preload,
+        'max_requests': max_requests,
+        'max_requests_jitter': max_requests_jitter,
+        'timeout': timeout,
+        'graceful_timeout': graceful_timeout,
+        'keepalive': keepalive,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+    if pidfile:
+        options['pidfile'] = pidfile
+    if access_log:
+        options['accesslog'] = access_log
+    return options
+
+def app_config(workers: int, database_path: Optional[str] = None) -> Dict:
+    """Flask config for serving: debugger off, cross-process catalog checks for several workers."""
+    config = {'DEBUG': False, 'CATALOG_CHECK_EXTERNAL_WRITES': workers > 1}
+    if database_path:
+        config['DATABASE'] = database_path
+    return config
+
+def run(options: Dict, config: Optional[Dict] = None) -> None:
+    """Run gunicorn with options until it is stopped."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit('serve.py needs gunicorn: pip install gunicorn')
+
+    class LibraryApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(config)
+
+    LibraryApplication().run()
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--bind', '-b', default=os.environ.get('BIND', DEFAULT_BIND))
+    parser.add_argument('--workers', '-w', type=int, help='Worker processes (default: WEB_CONCURRENCY '
+                                                          'or 1; see above before raising it).')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='Request threads per worker.')
+    parser.add_argument('--max-requests', type=int, default=DEFAULT_MAX_REQUESTS,
+                        help='Recycle a worker after this many requests (0 disables).')
+    parser.add_argument('--max-requests-jitter', type=int, default=DEFAULT_MAX_REQUESTS_JITTER)
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT,
+                        help='Seconds before a silent worker is killed and replaced.')
+    parser.add_argument('--graceful-timeout', type=int, default=DEFAULT_GRACEFUL_TIMEOUT,
+                        help='Seconds workers get to finish requests on reload or shutdown.')
+    parser.add_argument('--keepalive', type=int, default=DEFAULT_KEEPALIVE)
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        help='Load the app in each worker instead of once before forking.')
+    parser.add_argument('--pid', help='Write the master PID here (for kill -HUP reloads).')
+    parser.add_argument('--access-log', help="Access log file ('-' for stdout).")
+    parser.add_argument('--database', help='SQLite database file (default: library.db).')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    options = gunicorn_options(bind=args.bind, workers=args.workers, threads=args.threads,
+                               max_requests=args.max_requests, max_requests_jitter=args.max_requests_jitter,
+                               timeout=args.timeout, graceful_timeout=args.graceful_timeout,
+                               keepalive=args.keepalive, preload=args.preload, pidfile=args.pid,
+                               access_log=args.access_log)
+    warn_if_multiprocess(options['workers'])
+    run(options, app_config(options['workers'], args.database))
+
+if __name__ == '__main__':
+    main()
@@ -10,10 +10,54 @@ from unittest.mock import patch
 import services.library_service as ls
 from datetime import datetime, timedelta
 
+class _VersionedDict(dict):
+    """
+    dict that counts writes to its entries in ``version``, so an index built
+    from it can tell it is stale even when the number of entries is unchanged.
+    Changes made inside an entry (book["title"] = ...) are not counted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
 # 全局变量存储数据（简单实现）
-catalog = {}
+catalog = _VersionedDict()
 patrons = {}
-borrowed_books = {}
+borrowed_books = _VersionedDict()
 catalog_id_counter = 0
 
 # ==================== Database Helper Functions ====================
@@ -28,11 +72,202 @@ def get_borrowed_books():
 
 def get_patron_borrowed_books(patron_id):
     """Get all books borrowed by a patron."""
-    patron_books = []
+    return _active_loans(patron_id)
+
+# ==================== Patron Loan Index ====================
+
+# patron_id -> {"active": {borrow_key: None}, "returned": {borrow_key: None}}
+# (dicts used as insertion-ordered sets), maintained through _store_loan and
+# _forget_loan by borrow_book_by_patron, return_book_by_patron and
+# insert_borrow_record so patron lookups cost O(that patron's loans) instead
+# of a scan of borrowed_books. Other writes to borrowed_books are caught by
+# its version and rebuild the index on the next lookup.
+patron_loans = {}
+loan_owners = {}       # borrow_key -> patron_id, for moves and consistency checks
+indexed_loans = None   # (borrowed_books, borrowed_books.version) the index is up to date with
+
+def _index_loan(borrow_key, record):
+    """Add a borrow record to its patron's active or returned set."""
+    _unindex_loan(borrow_key)
+    patron_id = record.get("patron_id")
+    loans = patron_loans.setdefault(patron_id, {"active": {}, "returned": {}})
+    loans["returned" if record.get("returned", False) else "active"][borrow_key] = None
+    loan_owners[borrow_key] = patron_id
+
+def _unindex_loan(borrow_key):
+    patron_id = loan_owners.pop(borrow_key, None)
+    loans = patron_loans.get(patron_id)
+    if loans is not None:
+        loans["active"].pop(borrow_key, None)
+        loans["returned"].pop(borrow_key, None)
+
+def _clear_patron_index():
+    global indexed_loans
+    patron_loans.clear()
+    loan_owners.clear()
+    indexed_loans = None
+
+def _mark_loans_indexed():
+    global indexed_loans
+    indexed_loans = (borrowed_books, getattr(borrowed_books, "version", None))
+
+def _sync_patron_index():
+    """Rebuild the patron index if borrowed_books was written to without _store_loan/_forget_loan."""
+    if (indexed_loans is not None and indexed_loans[0] is borrowed_books
+            and isinstance(borrowed_books, _VersionedDict) and indexed_loans[1] == borrowed_books.version):
+        return
+    _clear_patron_index()
     for borrow_key, record in borrowed_books.items():
-        if record["patron_id"] == patron_id and not record.get("returned", False):
-            patron_books.append(record)
-    return patron_books
+        _index_loan(borrow_key, record)
+    _mark_loans_indexed()
+
+def _store_loan(borrow_key, record):
+    """Write a borrow record and index it, keeping the patron index current."""
+    _sync_patron_index()
+    borrowed_books[borrow_key] = record
+    _index_loan(borrow_key, record)
+    _mark_loans_indexed()
+
+def _forget_loan(borrow_key):
+    """Delete a borrow record (if present) and its patron index entry."""
+    _sync_patron_index()
+    if borrowed_books.pop(borrow_key, None) is not None:
+        _unindex_loan(borrow_key)
+    _mark_loans_indexed()
+
+def _active_loans(patron_id):
+    """A patron's unreturned borrow records, re-checked against borrowed_books."""
+    _sync_patron_index()
+    loans = patron_loans.get(patron_id)
+    if not loans:
+        return []
+    records = []
+    for borrow_key in loans["active"]:
+        record = borrowed_books.get(borrow_key)
+        if record and record.get("patron_id") == patron_id and not record.get("returned", False):
+            records.append(record)
+    return records
+
+# ==================== ISBN Index ====================
+
+isbn_index = {}        # normalized ISBN-13 -> book_id
+
+def _is_isbn10(cleaned):
+    """True if cleaned is an ISBN-10 whose check digit is correct."""
+    if len(cleaned) != 10 or not cleaned[:9].isdigit() or not (cleaned[9].isdigit() or cleaned[9] == "X"):
+        return False
+    digits = [int(d) for d in cleaned[:9]] + [10 if cleaned[9] == "X" else int(cleaned[9])]
+    return sum(weight * d for weight, d in zip(range(10, 0, -1), digits)) % 11 == 0
+
+def normalize_isbn(isbn):
+    """
+    Normalize an ISBN so ISBN-10 and ISBN-13 forms of a book compare equal.
+    
+    Hyphens and spaces are dropped and valid ISBN-10s (mod 11 check digit,
+    'X' for 10) are converted to their 978-prefixed ISBN-13 with a recomputed
+    check digit. Anything else, including a 10-digit value whose check digit
+    does not match, is returned cleaned but otherwise unchanged, so distinct
+    values never share a key.
+    """
+    if not isinstance(isbn, str):
+        return ""
+    cleaned = isbn.replace("-", "").replace(" ", "").upper()
+    if _is_isbn10(cleaned):
+        core = "978" + cleaned[:9]
+        total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(core))
+        return core + str((10 - total % 10) % 10)
+    return cleaned
+
+# ==================== Search Index ====================
+
+# Trigram inverted index over pre-lowercased title/author/isbn, maintained by
+# _store_book (add_book_to_catalog and insert_book) and rebuilt on the next
+# lookup after any other write to catalog. Substring queries intersect the
+# posting lists of the query's trigrams and verify the few candidates left.
+search_fields = {}     # book_id -> (title, author, isbn), lowercased
+trigram_index = {}     # trigram -> set of book_ids
+search_order = {}      # book_id -> insertion sequence, to keep catalog order
+search_sequence = 0
+indexed_catalog = None  # (catalog, catalog.version) the indexes are up to date with
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _unindex_book(book_id):
+    fields = search_fields.pop(book_id, None)
+    search_order.pop(book_id, None)
+    if fields is None:
+        return
+    key = normalize_isbn(fields[2])
+    if isbn_index.get(key) == book_id:
+        del isbn_index[key]
+    for field in fields:
+        for gram in _trigrams(field):
+            postings = trigram_index.get(gram)
+            if postings is not None:
+                postings.discard(book_id)
+                if not postings:
+                    del trigram_index[gram]
+
+def _index_book(book_id, book):
+    """Add (or refresh) one catalog entry in the search and ISBN indexes."""
+    global search_sequence
+    _unindex_book(book_id)
+    fields = tuple(str(book.get(key) or "").lower() for key in ("title", "author", "isbn"))
+    search_fields[book_id] = fields
+    search_sequence += 1
+    search_order[book_id] = search_sequence
+    for field in fields:
+        for gram in _trigrams(field):
+            trigram_index.setdefault(gram, set()).add(book_id)
+    if fields[2]:
+        # First book wins, like the old linear scan
+        isbn_index.setdefault(normalize_isbn(fields[2]), book_id)
+
+def _clear_indexes():
+    global search_sequence, indexed_catalog
+    isbn_index.clear()
+    search_fields.clear()
+    trigram_index.clear()
+    search_order.clear()
+    search_sequence = 0
+    indexed_catalog = None
+
+def _mark_indexed():
+    global indexed_catalog
+    indexed_catalog = (catalog, getattr(catalog, "version", None))
+
+def _sync_indexes():
+    """Rebuild the indexes if the catalog was written to without going through _store_book."""
+    if (indexed_catalog is not None and indexed_catalog[0] is catalog
+            and isinstance(catalog, _VersionedDict) and indexed_catalog[1] == catalog.version):
+        return
+    _clear_indexes()
+    for book_id, book in catalog.items():
+        _index_book(book_id, book)
+    _mark_indexed()
+
+def _store_book(book_id, book):
+    """Write a catalog entry and index it, keeping the indexes current."""
+    _sync_indexes()
+    catalog[book_id] = book
+    _index_book(book_id, book)
+    _mark_indexed()
+
+def _substring_candidates(term):
+    """Book ids whose title, author or isbn may contain term (already lowercased)."""
+    grams = _trigrams(term)
+    if not grams:
+        # Shorter than a trigram: check every entry's pre-lowercased fields
+        return {book_id for book_id, fields in search_fields.items()
+                if any(term in field for field in fields)}
+    postings = sorted((trigram_index.get(gram, set()) for gram in grams), key=len)
+    candidates = set(postings[0])
+    for other in postings[1:]:
+        if not candidates:
+            break
+        candidates &= other
+    return candidates
 
 # ==================== Catalog Management ====================
 
@@ -76,14 +311,14 @@ def add_book_to_catalog(title, author, isbn, total_copies=1):
     catalog_id_counter += 1
     book_id = catalog_id_counter
     
-    catalog[book_id] = {
+    _store_book(book_id, {
         "book_id": book_id,
         "title": title.strip(),
         "author": author.strip(),
         "isbn": isbn if isbn else "",
         "total_copies": total_copies,
         "available_copies": total_copies
-    }
+    })
     
     return (True, "Book added successfully.")
 
@@ -156,7 +391,7 @@ def borrow_book_by_patron(patron_id, book_id):
         return (False, "Database error: Failed to create borrow record.")
     
     # Also add to borrowed_books dict
-    borrowed_books[borrow_key] = borrow_record
+    _store_loan(borrow_key, borrow_record)
     
     book["available_copies"] -= 1
     
@@ -234,7 +469,7 @@ def return_book_by_patron(patron_id, book_id):
             if pb.get("book_id") == book_id and not pb.get("returned", False):
                 borrow_record = pb
                 # Add it to borrowed_books for consistency
-                borrowed_books[borrow_key] = pb
+                _store_loan(borrow_key, pb)
                 break
     
     if not borrow_record:
@@ -254,6 +489,8 @@ def return_book_by_patron(patron_id, book_id):
     # Mark as returned
     borrow_record["returned"] = True
     borrow_record["return_date"] = datetime.now()
+    if borrowed_books.get(borrow_key) is borrow_record:
+        _index_loan(borrow_key, borrow_record)
     
     # Increase available copies
     book = catalog.get(book_id)
@@ -394,39 +631,33 @@ def search_books_in_catalog(query=None, author=None, title=None, isbn=None):
     Returns:
         list: List of matching books
     """
-    results = []
+    # Any non-string filter can never match (same as the original scan)
+    for value in (query, author, title, isbn):
+        if value and not isinstance(value, str):
+            return []
     
-    for book in catalog.values():
-        match = True
-        
-        if query:
-            if not isinstance(query, str):
-                continue
-            query_lower = query.lower()
-            if (query_lower not in book["title"].lower() and 
-                query_lower not in book["author"].lower() and
-                query_lower not in book.get("isbn", "").lower()):
-                match = False
-        
-        if author and match:
-            if not isinstance(author, str):
-                match = False
-            elif author.lower() not in book["author"].lower():
-                match = False
-        
-        if title and match:
-            if not isinstance(title, str):
-                match = False
-            elif title.lower() not in book["title"].lower():
-                match = False
-        
-        if isbn and match:
-            if not isinstance(isbn, str):
-                match = False
-            elif isbn != book.get("isbn", ""):
-                match = False
-        
-        if match:
+    _sync_indexes()
+    
+    # Candidates come from the longest (most selective) term's posting lists;
+    # every term is then checked against the pre-lowercased fields
+    terms = [(value.lower(), fields) for value, fields in
+             ((query, (0, 1, 2)), (title, (0,)), (author, (1,))) if value]
+    if isbn:
+        # ISBN is an exact (normalized) match: at most one hash lookup
+        book_id = isbn_index.get(normalize_isbn(isbn))
+        candidates = set() if book_id is None else {book_id}
+    elif not terms:
+        return list(catalog.values())
+    else:
+        candidates = _substring_candidates(max(terms, key=lambda t: len(t[0]))[0])
+    
+    results = []
+    for book_id in sorted(candidates, key=search_order.__getitem__):
+        fields = search_fields[book_id]
+        book = catalog.get(book_id)
+        if book is None:
+            continue
+        if all(any(term in fields[i] for i in positions) for term, positions in terms):
             results.append(book)
     
     return results
@@ -500,6 +731,8 @@ def get_book_by_isbn(isbn):
     """
     Get a book by its ISBN.
     
+    ISBN-10 and ISBN-13 forms of the same book both match (see normalize_isbn).
+    
     Args:
         isbn: ISBN to search for
     
@@ -509,9 +742,11 @@ def get_book_by_isbn(isbn):
     if not isbn:
         return None
     
-    for book in catalog.values():
-        if book.get("isbn") == isbn:
-            return book
+    _sync_indexes()
+    key = normalize_isbn(isbn)
+    book = catalog.get(isbn_index.get(key))
+    if book is not None and normalize_isbn(book.get("isbn")) == key:
+        return book
     
     return None
 
@@ -529,12 +764,7 @@ def get_patron_borrow_count(patron_id):
     if not patron_id:
         return 0
     
-    count = 0
-    for record in borrowed_books.values():
-        if record.get("patron_id") == patron_id and not record.get("returned", False):
-            count += 1
-    
-    return count
+    return len(_active_loans(patron_id))
 
 
 # ==================== Database Insert Functions (for testing) ====================
@@ -554,7 +784,7 @@ def insert_book(book_data):
     book_id = catalog_id_counter
     
     book_data["book_id"] = book_id
-    catalog[book_id] = book_data
+    _store_book(book_id, book_data)
     
     return book_id
 
@@ -576,7 +806,7 @@ def insert_borrow_record(borrow_data):
         return None
     
     borrow_key = f"{patron_id}_{book_id}"
-    borrowed_books[borrow_key] = borrow_data
+    _store_loan(borrow_key, borrow_data)
     
     return borrow_key
 
@@ -587,6 +817,8 @@ def reset_globals():
     ls.catalog.clear()
     ls.borrowed_books.clear()
     ls.catalog_id_counter = 0
+    ls._clear_indexes()
+    ls._clear_patron_index()
 
 def test_borrow_book_success():
     # 直接插入书，获得 book_id
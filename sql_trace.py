@@ -0,0 +1,261 @@
+"""
+SQL trace module for Library Management System
+Opt-in statement tracing: slow-query log, per-fingerprint totals and query plans
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+from flask import current_app, jsonify
+
+import metrics
+
+DEFAULT_SLOW_QUERY_MS = 100.0
+MAX_FINGERPRINTS = 500
+OTHER_FINGERPRINT = '<other>'
+EXAMPLE_LENGTH = 500
+# Tables a full scan of which is logged as a warning
+WATCHED_TABLES = ('books', 'borrow_records')
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete', 'replace')
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.I)
+_PARAM_RE = re.compile(r"[:@$][A-Za-z_]\w*|\?\d*")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_TABLE_RE = re.compile(r"\b(?:from|join|update|into)\s+(\w+)(?:\s+(?:as\s+)?(\w+))?", re.I)
+_SCAN_RE = re.compile(r"^SCAN (\w+)$")
+_NOT_ALIASES = {'where', 'on', 'join', 'left', 'inner', 'cross', 'outer', 'natural', 'group', 'order',
+                'limit', 'set', 'using', 'values', 'select', 'default', 'union', 'except', 'intersect',
+                'having', 'window', 'returning', 'indexed', 'not'}
+
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a statement so that runs differing only in literals or bound
+    parameters share one key: comments dropped, string and number literals
+    and placeholders replaced by ?, IN lists collapsed, whitespace folded
+    and the text lowercased.
+    """
+    text = _COMMENT_RE.sub(' ', sql)
+    text = _STRING_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text)
+    text = _PARAM_RE.sub('?', text)
+    text = _LIST_RE.sub('(?, ...)', text)
+    return _SPACE_RE.sub(' ', text).strip().rstrip(';').strip().lower()
+
+def full_scans(sql: str, plan: List[str]) -> List[str]:
+    """
+    Tables of WATCHED_TABLES read by a full table scan in an EXPLAIN QUERY
+    PLAN; aliases in the plan are resolved through the statement's FROM/JOIN
+    clauses. Scans through an index are not counted.
+    """
+    aliases = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[alias.lower()] = table.lower()
+    tables = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail.strip())
+        if match:
+            table = aliases.get(match.group(1).lower(), match.group(1).lower())
+            if table in WATCHED_TABLES and table not in tables:
+                tables.append(table)
+    return tables
+
+def _new_entry(example: str) -> Dict:
+    return {'count': 0, 'timed': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'example': example[:EXAMPLE_LENGTH], 'plan': None, 'full_scans': []}
+
+class SQLTracer:
+    """
+    Aggregates the statements run on traced connections.
+
+    Statements come from two sources: the timing wrapper of
+    metrics.InstrumentedConnection (each execute call, with its duration)
+    and the connection's trace callback, which gives the statement with its
+    parameters expanded and also reports what runs outside execute calls,
+    such as the implicit BEGIN and the COMMIT of conn.commit(). Those are
+    counted under their fingerprint without a duration.
+
+    Each new fingerprint gets its EXPLAIN QUERY PLAN captured once, on the
+    same connection and with the same parameters.
+    """
+
+    def __init__(self, slow_query_ms: float = DEFAULT_SLOW_QUERY_MS, explain: bool = True,
+                 max_fingerprints: int = MAX_FINGERPRINTS):
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self.max_fingerprints = max_fingerprints
+        self.slow_queries = 0
+        self._stats: Dict[str, Dict] = {}
+        self._pending: Dict[int, List[str]] = {}    # id(conn) -> statements seen by its callback
+        self._lock = threading.Lock()
+
+    def attach(self, conn: sqlite3.Connection) -> None:
+        """Install the trace callback on a connection."""
+        pending: List[str] = []
+        self._pending[id(conn)] = pending
+        conn.set_trace_callback(pending.append)
+
+    def detach(self, conn: sqlite3.Connection) -> None:
+        """Remove the trace callback; call it before the connection is closed."""
+        if self._pending.pop(id(conn), None) is not None:
+            try:
+                conn.set_trace_callback(None)
+            except sqlite3.ProgrammingError:
+                pass    # already closed: the pool is discarding a dead connection
+
+    def _entry(self, key: str, example: str) -> Dict:
+        # Caller holds the lock
+        entry = self._stats.get(key)
+        if entry is None:
+            if len(self._stats) >= self.max_fingerprints:
+                key = OTHER_FINGERPRINT
+                entry = self._stats.get(key)
+            if entry is None:
+                entry = self._stats[key] = _new_entry(example)
+        return entry
+
+    def observe(self, conn: sqlite3.Connection, sql: str, parameters, elapsed: float) -> None:
+        """metrics observer: record one timed statement (and whatever the callback saw)."""
+        try:
+            self._observe(conn, sql, parameters, elapsed)
+        except Exception:
+            logger.exception("SQL trace failed")
+
+    def _observe(self, conn, sql, parameters, elapsed):
+        key = fingerprint(sql)
+        pending = self._pending.get(id(conn), [])
+        traced = pending[:]
+        pending.clear()
+        expanded = sql
+        others = []
+        for statement in traced:
+            if statement == expanded:
+                continue    # a trigger step, reported with the firing statement's text
+            if expanded is sql and fingerprint(statement) == key:
+                expanded = statement
+            else:
+                others.append(statement)
+
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            for statement in others:
+                self._entry(fingerprint(statement), statement)['count'] += 1
+            entry = self._entry(key, expanded)
+            first = entry['count'] == 0
+            entry['count'] += 1
+            entry['timed'] += 1
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+            slow = elapsed_ms >= self.slow_query_ms
+            if slow:
+                self.slow_queries += 1
+            if first and self.explain and parameters is not None:
+                # Claim the plan slot so concurrent first runs explain once
+                entry['plan'] = []
+
+        if slow:
+            logger.warning("Slow query (%.1f ms): %s", elapsed_ms, _SPACE_RE.sub(' ', expanded).strip())
+        if first and self.explain and parameters is not None:
+            self._explain(conn, key, sql, parameters, entry)
+
+    def _explain(self, conn, key, sql, parameters, entry):
+        if key.split(' ', 1)[0] not in EXPLAINABLE:
+            entry['plan'] = None
+            return
+        try:
+            # Base-class execute: the EXPLAIN itself is neither timed nor traced
+            rows = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            logger.debug("EXPLAIN QUERY PLAN failed for %s: %s", key, e)
+            entry['plan'] = None
+            return
+        finally:
+            pending = self._pending.get(id(conn))
+            if pending:
+                pending.clear()
+        plan = [row[3] for row in rows]
+        scans = full_scans(sql, plan)
+        with self._lock:
+            entry['plan'] = plan
+            entry['full_scans'] = scans
+        if scans:
+            logger.warning("Full scan of %s: %s\n  %s", ', '.join(scans), key, '\n  '.join(plan))
+        else:
+            logger.debug("Query plan for %s:\n  %s", key, '\n  '.join(plan))
+
+    def report(self, limit: Optional[int] = None) -> List[Dict]:
+        """Per-fingerprint totals, most total time first."""
+        with self._lock:
+            rows = [dict(entry, fingerprint=key, plan=list(entry['plan'] or []) or None,
+                         full_scans=list(entry['full_scans']),
+                         mean_ms=entry['total_ms'] / entry['timed'] if entry['timed'] else 0.0)
+                    for key, entry in self._stats.items()]
+        rows.sort(key=lambda row: (-row['total_ms'], -row['count'], row['fingerprint']))
+        return rows[:limit] if limit is not None else rows
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.slow_queries = 0
+
+_tracer: Optional[SQLTracer] = None
+
+def get_tracer() -> Optional[SQLTracer]:
+    return _tracer
+
+def install(tracer: Optional[SQLTracer]) -> None:
+    """
+    Make tracer the process-wide tracer (None turns tracing off).
+
+    Only connections opened afterwards get the trace callback, so install
+    before the pool is (re)built, as init_app does.
+    """
+    global _tracer
+    if _tracer is not None:
+        metrics.remove_sql_observer(_tracer.observe)
+    _tracer = tracer
+    if tracer is not None:
+        metrics.add_sql_observer(tracer.observe)
+
+def attach(conn: sqlite3.Connection) -> None:
+    """Pool on_connect hook: trace the new connection if tracing is on."""
+    if _tracer is not None:
+        _tracer.attach(conn)
+
+def detach(conn: sqlite3.Connection) -> None:
+    """Pool on_close hook: stop tracing a connection about to be closed."""
+    if _tracer is not None:
+        _tracer.detach(conn)
+
+def report_view():
+    """JSON dump of the trace aggregates, most total time first."""
+    tracer = current_app.extensions['sql_trace']
+    return jsonify({'slow_query_ms': tracer.slow_query_ms, 'slow_queries': tracer.slow_queries,
+                    'statements': tracer.report()})
+
+def init_app(app):
+    """
+    Turn tracing on when SQL_TRACE_ENABLED is true (default False).
+
+    SQL_SLOW_QUERY_MS sets the slow-query log threshold and
+    SQL_TRACE_EXPLAIN (default True) the plan capture. The tracer is kept in
+    app.extensions['sql_trace'] and its aggregates served at /debug/sql.
+    Must run before database.init_app, which rebuilds the pool.
+    """
+    if not app.config.setdefault('SQL_TRACE_ENABLED', False):
+        install(None)
+        return
+    tracer = SQLTracer(slow_query_ms=app.config.setdefault('SQL_SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS),
+                       explain=app.config.setdefault('SQL_TRACE_EXPLAIN', True))
+    install(tracer)
+    app.extensions['sql_trace'] = tracer
+    app.add_url_rule('/debug/sql', 'sql_trace', report_view)
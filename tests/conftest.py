@@ -0,0 +1,39 @@
+import pytest
+
+import database
+from app import create_app
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """Point the database layer at a throwaway file and start a fresh pool."""
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "library.db"))
+    monkeypatch.setattr(database, "POOL_OPTIONS", dict(database.POOL_OPTIONS))
+    database.reset_pool()
+    yield database.DATABASE
+    database.reset_pool()
+
+
+@pytest.fixture
+def sample_db(temp_db):
+    """temp_db with the migrated schema and the sample books and loans."""
+    database.init_database()
+    database.add_sample_data()
+    return temp_db
+
+
+@pytest.fixture
+def app_config():
+    """Extra create_app() settings for the app fixture; override it in a test module."""
+    return {}
+
+
+@pytest.fixture
+def app(temp_db, app_config):
+    """App on temp_db; create_app() sets up the schema and the sample data."""
+    return create_app(dict({"TESTING": True, "DATABASE": temp_db}, **app_config))
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask import stream_with_context
+
+import async_api
+import catalog_version
+import database
+import metrics
+
+
+@pytest.fixture
+def app(app):
+    now = datetime.now()
+    for patron_id, book_id, overdue_days in (("111111", 1, 3), ("111111", 2, 12), ("222222", 1, 40),
+                                             ("222222", 3, -5)):
+        due = now - timedelta(days=overdue_days, hours=1)
+        database.insert_borrow_record(patron_id, book_id, due - timedelta(days=14), due)
+    return app
+
+
+@pytest.fixture
+def asgi(app):
+    asgi = async_api.AsyncAPI(app, chunk_size=2)
+    yield asgi
+    asgi.wsgi_executor.shutdown(wait=True)
+    asgi.executor.shutdown(wait=True)
+
+
+async def request(asgi, method, path, query="", headers=(), body=b""):
+    """Drive one HTTP request through the ASGI app; returns (status, headers, body)."""
+    scope = {
+        "type": "http", "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "root_path": "", "query_string": query.encode("latin-1"),
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        "server": ("testserver", 80), "client": ("127.0.0.1", 5000),
+    }
+    incoming = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi(scope, receive, send)
+    start = sent[0]
+    assert start["type"] == "http.response.start"
+    assert not sent[-1].get("more_body")
+    return (start["status"], {k.decode(): v.decode() for k, v in start["headers"]},
+            b"".join(m.get("body", b"") for m in sent[1:]))
+
+
+def call(asgi, *args, **kwargs):
+    return asyncio.run(request(asgi, *args, **kwargs))
+
+
+@pytest.mark.parametrize("query", ["q=gatsby&type=title", "q=GATSBY", "q=Orwell&type=author", "q=", "q=zzz"])
+def test_search_matches_the_flask_api(app, asgi, query):
+    flask_response = app.test_client().get(f"/api/search?{query}")
+    status, headers, body = call(asgi, "GET", "/api/search", query)
+    assert status == flask_response.status_code
+    assert body == flask_response.data
+    assert headers["content-type"] == "application/json"
+
+
+def test_search_answers_conditional_requests(app, asgi, monkeypatch):
+    catalog_version.current(database.DATABASE)
+    later = time.time() + 1
+    monkeypatch.setattr(catalog_version, "time", SimpleNamespace(time=lambda: later))
+    status, headers, body = call(asgi, "GET", "/api/search", "q=gatsby")
+    flask_etag = app.test_client().get("/api/search?q=gatsby").headers["ETag"]
+    assert headers["etag"] == flask_etag and headers["cache-control"] == "no-cache"
+
+    status, headers, body = call(asgi, "GET", "/api/search", "q=gatsby", [("If-None-Match", flask_etag)])
+    assert (status, body) == (304, b"")
+    status, _, _ = call(asgi, "GET", "/api/search", "q=gatsby", [("If-Modified-Since", headers["last-modified"])])
+    assert status == 304
+
+    database.insert_book("New Book", "Someone", "9781234567897", 1, 1)
+    status, _, body = call(asgi, "GET", "/api/search", "q=new book", [("If-None-Match", flask_etag)])
+    assert status == 200 and json.loads(body)["count"] == 1
+
+
+@pytest.mark.parametrize("path", ["/api/late_fee/111111/2", "/api/late_fee/222222/1", "/api/late_fee/999999/1"])
+def test_late_fee_matches_the_flask_api(app, asgi, path):
+    flask_response = app.test_client().get(path)
+    status, _, body = call(asgi, "GET", path)
+    assert status == flask_response.status_code
+    assert json.loads(body) == flask_response.get_json()
+
+
+LOANS = [{"patron_id": "111111", "book_id": 1}, {"patron_id": "111111", "book_id": 2},
+         {"patron_id": "222222", "book_id": 1}, {"patron_id": "123456", "book_id": 3},
+         {"patron_id": "222222", "book_id": 3}]
+
+
+@pytest.mark.parametrize("payload", [{"loans": LOANS}, {"patron_ids": ["222222", "111111", "111111", "999999"]}])
+@pytest.mark.parametrize("query", ["", "format=ndjson"])
+def test_batch_late_fees_match_the_flask_api_across_chunks(app, asgi, payload, query):
+    data = json.dumps(payload).encode()
+    flask_response = app.test_client().post(f"/api/late_fees?{query}", data=data,
+                                            content_type="application/json")
+    status, headers, body = call(asgi, "POST", "/api/late_fees", query,
+                                 [("Content-Type", "application/json")], data)
+    assert status == flask_response.status_code == 200
+    assert headers["content-type"] == flask_response.mimetype
+    # Five loans over chunks of two: three concurrent queries, same body
+    assert body == flask_response.data
+
+
+def test_batch_late_fees_negotiate_ndjson_and_validate(app, asgi):
+    data = json.dumps({"loans": LOANS[:2]}).encode()
+    status, headers, body = call(asgi, "POST", "/api/late_fees", "",
+                                 [("Content-Type", "application/json"), ("Accept", "application/x-ndjson")], data)
+    assert headers["content-type"] == "application/x-ndjson"
+    assert len(body.splitlines()) == 2
+
+    for bad, content_type in ((b'{"loans": []}', "application/json"), (b"not json", "application/json"),
+                              (data, "text/plain")):
+        flask_response = app.test_client().post("/api/late_fees", data=bad, content_type=content_type)
+        status, _, body = call(asgi, "POST", "/api/late_fees", "", [("Content-Type", content_type)], bad)
+        assert status == flask_response.status_code == 400
+        assert body == flask_response.data
+
+
+def test_batch_chunks_run_concurrently(app, asgi, monkeypatch):
+    barrier = threading.Barrier(3, timeout=5)
+    original = async_api._list_late_fees
+
+    def wait_for_the_others(*args):
+        barrier.wait()   # raises BrokenBarrierError unless three chunks run at once
+        return original(*args)
+
+    monkeypatch.setattr(async_api, "_list_late_fees", wait_for_the_others)
+    status, _, body = call(asgi, "POST", "/api/late_fees", "", [("Content-Type", "application/json")],
+                           json.dumps({"loans": LOANS}).encode())
+    assert status == 200 and json.loads(body)["count"] == 5
+
+
+def test_many_clients_share_the_bounded_pool(app, asgi):
+    async def many():
+        return await asyncio.gather(*(request(asgi, "GET", f"/api/late_fee/111111/{1 + i % 3}")
+                                      for i in range(300)))
+
+    responses = asyncio.run(many())
+    assert all(status == 200 for status, _, _ in responses)
+    assert asgi.executor._max_workers == database.POOL_OPTIONS["max_size"]
+
+
+def test_other_routes_are_served_by_flask(app, asgi):
+    status, headers, body = call(asgi, "GET", "/api/books", "limit=2")
+    flask_response = app.test_client().get("/api/books?limit=2")
+    assert (status, body) == (200, flask_response.data)
+    assert call(asgi, "GET", "/no-such-page")[0] == 404
+    assert call(asgi, "DELETE", "/api/search")[0] == 405
+
+    status, headers, _ = call(asgi, "POST", "/borrow", "", [("Content-Type", "application/x-www-form-urlencoded")],
+                              b"patron_id=123456&book_id=1")
+    assert status == 302 and headers["location"].endswith("/catalog")
+
+    status, headers, body = call(asgi, "GET", "/api/export/borrows", "format=csv")
+    assert status == 200 and headers["content-type"].startswith("text/csv")
+    assert body == app.test_client().get("/api/export/borrows?format=csv").data
+
+
+def test_slow_downloads_leave_the_api_routes_free(app):
+    release = threading.Event()
+
+    @app.route("/slow-export")
+    def slow_export():
+        def generate():
+            database.get_all_books()            # holds a pooled connection until the body is read
+            for _ in range(100):
+                yield b"row\n"
+        return app.response_class(stream_with_context(generate()))
+
+    asgi = async_api.AsyncAPI(app, threads=4)
+    assert asgi.wsgi_threads == 2
+
+    async def slow_client():
+        scope = {"type": "http", "method": "GET", "path": "/slow-export", "query_string": b"", "headers": []}
+        incoming = [{"type": "http.request", "body": b""}]
+
+        async def receive():
+            return incoming.pop(0)
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+        await asgi(scope, receive, send)
+
+    async def scenario():
+        slow = [asyncio.create_task(slow_client()) for _ in range(asgi.threads)]
+        await asyncio.sleep(0.1)
+        try:
+            return await asyncio.wait_for(asyncio.gather(
+                *(request(asgi, "GET", f"/api/late_fee/111111/{1 + i % 3}") for i in range(20)),
+                request(asgi, "GET", "/api/search", "q=gatsby")), timeout=5)
+        finally:
+            release.set()
+            await asyncio.gather(*slow)
+
+    try:
+        responses = asyncio.run(scenario())
+    finally:
+        release.set()
+        asgi.close()
+    assert all(status == 200 for status, _, _ in responses)
+
+
+def test_api_routes_are_counted_under_the_flask_endpoints(app, asgi):
+    metrics.REGISTRY.reset()
+    call(asgi, "GET", "/api/search", "q=gatsby")
+    call(asgi, "GET", "/api/search", "q=")
+    call(asgi, "GET", "/api/late_fee/111111/2")
+    call(asgi, "POST", "/api/late_fees", "", [("Content-Type", "application/json")],
+         json.dumps({"loans": LOANS}).encode())
+    call(asgi, "GET", "/api/books", "limit=2")
+
+    adapter = app.url_map.bind("testserver")
+    for method, path, status in (("GET", "/api/search", "200"), ("GET", "/api/search", "400"),
+                                 ("GET", "/api/late_fee/111111/2", "200"), ("POST", "/api/late_fees", "200"),
+                                 ("GET", "/api/books", "200")):
+        endpoint, _ = adapter.match(path, method)
+        assert metrics.REGISTRY.value("library_http_requests_total", endpoint=endpoint, status=status) == 1
+
+    # Statements run on the thread pool are counted for the request, across concurrent chunks too
+    batch = metrics.REGISTRY.get_histogram("library_http_request_sql_statements", endpoint="api.get_late_fees_batch")
+    assert batch.count == 1 and batch.sum >= 3
+    metrics.REGISTRY.reset()
+
+
+def test_lifespan_shuts_the_pool_down(app):
+    asgi = async_api.AsyncAPI(app)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(asgi({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert database._pool is None
+    for executor in (asgi.executor, asgi.wsgi_executor):
+        with pytest.raises(RuntimeError):
+            executor.submit(print)
+
+
+def test_oversized_bodies_are_rejected(app, asgi):
+    app.config["MAX_CONTENT_LENGTH"] = 10
+    status, _, body = call(asgi, "POST", "/api/late_fees", "", [("Content-Type", "application/json")],
+                           json.dumps({"loans": LOANS}).encode())
+    assert status == 413 and json.loads(body) == {"error": "Request body too large"}
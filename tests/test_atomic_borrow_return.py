@@ -0,0 +1,105 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+
+
+pytestmark = pytest.mark.usefixtures("sample_db")
+
+
+def available(book_id):
+    return database.get_book_by_id(book_id)["available_copies"]
+
+
+# -----------------------------
+# borrow_atomic / return_atomic
+# -----------------------------
+def test_borrow_atomic_statuses():
+    now = datetime.now()
+    due = now + timedelta(days=14)
+    assert database.borrow_atomic("111111", 999, now, due)[0] == "not_found"
+    assert database.borrow_atomic("111111", 3, now, due)[0] == "unavailable"
+
+    status, book = database.borrow_atomic("111111", 1, now, due)
+    assert status == "ok"
+    assert book["title"] == "The Great Gatsby"
+    assert available(1) == 2
+    assert database.get_patron_borrow_count("111111") == 1
+
+
+def test_borrow_atomic_limit_leaves_no_trace():
+    now = datetime.now()
+    due = now + timedelta(days=14)
+    assert database.borrow_atomic("111111", 1, now, due, max_borrowed=1)[0] == "ok"
+    assert database.borrow_atomic("111111", 2, now, due, max_borrowed=1)[0] == "limit_reached"
+    assert available(2) == 2
+    assert database.get_patron_borrow_count("111111") == 1
+
+
+def test_return_atomic_statuses():
+    now = datetime.now()
+    assert database.return_atomic("123456", 999, now)[0] == "not_found"
+    assert database.return_atomic("654321", 3, now)[0] == "not_borrowed"
+
+    status, book = database.return_atomic("123456", 3, now)
+    assert status == "ok"
+    assert isinstance(book["due_date"], datetime)
+    assert available(3) == 1
+    assert database.get_patron_borrow_count("123456") == 0
+    assert database.return_atomic("123456", 3, now)[0] == "not_borrowed"
+
+
+def test_concurrent_borrowers_cannot_oversell():
+    assert database.insert_book("Last Copy", "Author", "5555555555555", 1, 1)
+    book_id = database.get_book_by_isbn("5555555555555")["id"]
+    results = []
+
+    def borrow(patron_id):
+        results.append(library_service.borrow_book_by_patron(patron_id, book_id)[0])
+
+    threads = [threading.Thread(target=borrow, args=(f"{200000 + i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results.count(True) == 1
+    assert available(book_id) == 0
+
+
+# -----------------------------
+# library_service (SQLite) R3 / R4
+# -----------------------------
+def test_borrow_and_return_round_trip():
+    success, message = library_service.borrow_book_by_patron("222222", 2)
+    assert success and "Due date" in message
+    success, message = library_service.return_book_by_patron("222222", 2)
+    assert success and "No late fee" in message
+    assert available(2) == 2
+
+
+def test_borrow_limit_is_five_books():
+    for i in range(5):
+        database.insert_book(f"Book {i}", "Author", f"{1000000000000 + i}", 1, 1)
+        book_id = database.get_book_by_isbn(f"{1000000000000 + i}")["id"]
+        assert library_service.borrow_book_by_patron("333333", book_id)[0]
+    success, message = library_service.borrow_book_by_patron("333333", 1)
+    assert not success
+    assert "maximum borrowing limit" in message
+
+
+def test_return_reports_late_fee_from_due_date():
+    database.insert_borrow_record("444444", 1, datetime.now() - timedelta(days=24),
+                                  datetime.now() - timedelta(days=10, hours=1))
+    success, message = library_service.return_book_by_patron("444444", 1)
+    assert success
+    assert "Late fee: $6.50 (10 day(s) overdue)" in message
+
+
+def test_return_errors_map_to_messages():
+    assert library_service.return_book_by_patron("123456", 999) == (False, "Book not found.")
+    success, message = library_service.return_book_by_patron("654321", 1)
+    assert not success and "not borrowed" in message
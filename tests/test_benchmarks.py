@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+import database
+import services.library_service as memory_service
+from benchmarks import run as bench
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", database.DATABASE)
+    yield
+    memory_service.reset_globals()
+    database.reset_pool()
+
+
+def test_runner_covers_every_case_for_both_backends(tmp_path):
+    report = bench.run([200], bench.BACKENDS, min_time=0.0, pool=20, workdir=str(tmp_path), log=lambda msg: None)
+    cases = {(r["backend"], r["case"]) for r in report["results"]}
+    names = {"search_books_in_catalog", "borrow_book_by_patron", "return_book_by_patron",
+             "calculate_late_fee_for_book", "get_patron_status_report", "get_all_books"}
+    assert cases == {(backend, name) for backend in bench.BACKENDS for name in names}
+    assert all(r["iterations"] >= 1 and r["min"] <= r["median"] <= r["p95"] for r in report["results"])
+    json.dumps(report)
+
+
+def test_compare_flags_regressions():
+    baseline = {"results": [{"backend": "sqlite", "size": 10, "case": "a", "median": 1.0},
+                            {"backend": "sqlite", "size": 10, "case": "b", "median": 1.0}]}
+    current = {"results": [{"backend": "sqlite", "size": 10, "case": "a", "median": 1.1},
+                           {"backend": "sqlite", "size": 10, "case": "b", "median": 1.5},
+                           {"backend": "memory", "size": 10, "case": "a", "median": 9.0}]}
+    rows = bench.compare(current, baseline, threshold=0.2)
+    assert [(r["case"], r["regression"]) for r in rows] == [("a", False), ("b", True)]
+
+
+def test_main_writes_results_and_fails_on_regression(tmp_path, monkeypatch):
+    out = tmp_path / "results.json"
+    args = ["--sizes", "100", "--backend", "memory", "--min-time", "0", "--pool", "5"]
+    assert bench.main(args + ["-o", str(out)]) == 0
+    baseline = json.loads(out.read_text())
+    for result in baseline["results"]:
+        result["median"] /= 1000
+    out.write_text(json.dumps(baseline))
+    assert bench.main(args + ["--compare", str(out), "--fail-on-regression"]) == 1
@@ -0,0 +1,127 @@
+from contextlib import contextmanager
+
+import pytest
+
+import database
+import library_service
+from app import create_app
+from lru_cache import LRUCache
+
+
+@pytest.fixture(autouse=True)
+def cache_enabled(sample_db, monkeypatch):
+    monkeypatch.setattr(database.book_cache, "enabled", True)
+
+
+# -----------------------------
+# LRUCache
+# -----------------------------
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["hits"] == 3 and cache.stats["misses"] == 1
+
+
+def test_entries_expire_after_ttl():
+    now = [100.0]
+    cache = LRUCache(max_size=4, ttl=10.0, clock=lambda: now[0])
+    cache.set("a", 1)
+    now[0] = 109.0
+    assert cache.get("a") == 1
+    now[0] = 111.0
+    assert cache.get("a") is None
+    assert cache.stats["expired"] == 1
+    assert len(cache) == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = LRUCache(enabled=False)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.hit_rate() == 0.0
+
+
+# -----------------------------
+# Book lookups
+# -----------------------------
+def test_repeated_lookups_are_served_from_cache():
+    stats = database.book_cache.stats
+    before = dict(stats)
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+    assert stats["hits"] - before["hits"] == 1
+    assert database.get_book_by_isbn("9780743273565")["id"] == 1
+    assert database.get_book_by_isbn("9780743273565")["id"] == 1
+    assert stats["hits"] - before["hits"] == 3
+
+
+def test_callers_get_copies():
+    book = database.get_book_by_id(1)
+    book["title"] = "changed"
+    assert database.get_book_by_id(1)["title"] == "The Great Gatsby"
+
+
+def test_writes_invalidate_cached_books():
+    assert database.get_book_by_id(1)["available_copies"] == 3
+    assert library_service.borrow_book_by_patron("654321", 1)[0]
+    assert database.get_book_by_id(1)["available_copies"] == 2
+    assert database.get_book_by_isbn("9780743273565")["available_copies"] == 2
+
+    assert library_service.return_book_by_patron("654321", 1)[0]
+    assert database.get_book_by_isbn("9780743273565")["available_copies"] == 3
+
+    database.update_book_availability(1, -1)
+    assert database.get_book_by_id(1)["available_copies"] == 2
+
+
+@pytest.mark.parametrize("lookup", [lambda: database.get_book_by_id(1),
+                                    lambda: database.get_book_by_isbn("9780743273565")])
+def test_rows_read_before_a_concurrent_write_are_not_cached(monkeypatch, lookup):
+    real = database.db_connection
+    pending = [True]
+
+    @contextmanager
+    def write_after_read():
+        with real() as conn:
+            yield conn
+        if pending:
+            pending.clear()
+            # Another thread commits and invalidates while the reader holds the old row
+            assert database.update_book_availability(1, -1)
+
+    monkeypatch.setattr(database, "db_connection", write_after_read)
+    assert lookup()["available_copies"] == 3
+    assert not pending
+    assert lookup()["available_copies"] == 2
+
+
+def test_set_skips_values_read_before_an_invalidation():
+    cache = LRUCache(ttl=None)
+    generation = cache.generation()
+    cache.invalidate("a")
+    cache.set("a", "old", generation)
+    assert cache.get("a") is None
+    cache.set("a", "new", cache.generation())
+    assert cache.get("a") == "new"
+
+
+def test_missing_books_are_not_cached():
+    assert database.get_book_by_isbn("9999999999999") is None
+    assert database.insert_book("New", "Author", "9999999999999", 1, 1)
+    assert database.get_book_by_isbn("9999999999999")["title"] == "New"
+
+
+def test_cache_can_be_disabled_from_config(monkeypatch):
+    monkeypatch.setattr(database, "PRAGMA_PROFILE", database.PRAGMA_PROFILE)
+    monkeypatch.setattr(database, "PRAGMAS", database.PRAGMAS)
+    create_app({"TESTING": True, "DATABASE": database.DATABASE, "BOOK_CACHE_ENABLED": False})
+    database.get_book_by_id(1)
+    assert len(database.book_cache) == 0
+    assert database.get_book_by_id(1) is not None
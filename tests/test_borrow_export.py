@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import borrow_export
+import database
+
+
+@pytest.fixture
+def app(app):
+    start = datetime(2025, 1, 1)
+    for i in range(25):
+        borrowed = start + timedelta(days=i)
+        database.insert_borrow_record(f"{100000 + i % 3}", 1 + i % 3, borrowed, borrowed + timedelta(days=14))
+    return app
+
+
+def test_ndjson_export_streams_all_records(client):
+    response = client.get("/api/export/borrows")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(records) == 26  # 25 + the sample loan
+    assert [r["id"] for r in records] == sorted(r["id"] for r in records)
+    assert set(records[0]) == set(database.BORROW_RECORD_FIELDS)
+
+
+def test_csv_export_with_filters(client):
+    response = client.get("/api/export/borrows?format=csv&patron_id=100001&since=2025-01-05&until=2025-01-20")
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [r["borrow_date"][:10] for r in rows] == ["2025-01-05", "2025-01-08", "2025-01-11",
+                                                     "2025-01-14", "2025-01-17"]
+    assert {r["patron_id"] for r in rows} == {"100001"}
+    assert rows[0]["return_date"] == ""
+
+
+@pytest.mark.parametrize("query", ["format=xml", "since=yesterday"])
+def test_bad_parameters_are_rejected(client, query):
+    response = client.get(f"/api/export/borrows?{query}")
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_export_is_chunked(app):
+    chunks = list(borrow_export.export_borrows("ndjson", batch_size=10))
+    assert [chunk.count("\n") for chunk in chunks] == [10, 10, 6]
+    csv_chunks = list(borrow_export.export_borrows("csv", batch_size=10))
+    assert csv_chunks[0].startswith("id,patron_id,book_id,borrow_date,due_date,return_date\n")
+
+
+def test_iter_borrow_records_is_lazy(app):
+    records = database.iter_borrow_records(batch_size=5)
+    first = next(records)
+    assert first[0] == 1
+    records.close()
+
+
+def test_cli_command(app, tmp_path):
+    out = tmp_path / "borrows.csv"
+    result = app.test_cli_runner().invoke(
+        args=["export-borrows", "--format", "csv", "--patron-id", "100002", "-o", str(out)])
+    assert result.exit_code == 0, result.output
+    rows = list(csv.DictReader(out.open()))
+    assert len(rows) == 8
+
+    stdout = app.test_cli_runner().invoke(args=["export-borrows", "--until", "2025-01-03"])
+    assert len(stdout.output.splitlines()) == 2
+
+    bad = app.test_cli_runner().invoke(args=["export-borrows", "--since", "nope"])
+    assert bad.exit_code != 0
@@ -0,0 +1,71 @@
+import io
+import json
+
+import pytest
+
+import bulk_import
+import database
+
+
+CSV_FEED = """title,author,isbn,total_copies
+Dune,Frank Herbert,9780441172719,4
+  Emma  ,Jane Austen,9780141439587,2
+,No Title,9780000000001,1
+Bad Copies,Someone,9780000000002,zero
+Short Isbn,Someone,12345,1
+Repeat,Someone,9780441172719,1
+Existing,Someone,9780743273565,1
+"""
+
+
+def test_csv_import_validates_and_skips_duplicates(app):
+    report = bulk_import.import_books(bulk_import.read_rows(io.StringIO(CSV_FEED), "csv"), batch_size=2)
+    assert report["rows"] == 7
+    assert report["inserted"] == 2
+    assert report["rows_per_sec"] > 0
+    reasons = {r["line"]: r["reason"] for r in report["rejected"]}
+    assert reasons == {
+        4: "Title is required.",
+        5: "Total copies must be a positive integer.",
+        6: "ISBN must be exactly 13 digits.",
+        7: "Duplicate ISBN in import file.",
+        8: "A book with this ISBN already exists.",
+    }
+    emma = database.get_book_by_isbn("9780141439587")
+    assert emma["title"] == "Emma"
+    assert emma["available_copies"] == 2
+
+
+def test_jsonl_import_in_batches(app, tmp_path):
+    path = tmp_path / "feed.jsonl"
+    with open(path, "w") as f:
+        for i in range(2500):
+            f.write(json.dumps({"title": f"Title {i}", "author": "Bulk",
+                                "isbn": f"{9790000000000 + i}", "total_copies": 1}) + "\n")
+        f.write("{not json}\n")
+    report = bulk_import.import_file(str(path), batch_size=1000)
+    assert report["inserted"] == 2500
+    assert report["rejected"] == [{"line": 2501, "isbn": None, "reason": "Malformed row."}]
+    assert len(database.search_books("Title 24", "title")) == 111  # 24, 240-249, 2400-2499
+
+
+def test_import_is_one_transaction(app, monkeypatch):
+    def broken_flush(conn, batch, rejected):
+        real_flush(conn, batch, rejected)
+        raise RuntimeError("disk full")
+
+    real_flush = bulk_import._flush_batch
+    monkeypatch.setattr(bulk_import, "_flush_batch", broken_flush)
+    rows = [(1, {"title": "Lost", "author": "A", "isbn": "9781234567897", "total_copies": 1})]
+    with pytest.raises(RuntimeError):
+        bulk_import.import_books(rows)
+    assert database.get_book_by_isbn("9781234567897") is None
+
+
+def test_cli_command(app, tmp_path):
+    path = tmp_path / "feed.csv"
+    path.write_text(CSV_FEED)
+    result = app.test_cli_runner().invoke(args=["import-books", str(path), "--batch-size", "3"])
+    assert result.exit_code == 0
+    assert "Read 7 rows, inserted 2, rejected 5" in result.output
+    assert "line 8: A book with this ISBN already exists." in result.output
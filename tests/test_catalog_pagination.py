@@ -0,0 +1,113 @@
+import pytest
+
+import database
+from routes.pagination import BookPage, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def app(app):
+    # Duplicate titles make sure the id tie-breaker is honoured
+    for i in range(7):
+        database.insert_book("Same Title", f"Author {i}", f"{2000000000000 + i}", 1, 1)
+    return app
+
+
+def walk_pages(limit):
+    pages, after = [], None
+    while True:
+        page = database.get_books_page(after, limit)
+        if not page:
+            return pages
+        pages.append(page)
+        after = (page[-1]["title"], page[-1]["id"])
+
+
+def test_keyset_pages_cover_catalog_in_order(app):
+    expected = sorted(database.get_all_books(), key=lambda b: (b["title"], b["id"]))
+    for limit in (1, 3, 4, 100):
+        flat = [book for page in walk_pages(limit) for book in page]
+        assert [b["id"] for b in flat] == [b["id"] for b in expected]
+
+
+def test_keyset_page_uses_index(app):
+    with database.db_connection() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM books WHERE (title, id) > (?, ?) ORDER BY title, id LIMIT ?",
+            ("M", 0, 10)).fetchall()
+    details = " ".join(row["detail"] for row in plan)
+    assert "idx_books_title_id" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    token = encode_cursor({"title": "Ünïcode / title", "id": 42})
+    assert decode_cursor(token) == ("Ünïcode / title", 42)
+    assert decode_cursor("") is None
+    for bad in ("not-a-cursor", encode_cursor({"title": 1, "id": "x"})):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_book_page_detects_more_rows():
+    rows = [{"title": "t", "id": i} for i in range(4)]
+    page = BookPage(rows, 3)
+    assert [b["id"] for b in page] == [0, 1, 2]
+    assert page.has_more and decode_cursor(page.next_cursor) == ("t", 2)
+
+    last = BookPage(rows[:3], 3)
+    list(last)
+    assert not last.has_more and last.next_cursor is None
+    assert not BookPage([], 3)
+
+
+def test_catalog_route_paginates(client):
+    first = client.get("/catalog?limit=4").get_data(as_text=True)
+    assert first.count("<tr>") == 5  # header + 4 rows
+    assert "Next page" in first
+
+    page_count, url = 0, "/catalog?limit=4"
+    while url:
+        html = client.get(url).get_data(as_text=True)
+        page_count += 1
+        url = _next_link(html) if "Next page" in html else None
+    assert page_count == 3  # 10 books, 4 per page
+
+
+def _next_link(html):
+    marker = html.index("Next page")
+    start = html.rindex('href="', 0, marker) + len('href="')
+    return html[start:html.index('"', start)].replace("&amp;", "&")
+
+
+def test_catalog_route_bad_cursor_falls_back_to_first_page(client):
+    html = client.get("/catalog?after=garbage").get_data(as_text=True)
+    assert "Invalid page cursor." in html
+    assert "1984" in html
+
+
+def test_catalog_can_stream(app, client):
+    app.config["CATALOG_STREAM_TEMPLATE"] = True
+    response = client.get("/catalog?limit=2")
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    assert html.count("<tr>") == 3
+    assert "Next page" in html
+
+
+def test_books_api_pages(client):
+    seen, after = [], ""
+    while True:
+        data = client.get(f"/api/books?limit=3&after={after}").get_json()
+        seen.extend(b["id"] for b in data["books"])
+        assert data["count"] == len(data["books"])
+        if data["next_after"] is None:
+            break
+        after = data["next_after"]
+    assert sorted(seen) == list(range(1, 11))
+    assert len(seen) == 10
+
+
+def test_books_api_rejects_bad_cursor(client):
+    response = client.get("/api/books?after=%%%")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid page cursor."
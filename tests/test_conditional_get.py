@@ -0,0 +1,126 @@
+import io
+import json
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from werkzeug.http import http_date
+
+import bulk_import
+import catalog_version
+import database
+
+
+URLS = ("/catalog", "/search?q=gatsby&type=title", "/api/search?q=gatsby&type=title")
+
+
+def fail(*args, **kwargs):
+    raise AssertionError("database was queried for a current client")
+
+
+@pytest.fixture
+def clock(temp_db, monkeypatch):
+    """catalog_version's wall clock, frozen at a whole second; advance it with clock.now += 1."""
+    clock = SimpleNamespace(now=float(int(time.time())))
+    monkeypatch.setattr(catalog_version, "time", SimpleNamespace(time=lambda: clock.now))
+    catalog_version.current(temp_db)
+    return clock
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_current_client_gets_304_without_database_access(client, monkeypatch, url):
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert not etag.startswith("W/")
+
+    monkeypatch.setattr("routes.catalog_routes.iter_books_page", fail)
+    monkeypatch.setattr("routes.search_routes.search_books_in_catalog", fail)
+    monkeypatch.setattr("routes.api_routes.search_books_in_catalog", fail)
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+
+@pytest.mark.parametrize("change", ["insert", "borrow", "return", "availability", "import"])
+def test_catalog_changes_invalidate_etag(client, change):
+    etag = client.get("/catalog").headers["ETag"]
+    now = datetime.now()
+    if change == "insert":
+        database.insert_book("New Book", "Author", "9990000000001", 1, 1)
+    elif change == "borrow":
+        assert database.borrow_atomic("654321", 1, now, now + timedelta(days=14))[0] == "ok"
+    elif change == "return":
+        assert database.return_atomic("123456", 3, now)[0] == "ok"
+    elif change == "availability":
+        database.update_book_availability(1, -1)
+    else:
+        stream = io.StringIO("title,author,isbn,total_copies\nImported,Author,9990000000002,2\n")
+        bulk_import.import_books(bulk_import.read_rows(stream, "csv"))
+
+    response = client.get("/catalog", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+def test_if_modified_since(clock, client):
+    url = "/api/search?q=gatsby&type=title"
+    clock.now += 1
+    first = client.get(url)
+    last_modified = first.headers["Last-Modified"]
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # A change in the current second: the ETag moves, Last-Modified is withheld
+    database.update_book_availability(1, -1)
+    changed = client.get(url, headers={"If-None-Match": first.headers["ETag"],
+                                       "If-Modified-Since": last_modified})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert "Last-Modified" not in changed.headers
+
+    clock.now += 1
+    settled = client.get(url, headers={"If-Modified-Since": last_modified})
+    assert settled.status_code == 200
+    assert client.get(url, headers={"If-Modified-Since": settled.headers["Last-Modified"]}).status_code == 304
+
+
+def test_two_changes_in_one_second_never_yield_a_stale_304(clock, client):
+    clock.now += 1
+    url = "/api/search?q=Same Second&type=title"
+    database.insert_book("Same Second", "Author", "9990000000011", 1, 1)
+    first = client.get(url)
+    assert first.get_json()["count"] == 1
+    assert "Last-Modified" not in first.headers
+    headers = {"If-Modified-Since": http_date(clock.now)}
+
+    database.insert_book("Same Second Again", "Author", "9990000000012", 1, 1)
+    again = client.get(url, headers=headers)
+    assert again.status_code == 200
+    assert json.loads(again.data)["count"] == 2
+
+
+def test_flashed_messages_bypass_validators(client):
+    etag = client.get("/catalog").headers["ETag"]
+    with client.session_transaction() as sess:
+        sess["_flashes"] = [("success", "Borrowed!")]
+    response = client.get("/catalog", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "Borrowed!" in response.get_data(as_text=True)
+    assert "ETag" not in response.headers
+
+
+def test_error_responses_carry_no_validators(client):
+    response = client.get("/api/search?q=")
+    assert response.status_code == 400
+    assert "ETag" not in response.headers
+
+
+def test_last_modified_never_runs_ahead_of_the_clock():
+    key = "bump-test.db"
+    for _ in range(100):
+        catalog_version.bump(key)
+    version, last_modified = catalog_version.current(key)
+    assert version == 100
+    assert last_modified <= time.time()
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pytest
+
+import database
+from app import create_app
+from db_pool import ConnectionPool, PoolExhaustedError
+
+
+# -----------------------------
+# ConnectionPool
+# -----------------------------
+def test_pool_reuses_released_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert pool.stats["created"] == 1
+    assert pool.stats["reused"] == 1
+
+
+def test_pool_blocks_when_exhausted(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    pool.release(conn)
+    assert pool.size() == (1, 0)
+
+
+def test_pool_waiter_gets_released_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=1, timeout=2.0)
+    conn = pool.acquire()
+    got = []
+
+    def waiter():
+        with pool.connection() as c:
+            got.append(c)
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    time.sleep(0.05)
+    pool.release(conn)
+    t.join()
+    assert got == [conn]
+
+
+def test_pool_evicts_idle_connections(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), idle_timeout=0.0)
+    with pool.connection():
+        pass
+    time.sleep(0.01)
+    with pool.connection():
+        pass
+    assert pool.stats["evicted"] == 1
+    assert pool.stats["created"] == 2
+
+
+def test_pool_discards_unhealthy_connection(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), health_check_interval=0.0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.close()  # simulate a connection that died while idle
+    time.sleep(0.01)
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert pool.stats["discarded"] == 1
+
+
+def test_pool_rolls_back_uncommitted_work(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_pool_close_all_retires_checked_out_connections(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    conn = pool.acquire()
+    pool.close_all()
+    pool.release(conn)
+    assert pool.size() == (0, 0)
+
+
+def test_stats_stay_consistent_across_threads(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"), max_size=4)
+
+    def worker():
+        for _ in range(200):
+            with pool.connection():
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = pool.stats_snapshot()
+    assert stats["created"] + stats["reused"] == 8 * 200
+    assert stats["created"] <= 4
+    assert stats == pool.stats and stats is not pool.stats
+
+
+def test_on_close_runs_before_every_close(tmp_path):
+    closed = []
+    pool = ConnectionPool(str(tmp_path / "pool.db"), idle_timeout=0.0,
+                          on_close=lambda conn: closed.append(conn.execute("SELECT 1").fetchone()[0]))
+    with pool.connection():
+        pass
+    time.sleep(0.01)
+    conn = pool.acquire()              # evicts the idle one
+    pool.close_all()
+    pool.release(conn)                 # discarded: older generation
+    assert closed == [1, 1]
+
+
+def test_release_foreign_connection_rejected(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "pool.db"))
+    other = ConnectionPool(str(tmp_path / "pool.db")).acquire()
+    with pytest.raises(ValueError):
+        pool.release(other)
+
+
+# -----------------------------
+# database.py helpers
+# -----------------------------
+def test_helpers_share_one_pooled_connection(sample_db):
+    assert len(database.get_all_books()) == 3
+    assert database.get_book_by_isbn("9780451524935")["available_copies"] == 0
+    assert database.get_patron_borrow_count("123456") == 1
+    pool = database.get_pool()
+    assert pool.stats["created"] == 1
+    assert pool.size() == (1, 0)
+
+
+def test_failed_insert_returns_false_and_keeps_pool_clean(temp_db):
+    database.init_database()
+    assert database.insert_book("A", "B", "1111111111111", 1, 1) is True
+    assert database.insert_book("A", "B", "1111111111111", 1, 1) is False
+    assert database.get_pool().size() == (1, 0)
+
+
+def test_pool_follows_database_setting(temp_db, tmp_path, monkeypatch):
+    first = database.get_pool()
+    monkeypatch.setattr(database, "DATABASE", str(tmp_path / "other.db"))
+    assert database.get_pool() is not first
+    assert database.get_pool().database.endswith("other.db")
+
+
+# -----------------------------
+# Flask integration
+# -----------------------------
+def test_request_reuses_connection_and_releases_on_teardown(temp_db):
+    app = create_app({"TESTING": True, "DATABASE": temp_db, "DB_POOL_MAX_SIZE": 2})
+    pool = database.get_pool()
+    assert pool.max_size == 2
+    with app.app_context():
+        database.get_all_books()
+        database.get_book_by_id(1)
+        assert pool.size()[1] == 1
+    assert pool.size()[1] == 0
+
+    response = app.test_client().get("/catalog")
+    assert response.status_code == 200
+    assert pool.size()[1] == 0
@@ -0,0 +1,79 @@
+import logging
+import sqlite3
+
+import pytest
+
+import database
+from app import create_app
+from db_pragmas import PRAGMA_PRESETS, apply_pragmas, read_pragmas, resolve_pragmas
+
+
+@pytest.fixture
+def temp_db(temp_db, monkeypatch):
+    """Restores the module-level pragma settings afterwards."""
+    monkeypatch.setattr(database, "PRAGMA_PROFILE", database.PRAGMA_PROFILE)
+    monkeypatch.setattr(database, "PRAGMAS", database.PRAGMAS)
+    return temp_db
+
+
+def test_resolve_merges_overrides_into_preset():
+    pragmas = resolve_pragmas("throughput", {"cache_size": -2000})
+    assert pragmas["journal_mode"] == "WAL"
+    assert pragmas["synchronous"] == "NORMAL"
+    assert pragmas["cache_size"] == -2000
+    assert "cache_size" not in PRAGMA_PRESETS["durable"]
+
+
+@pytest.mark.parametrize("profile, overrides", [
+    ("fastest", None),
+    ("durable", {"page_size": 4096}),
+    ("durable", {"synchronous": "NORMAL; DROP TABLE books"}),
+])
+def test_resolve_rejects_bad_settings(profile, overrides):
+    with pytest.raises(ValueError):
+        resolve_pragmas(profile, overrides)
+
+
+def test_apply_and_read_back(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "p.db"))
+    apply_pragmas(conn, resolve_pragmas("throughput"))
+    effective = read_pragmas(conn)
+    conn.close()
+    assert effective["journal_mode"] == "WAL"
+    assert effective["synchronous"] == "NORMAL"
+    assert effective["temp_store"] == "MEMORY"
+    assert effective["cache_size"] == -65536
+    assert effective["busy_timeout"] == 5000
+
+
+def test_pooled_connections_get_profile(temp_db):
+    with database.db_connection() as conn:
+        assert read_pragmas(conn)["journal_mode"] == "WAL"
+
+
+def test_create_app_applies_configured_profile_and_reports(temp_db, caplog):
+    with caplog.at_level(logging.INFO):
+        app = create_app({
+            "TESTING": True,
+            "DATABASE": temp_db,
+            "SQLITE_PRAGMA_PROFILE": "durable",
+            "SQLITE_PRAGMAS": {"cache_size": -4096},
+        })
+    report = app.extensions["database"]
+    assert report["pragma_profile"] == "durable"
+    assert report["pragmas"]["synchronous"] == "FULL"
+    assert report["pragmas"]["cache_size"] == -4096
+    assert "SQLite pragma profile 'durable'" in caplog.text
+
+    with database.db_connection() as conn:
+        assert read_pragmas(conn)["synchronous"] == "FULL"
+
+
+def test_in_memory_profile_with_shared_cache(temp_db):
+    app = create_app({
+        "TESTING": True,
+        "DATABASE": "file:pragma_test?mode=memory&cache=shared",
+        "SQLITE_PRAGMA_PROFILE": "test-in-memory",
+    })
+    assert app.extensions["database"]["pragmas"]["journal_mode"] == "MEMORY"
+    assert len(database.get_all_books()) == 3
@@ -0,0 +1,89 @@
+import random
+from array import array
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import fee_engine
+import library_service
+import overdue
+
+NOW = datetime(2025, 3, 9, 12, 0, 0)
+
+
+@pytest.fixture(params=["numpy", "array"])
+def engine(request, monkeypatch):
+    """Run each test against the NumPy path and the array-module fallback."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(fee_engine, "np", None)
+    return fee_engine
+
+
+def python_fee(due_date, now=NOW):
+    """The per-loan R5 calculation in library_service."""
+    info = library_service._late_fee_for_due_date(due_date, now)
+    return info["days_overdue"], info["fee_amount"]
+
+
+@pytest.mark.parametrize("days, fee", [
+    (0, 0.0), (1, 0.5), (7, 3.5), (8, 4.5), (18, 14.5), (19, 15.0), (400, 15.0), (-3, 0.0),
+])
+def test_late_fee_for_days_tiers(days, fee):
+    assert fee_engine.late_fee_for_days(days) == fee
+
+
+def test_bulk_matches_per_loan_calculator(engine):
+    rng = random.Random(5)
+    due_dates = [NOW + timedelta(seconds=rng.randint(-40 * 86400, 10 * 86400)) for _ in range(5000)]
+    due_dates += [NOW, NOW - timedelta(days=7), NOW - timedelta(days=7, microseconds=1)]
+    result = engine.calculate_late_fees_bulk(due_dates, now=NOW)
+    expected = [python_fee(d) for d in due_dates]
+    assert [int(d) for d in result["days_overdue"]] == [e[0] for e in expected]
+    assert [float(f) for f in result["fee_amount"]] == [e[1] for e in expected]
+    assert result["total_fees"] == round(sum(e[1] for e in expected), 2)
+
+
+def test_bulk_accepts_timestamp_buffers(engine):
+    due = array("d", [fee_engine.to_timestamp(NOW - timedelta(days=d, hours=1)) for d in (0, 3, 10, 30)])
+    result = engine.calculate_late_fees_bulk(due, now=NOW)
+    assert [float(f) for f in result["fee_amount"]] == [0.0, 1.5, 6.5, 15.0]
+    assert result["total_fees"] == 23.0
+
+
+def test_bulk_empty_input(engine):
+    result = engine.calculate_late_fees_bulk([], now=NOW)
+    assert len(result["fee_amount"]) == 0
+    assert result["total_fees"] == 0.0
+
+
+def test_batch_fees_and_the_sweep_use_the_bulk_engine(sample_db, engine, monkeypatch):
+    batches = []
+
+    def counting(due_dates, now=None):
+        batches.append(len(due_dates))
+        return fee_engine.calculate_late_fees_bulk(due_dates, now)
+
+    monkeypatch.setattr(database, "calculate_late_fees_bulk", counting)
+    monkeypatch.setattr(overdue, "calculate_late_fees_bulk", counting)
+    now = datetime.now()
+    for book_id, days in ((1, 30), (2, 8), (3, 1)):
+        database.insert_borrow_record("111111", book_id, now - timedelta(days=days + 14),
+                                      now - timedelta(days=days, hours=1))
+
+    rows = list(database.iter_late_fees(patron_ids=["111111"], now=now, batch_size=2))
+    assert [(r["days_overdue"], r["fee_amount"], r["is_overdue"]) for r in rows] == \
+        [(30, 15.0, True), (8, 4.5, True), (1, 0.5, True)]
+    assert batches == [2, 1]
+
+    missing = list(database.iter_late_fees(loans=[("111111", 2), ("999999", 1)], now=now))
+    assert [(r["due_date"] is None, r["fee_amount"], r["is_overdue"]) for r in missing] == \
+        [(False, 4.5, True), (True, 0.0, False)]
+
+    batches.clear()
+    assert overdue.sweep(now)["fees_updated"] == 3
+    assert sorted(loan["current_fee"] for loan in overdue.get_overdue_loans()) == [0.5, 4.5, 15.0]
+    assert overdue.sweep(now)["fees_updated"] == 0
+    assert batches == [3, 3]
@@ -0,0 +1,101 @@
+import pytest
+
+import database
+import library_service
+
+BOOKS = [
+    ("The Great Gatsby", "F. Scott Fitzgerald", "9780743273565"),
+    ("Great Expectations", "Charles Dickens", "9780141439563"),
+    ("A Tale of Two Cities", "Charles Dickens", "9780141439600"),
+    ('The "Quoted" Book', "Ann O'Neil", "9781111111111"),
+    ("Éclair Recipes", "Zoë Baker", "9782222222222"),
+    ("Python Crash Course", "Eric Matthes", "9781593279288"),
+]
+
+
+@pytest.fixture
+def app(app):
+    for title, author, isbn in BOOKS:
+        database.insert_book(title, author, isbn, 1, 1)
+    return app
+
+
+def reference_search(term, search_type):
+    """The original in-Python implementation of R6."""
+    term = term.strip()
+    books = database.get_all_books()
+    if search_type == "isbn":
+        return [b for b in books if b["isbn"] == term]
+    return [b for b in books if term.lower() in b[search_type].lower()]
+
+
+@pytest.mark.parametrize("term", [
+    "great", "GREAT", "gat", "ea", "e", "Dickens", "charles d", "o'neil",
+    '"quoted"', "éclair", "ZOË", "tale of two", "nothing here", "the",
+])
+@pytest.mark.parametrize("search_type", ["title", "author"])
+def test_matches_reference_semantics(app, term, search_type):
+    got = library_service.search_books_in_catalog(term, search_type)
+    expected = reference_search(term, search_type)
+    assert sorted(b["id"] for b in got) == sorted(b["id"] for b in expected)
+
+
+def test_isbn_is_exact(app):
+    assert [b["title"] for b in library_service.search_books_in_catalog("9780141439563", "isbn")] \
+        == ["Great Expectations"]
+    assert library_service.search_books_in_catalog("978014143956", "isbn") == []
+
+
+def test_long_terms_use_fts_index(app):
+    with database.db_connection() as conn:
+        assert database._has_books_fts(conn)
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT b.* FROM books_fts JOIN books b ON b.id = books_fts.rowid "
+            "WHERE books_fts MATCH ?", ('title : "great"',)).fetchall()
+    assert any("VIRTUAL TABLE INDEX" in row["detail"] for row in plan)
+
+
+def test_index_follows_inserts_updates_and_deletes(app):
+    assert library_service.search_books_in_catalog("Moby", "title") == []
+    database.insert_book("Moby Dick", "Herman Melville", "9783333333333", 1, 1)
+    assert len(library_service.search_books_in_catalog("moby", "title")) == 1
+
+    with database.db_connection() as conn:
+        conn.execute("UPDATE books SET title = 'The Whale' WHERE isbn = '9783333333333'")
+        conn.commit()
+    assert library_service.search_books_in_catalog("moby", "title") == []
+    assert len(library_service.search_books_in_catalog("whale", "title")) == 1
+
+    with database.db_connection() as conn:
+        conn.execute("DELETE FROM books WHERE isbn = '9783333333333'")
+        conn.commit()
+    assert library_service.search_books_in_catalog("whale", "title") == []
+
+
+def test_availability_updates_do_not_break_index(app):
+    book = database.get_book_by_isbn("9780743273565")
+    database.update_book_availability(book["id"], -1)
+    assert [b["id"] for b in library_service.search_books_in_catalog("gatsby", "title")] == [book["id"]]
+
+
+def test_results_ranked_and_limited(app, monkeypatch):
+    monkeypatch.setattr(library_service, "SEARCH_RESULT_LIMIT", 1)
+    assert len(library_service.search_books_in_catalog("great", "title")) == 1
+    assert len(database.search_books("great", "title")) == 2
+
+
+def test_fallback_without_fts(app):
+    with database.db_connection() as conn:
+        conn.execute("DROP TABLE books_fts")
+        conn.commit()
+    database._fts_databases.clear()
+    assert len(library_service.search_books_in_catalog("dickens", "author")) == 2
+
+
+def test_api_search_uses_sqlite_catalog(app):
+    data = app.test_client().get("/api/search?q=great&type=title").get_json()
+    assert data["count"] == 2
+    assert {b["title"] for b in data["results"]} == {"The Great Gatsby", "Great Expectations"}
+
+    html = app.test_client().get("/search?q=dickens&type=author").get_data(as_text=True)
+    assert "A Tale of Two Cities" in html
@@ -0,0 +1,85 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+
+
+@pytest.fixture
+def app(app):
+    now = datetime.now()
+    for patron_id, book_id, overdue_days in (("111111", 1, 3), ("111111", 2, 12), ("222222", 1, 40)):
+        due = now - timedelta(days=overdue_days, hours=1)
+        database.insert_borrow_record(patron_id, book_id, due - timedelta(days=14), due)
+    return app
+
+
+PAIRS = [("111111", 1), ("111111", 2), ("222222", 1), ("123456", 3), ("333333", 2), ("111111", 1)]
+
+
+def test_batch_matches_single_loan_calculation(app):
+    results = list(library_service.calculate_late_fees_batch(loans=PAIRS))
+    assert [(r["patron_id"], r["book_id"]) for r in results] == PAIRS
+    for result, (patron_id, book_id) in zip(results, PAIRS):
+        single = library_service.calculate_late_fee_for_book(patron_id, book_id)
+        assert {k: result[k] for k in single} == single
+
+
+def test_batch_runs_one_query(app):
+    statements = []
+    with database.db_connection() as conn:
+        conn.set_trace_callback(statements.append)
+    try:
+        assert len(list(library_service.calculate_late_fees_batch(loans=PAIRS))) == len(PAIRS)
+        assert len(list(library_service.calculate_late_fees_batch(patron_ids=["111111", "222222"]))) == 3
+    finally:
+        with database.db_connection() as conn:
+            conn.set_trace_callback(None)
+    assert len(statements) == 2
+
+
+def test_json_response(client):
+    response = client.post("/api/late_fees", json={
+        "loans": [{"patron_id": p, "book_id": b} for p, b in PAIRS]})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["count"] == len(PAIRS)
+    assert [r["fee_amount"] for r in data["results"]] == [1.5, 8.5, 15.0, 0.0, 0.0, 1.5]
+    assert data["total_fees"] == 26.5
+    assert data["results"][4]["status"] == "No active borrow record found for this patron and book"
+
+
+def test_patron_list_as_ndjson(client):
+    response = client.post("/api/late_fees?format=ndjson", json={"patron_ids": ["111111", "222222", "999999"]})
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(r["patron_id"], r["book_id"]) for r in lines] == [("111111", 2), ("111111", 1), ("222222", 1)]  # by borrow date
+
+    by_accept = client.post("/api/late_fees", json={"patron_ids": ["999999"]},
+                            headers={"Accept": "application/x-ndjson"})
+    assert by_accept.mimetype == "application/x-ndjson"
+    assert by_accept.data == b""
+
+
+@pytest.mark.parametrize("body", [
+    None,
+    [],
+    {},
+    {"loans": []},
+    {"loans": [{"patron_id": "111111"}]},
+    {"loans": [{"patron_id": "111111", "book_id": "1"}]},
+    {"patron_ids": [None]},
+    {"loans": [], "patron_ids": ["111111"]},
+])
+def test_invalid_bodies_are_rejected(client, body):
+    response = client.post("/api/late_fees", json=body)
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+
+def test_batch_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr("routes.api_routes.MAX_LATE_FEE_BATCH", 2)
+    response = client.post("/api/late_fees", json={"patron_ids": ["1", "2", "3"]})
+    assert response.status_code == 400
@@ -0,0 +1,153 @@
+import json
+import random
+import threading
+from collections import deque
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import pytest
+
+import database
+import services.library_service as memory_service
+from benchmarks import load
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(database, "DATABASE", database.DATABASE)
+    monkeypatch.setattr(database, "POOL_OPTIONS", dict(database.POOL_OPTIONS))
+    yield
+    memory_service.reset_globals()
+    database.reset_pool()
+
+
+def test_histogram_keeps_relative_precision():
+    histogram = load.LatencyHistogram()
+    for micros in range(1, 10001):
+        histogram.record(micros / 1_000_000)
+    assert histogram.count == 10000
+    assert histogram.min == 1 and histogram.max == 10000
+    for percentile, exact in ((50, 5000), (90, 9000), (99, 9900)):
+        assert histogram.value_at_percentile(percentile) * 1_000_000 == pytest.approx(exact, rel=1 / 64)
+    assert histogram.value_at_percentile(100) == 0.01
+    assert histogram.mean() == pytest.approx(0.0050005)
+
+
+def test_histogram_buckets_cover_every_value():
+    for value in list(range(0, 1000)) + [2 ** 20 - 1, 2 ** 20, 123456789]:
+        index = load.LatencyHistogram._index(value)
+        assert load.LatencyHistogram._highest_value(index) >= value
+        assert index == 0 or load.LatencyHistogram._highest_value(index - 1) < value
+
+
+def test_histograms_merge():
+    a, b = load.LatencyHistogram(), load.LatencyHistogram()
+    a.record(0.001)
+    b.record(0.003)
+    b.record(0.002)
+    a.merge(b)
+    assert a.count == 3 and a.min == 1000 and a.max == 3000
+    assert load.LatencyHistogram().value_at_percentile(99) == 0.0
+
+
+def test_zipf_sampler_favours_low_ranks():
+    rng = random.Random(3)
+    sampler = load.ZipfSampler(1000, 1.1)
+    draws = [sampler.sample(rng) for _ in range(20000)]
+    assert min(draws) == 1 and max(draws) <= 1000
+    assert draws.count(1) > draws.count(2) > draws.count(10) > 0
+    uniform = load.ZipfSampler(4, 0.0)
+    assert sorted({uniform.sample(rng) for _ in range(200)}) == [1, 2, 3, 4]
+    with pytest.raises(ValueError):
+        load.ZipfSampler(0, 1.0)
+
+
+def test_workload_builds_requests_and_returns_its_own_loans():
+    workload = load.Workload(100, 10, mix={"borrow": 1, "return": 1})
+    rng = random.Random(1)
+    loans = deque()
+    sent = [workload.next_request(rng, loans) for _ in range(200)]
+    borrows = [form for op, method, path, form in sent if op == "borrow"]
+    assert all(method == "POST" for _, method, _, _ in sent)
+    assert {path for _, _, path, _ in sent} == {"/borrow", "/return"}
+    assert all(100000 <= int(form["patron_id"]) < 100010 and 1 <= int(form["book_id"]) <= 100
+               for form in borrows)
+    returned = [form for op, _, _, form in sent if op == "return"]
+    assert sum(form in borrows for form in returned) > len(returned) // 2
+
+    op, method, path, form = load.Workload(10, 10, mix={"late_fee": 1}).next_request(rng, deque())
+    assert (op, method, form) == ("late_fee", "GET", None) and path.startswith("/api/late_fee/1000")
+    with pytest.raises(ValueError):
+        load.Workload(10, 10, mix={"delete_everything": 1})
+
+
+def test_parse_mix():
+    assert load.parse_mix("borrow=20, api_search=2.5") == {"borrow": 20.0, "api_search": 2.5}
+    with pytest.raises(ValueError):
+        load.parse_mix("borrow")
+
+
+def test_in_process_run_reports_every_operation(app):
+    workload = load.Workload(5, 5)
+    report = load.run_load(load.TestClientTransport(app), workload, threads=3, duration=5.0,
+                           ramp_up=0.2, max_requests=300)
+    assert report["requests"] == 300
+    assert report["errors"] == 0
+    assert set(report["operations"]) == set(load.DEFAULT_MIX)
+    assert sum(op["count"] for op in report["operations"].values()) == 300
+    assert sum(row["requests"] for row in report["timeline"]) == 300
+    assert report["latency"]["percentiles_ms"]["50.0"] <= report["latency"]["percentiles_ms"]["100.0"]
+    json.dumps(report)
+    text = load.format_report(report)
+    assert "300 requests" in text and "api_search" in text
+
+
+def test_errors_are_counted_by_kind(app):
+    def broken(method, path, form):
+        if path.startswith("/api/late_fee"):
+            raise ConnectionResetError()
+        return 500 if method == "POST" else 200
+
+    transport = load.TestClientTransport(app)
+    transport.session = lambda: broken
+    report = load.run_load(transport, load.Workload(5, 5, mix={"borrow": 1, "late_fee": 1, "catalog": 1}),
+                           threads=2, duration=5.0, max_requests=60)
+    operations = report["operations"]
+    assert operations["borrow"]["error_kinds"] == {"HTTP 500": operations["borrow"]["count"]}
+    assert operations["late_fee"]["error_kinds"] == {"ConnectionResetError": operations["late_fee"]["count"]}
+    assert operations["catalog"]["errors"] == 0
+    assert report["errors"] == operations["borrow"]["count"] + operations["late_fee"]["count"]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def test_http_transport_against_a_local_server(app):
+    server = make_server("127.0.0.1", 0, app, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        transport = load.HTTPTransport(f"http://127.0.0.1:{server.server_port}")
+        send = transport.session()
+        assert send("GET", "/api/search?q=gatsby&type=title", None) == 200
+        assert send("POST", "/borrow", {"patron_id": "123456", "book_id": "1"}) == 302
+        report = load.run_load(transport, load.Workload(5, 5, mix={"api_search": 1, "catalog": 1}),
+                               threads=1, duration=5.0, max_requests=20)
+        assert report["requests"] == 20 and report["errors"] == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+    with pytest.raises(ValueError):
+        load.HTTPTransport("ftp://example.com")
+
+
+def test_main_seeds_and_writes_the_report(tmp_path, capsys):
+    out = tmp_path / "load.json"
+    args = ["--database", str(tmp_path / "seeded.db"), "--seed", "200", "--threads", "2",
+            "--duration", "0.3", "--mix", "borrow=1,return=1,api_search=2", "-o", str(out)]
+    assert load.main(args) == 0
+    report = json.loads(out.read_text())
+    assert report["meta"]["books"] == 200 and report["meta"]["patrons"] == 50
+    assert report["errors"] == 0 and report["requests"] > 0
+    assert "req/s" in capsys.readouterr().out
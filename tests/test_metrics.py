@@ -0,0 +1,112 @@
+import os
+import re
+
+import pytest
+
+import database
+import metrics
+from app import create_app
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    metrics.REGISTRY.reset()
+    yield
+    metrics.REGISTRY.reset()
+
+
+def sample(text, name, **labels):
+    """Value of one sample line of this process in a /metrics exposition."""
+    labels = {"pid": str(os.getpid()), **labels}
+    wanted = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = re.escape(name) + r"\{" + re.escape(wanted) + r"\}" + r" (\S+)"
+    match = re.search(r"^" + pattern + r"$", text, re.M)
+    return float(match.group(1)) if match else None
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    histogram = metrics.Histogram((1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.count == 4 and histogram.sum == 6.5
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(4.0)
+    histogram.observe(100)
+    assert histogram.quantile(0.99) == 4.0
+    assert metrics.Histogram((1.0,)).quantile(0.5) == 0.0
+
+
+def test_requests_are_timed_per_endpoint_with_sql_counts(client):
+    for _ in range(3):
+        assert client.get("/api/books?limit=2").status_code == 200
+    client.get("/no-such-page")
+
+    histogram = metrics.REGISTRY.get_histogram("library_http_request_duration_seconds", endpoint="api.list_books_api")
+    assert histogram.count == 3
+    queries = metrics.REGISTRY.get_histogram("library_http_request_sql_statements", endpoint="api.list_books_api")
+    assert queries.sum == 3    # one keyset query per page
+    assert metrics.REGISTRY.value("library_http_requests_total", endpoint="unmatched", status="404") == 1
+
+
+def test_instrumented_connections_count_statements(app):
+    before, _ = metrics.sql_totals()
+    with database.db_connection() as conn:
+        assert isinstance(conn, metrics.InstrumentedConnection)
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS scratch (x INTEGER)")
+        conn.executemany("INSERT INTO scratch VALUES (?)", [(1,), (2,)])
+    after, seconds = metrics.sql_totals()
+    assert after - before == 2
+    assert seconds > 0
+
+
+def test_metrics_endpoint_exposes_prometheus_text(client):
+    client.get("/api/search?q=gatsby&type=title")
+    client.get("/api/search?q=gatsby&type=title")
+    database.get_book_by_id(1)
+    database.get_book_by_id(1)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+
+    assert "# TYPE library_http_request_duration_seconds histogram" in text
+    assert sample(text, "library_http_request_duration_seconds_count", endpoint="api.search_books_api") == 2
+    assert sample(text, "library_http_request_duration_seconds_bucket",
+                  endpoint="api.search_books_api", le="+Inf") == 2
+    for q in ("0.5", "0.95", "0.99"):
+        assert sample(text, "library_http_request_duration_seconds_quantile",
+                      endpoint="api.search_books_api", quantile=q) is not None
+    assert sample(text, "library_http_requests_total", endpoint="api.search_books_api", status="200") == 2
+    assert sample(text, "library_cache_events_total", cache="search", event="hits") == 1
+    assert sample(text, "library_cache_hit_ratio", cache="book") > 0
+    assert sample(text, "library_sql_statements_total") > 0
+    # Scraping itself needs no database connection
+    assert sample(text, "library_db_pool_connections", state="in_use") == 0
+    assert sample(text, "library_db_pool_events_total", event="created") >= 1
+
+
+def test_label_values_are_escaped():
+    registry = metrics.Registry()
+    registry.counter("c_total", "Test.")
+    registry.inc("c_total", endpoint='a"b\\c')
+    assert 'c_total{endpoint="a\\"b\\\\c"} 1' in registry.render()
+
+
+def test_const_labels_come_first_on_every_line():
+    registry = metrics.Registry()
+    registry.counter("c_total", "Test.")
+    registry.histogram("h_seconds", "Test.", (1.0,))
+    registry.inc("c_total", endpoint="x")
+    registry.observe("h_seconds", 0.5, endpoint="x")
+    text = registry.render([("g", "gauge", "Test.", (), 3)], const_labels=(("pid", "42"),))
+    lines = [line for line in text.splitlines() if not line.startswith("#")]
+    assert all(line.split("{", 1)[1].startswith('pid="42"') for line in lines)
+    assert 'h_seconds_bucket{pid="42",endpoint="x",le="1"} 1' in lines
+    assert 'g{pid="42"} 3' in lines
+
+
+def test_metrics_can_be_disabled(temp_db):
+    app = create_app({"TESTING": True, "DATABASE": temp_db, "METRICS_ENABLED": False})
+    assert app.test_client().get("/metrics").status_code == 404
@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import migrations
+import sql_trace
+
+
+@pytest.fixture(autouse=True)
+def schema(temp_db):
+    database.init_database(migrate=False)
+
+
+def query_plan(sql, params=()):
+    with database.db_connection() as conn:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    return " ".join(row["detail"] for row in rows)
+
+
+def test_fresh_database_applies_all_migrations_once():
+    versions = [m[0] for m in migrations.MIGRATIONS]
+    assert migrations.apply_migrations() == versions
+    assert migrations.apply_migrations() == []
+    with database.db_connection() as conn:
+        assert migrations.get_schema_version(conn) == versions[-1]
+
+
+def test_init_database_applies_pending_migrations():
+    database.init_database()
+    database.add_sample_data()
+    assert database.get_patron_borrow_count("123456") == 1
+    now = datetime.now()
+    assert database.borrow_atomic("654321", 1, now, now + timedelta(days=14))[0] == "ok"
+
+
+def test_borrow_record_lookups_use_indexes():
+    migrations.apply_migrations()
+    count_plan = query_plan(
+        "SELECT COUNT(*) FROM borrow_records WHERE patron_id = ? AND return_date IS NULL", ("123456",))
+    assert "idx_borrow_records_open_by_patron" in count_plan
+    assert "SCAN borrow_records" not in count_plan
+
+    return_plan = query_plan(
+        "UPDATE borrow_records SET return_date = ? WHERE patron_id = ? AND book_id = ? AND return_date IS NULL",
+        ("x", "123456", 1))
+    assert "idx_borrow_records_open_by_patron" in return_plan
+
+    book_plan = query_plan(
+        "SELECT * FROM borrow_records WHERE book_id = ? AND return_date IS NULL", (1,))
+    assert "USING INDEX" in book_plan
+
+
+def test_patron_history_reads_use_an_index():
+    migrations.apply_migrations()
+    tracer = sql_trace.SQLTracer()
+    sql_trace.install(tracer)
+    database.reset_pool()
+    try:
+        database.get_patron_loans_with_fees("123456")
+        list(database.iter_borrow_records(patron_id="123456"))
+    finally:
+        sql_trace.install(None)
+        database.reset_pool()
+    reads = [row for row in tracer.report() if "from borrow_records" in row["fingerprint"]]
+    assert len(reads) == 2
+    for row in reads:
+        assert row["plan"] and row["full_scans"] == []
+        assert any("idx_borrow_records_patron_borrowed" in step for step in row["plan"])
+
+
+def test_patron_summary_comes_from_its_migration():
+    def tables():
+        with database.db_connection() as conn:
+            return {row["name"] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+
+    assert not {"patron_summary", "patron_summary_ai"} & tables()
+    database.insert_borrow_record("123456", 1, datetime(2025, 1, 1), datetime(2025, 1, 15))
+    migrations.apply_migrations([m for m in migrations.MIGRATIONS if m[0] < 5])
+    assert "patron_summary" not in tables()
+
+    migrations.apply_migrations()
+    assert {"patron_summary", "patron_summary_ai", "patron_summary_au", "patron_summary_ad"} <= tables()
+    # Loans recorded before the triggers existed are backfilled
+    with database.db_connection() as conn:
+        row = conn.execute("SELECT active_count FROM patron_summary WHERE patron_id = ?", ("123456",)).fetchone()
+    assert row["active_count"] == 1
+
+
+def test_only_newer_migrations_run():
+    ran = []
+    steps = [
+        (1, "first", [lambda conn: ran.append(1)]),
+        (2, "second", [lambda conn: ran.append(2)]),
+    ]
+    assert migrations.apply_migrations(steps[:1]) == [1]
+    assert migrations.apply_migrations(steps) == [2]
+    assert ran == [1, 2]
+
+
+def test_failed_migration_rolls_back_and_keeps_version():
+    broken = [(1, "broken", [
+        "CREATE TABLE half_done (x INTEGER)",
+        "THIS IS NOT SQL",
+    ])]
+    with pytest.raises(Exception):
+        migrations.apply_migrations(broken)
+    with database.db_connection() as conn:
+        assert migrations.get_schema_version(conn) == 0
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE name = 'half_done'").fetchall()
+    assert tables == []
@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+import overdue
+from app import create_app
+
+
+@pytest.fixture
+def app(app):
+    overdue.tracker.reset()
+    yield app
+    app.extensions["overdue"].stop()
+    overdue.tracker.reset()
+
+
+NOW = datetime(2025, 5, 1, 12, 0)
+
+
+def add_loan(patron_id, book_id, days_overdue):
+    due = NOW - timedelta(days=days_overdue)
+    database.insert_borrow_record(patron_id, book_id, due - timedelta(days=14), due)
+
+
+def test_sweep_marks_overdue_loans_and_fees(app):
+    add_loan("111111", 1, 3)
+    add_loan("111111", 2, 12)
+    add_loan("222222", 1, -2)   # due in two days
+
+    result = overdue.sweep(NOW)
+    assert [(l["patron_id"], l["book_id"]) for l in result["newly_overdue"]] == [("111111", 2), ("111111", 1)]
+    loans = overdue.get_overdue_loans()
+    assert [(l["book_id"], l["current_fee"]) for l in loans] == [(2, 8.5), (1, 1.5)]
+    assert loans[0]["overdue_since"] == loans[0]["due_date"]
+    with database.db_connection() as conn:
+        summary = conn.execute("SELECT late_fees, fees_as_of FROM patron_summary WHERE patron_id = ?",
+                               ("111111",)).fetchone()
+    assert summary["late_fees"] == 10.0 and summary["fees_as_of"] == NOW.isoformat()
+
+    # Later sweeps only report loans that newly fell due, and keep fees current
+    later = overdue.sweep(NOW + timedelta(days=3))
+    assert [l["patron_id"] for l in later["newly_overdue"]] == ["222222"]
+    assert [l["current_fee"] for l in overdue.get_overdue_loans()] == [11.5, 3.0, 0.5]
+
+
+def test_sweep_fees_match_the_service(app):
+    add_loan("111111", 1, 9)
+    overdue.sweep(NOW)
+    fee = library_service._late_fee_for_due_date(NOW - timedelta(days=9), NOW)["fee_amount"]
+    assert overdue.get_overdue_loans()[0]["current_fee"] == fee
+
+
+def test_returned_loans_leave_the_report(app):
+    add_loan("111111", 1, 5)
+    overdue.sweep(NOW)
+    assert database.update_borrow_record_return_date("111111", 1, NOW)
+    assert overdue.get_overdue_loans() == []
+
+
+def test_overdue_queries_use_indexes(app):
+    with database.db_connection() as conn:
+        plans = [" ".join(r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+                 for sql, params in (
+                     ("SELECT id FROM borrow_records WHERE return_date IS NULL AND due_date < ?", ("x",)),
+                     ("SELECT id FROM borrow_records WHERE return_date IS NULL AND overdue_since IS NOT NULL "
+                      "ORDER BY overdue_since", ()),
+                 )]
+    assert "idx_borrow_records_open_due" in plans[0]
+    assert "idx_borrow_records_overdue" in plans[1]
+
+
+def add_due(patron_id, book_id, due):
+    database.insert_borrow_record(patron_id, book_id, due - timedelta(days=14), due)
+
+
+def test_tracker_yields_upcoming_due_dates_in_order(app):
+    now = datetime.now()
+    # The sample loan is due in 9 days
+    for days in (5, 2, 12):
+        add_due("333333", 1, now + timedelta(days=days))
+    tracker = overdue.OverdueTracker(window=2)
+    assert tracker.next_due(now) == now + timedelta(days=2)
+    tracker.track(now + timedelta(days=1))          # inside the loaded window
+    assert tracker.next_due(now) == now + timedelta(days=1)
+    add_due("333333", 2, now + timedelta(days=30))
+    tracker.track(now + timedelta(days=30))         # beyond it: read on refill
+    assert tracker.next_due(now + timedelta(days=6)).date() == (now + timedelta(days=9)).date()
+    assert tracker.next_due(now + timedelta(days=10)) == now + timedelta(days=12)
+    assert tracker.next_due(now + timedelta(days=13)) == now + timedelta(days=30)
+    assert tracker.next_due(now + timedelta(days=31)) is None
+
+
+def test_borrowing_feeds_the_shared_tracker(app):
+    now = datetime.now()
+    assert overdue.tracker.next_due(now) is not None   # the sample loan
+    assert library_service.borrow_book_by_patron("444444", 1)[0]
+    assert overdue.tracker.next_due(now + timedelta(days=10)).date() == (now + timedelta(days=14)).date()
+
+
+def test_sweeper_waits_for_the_next_due_date(app):
+    sweeper = overdue.OverdueSweeper(interval=600, overdue_tracker=overdue.OverdueTracker())
+    now = datetime.now()
+    add_due("555555", 2, now + timedelta(seconds=90))
+    assert 88 <= sweeper.seconds_until_next(now) <= 90
+    assert sweeper.seconds_until_next(now + timedelta(seconds=89.5)) == overdue.MIN_SWEEP_WAIT
+    assert sweeper.seconds_until_next(now + timedelta(days=30)) == 600
+
+
+def test_background_sweeper_notifies(app):
+    add_loan("666666", 1, 1)
+    seen = []
+    sweeper = overdue.OverdueSweeper(interval=600, on_overdue=seen.extend)
+    sweeper.start()
+    for _ in range(100):
+        if seen:
+            break
+        time.sleep(0.01)
+    sweeper.stop(timeout=2)
+    assert [l["patron_id"] for l in seen] == ["666666"]
+
+
+def test_overdue_endpoint_and_cli(app):
+    add_loan("111111", 2, 12)
+    client = app.test_client()
+    assert client.get("/api/overdue").get_json() == {"as_of": None, "loans": [], "count": 0, "total_fees": 0}
+
+    result = app.test_cli_runner().invoke(args=["sweep-overdue"])
+    assert "1 newly overdue" in result.output
+    app.extensions["overdue"].run_once()
+    data = client.get("/api/overdue?limit=10").get_json()
+    assert data["count"] == 1 and data["loans"][0]["patron_id"] == "111111"
+    assert data["total_fees"] == 15.0
+    assert data["as_of"] is not None
+
+
+def test_create_app_starts_no_sweeper_by_default(temp_db):
+    app = create_app({"DATABASE": temp_db})
+    assert app.config["OVERDUE_SWEEP_BACKGROUND"] is False
+    assert app.extensions["overdue"]._thread is None
+    assert not any(thread.name == "overdue-sweeper" for thread in threading.enumerate())
+
+    app = create_app({"DATABASE": temp_db, "OVERDUE_SWEEP_BACKGROUND": True, "OVERDUE_SWEEP_INTERVAL": 3600})
+    try:
+        assert app.extensions["overdue"]._thread.is_alive()
+    finally:
+        app.extensions["overdue"].stop(timeout=2)
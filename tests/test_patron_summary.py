@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+import overdue
+
+
+pytestmark = pytest.mark.usefixtures("sample_db")
+
+
+def recount(patron_id):
+    with database.db_connection() as conn:
+        row = conn.execute("""
+            SELECT SUM(return_date IS NULL) AS active, COUNT(*) AS total,
+                   MIN(CASE WHEN return_date IS NULL THEN due_date END) AS earliest
+            FROM borrow_records WHERE patron_id = ?
+        """, (patron_id,)).fetchone()
+    return row["active"] or 0, row["total"], row["earliest"]
+
+
+def get_summary(patron_id):
+    with database.db_connection() as conn:
+        row = conn.execute("SELECT * FROM patron_summary WHERE patron_id = ?", (patron_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def summary_tuple(patron_id):
+    summary = get_summary(patron_id)
+    return summary["active_count"], summary["total_borrowed"], summary["earliest_due_date"]
+
+
+def test_summary_follows_borrows_and_returns():
+    assert database.get_patron_borrow_count("123456") == 1
+    assert get_summary("654321") is None
+    assert database.get_patron_borrow_count("654321") == 0
+
+    assert library_service.borrow_book_by_patron("654321", 1)[0]
+    assert library_service.borrow_book_by_patron("654321", 2)[0]
+    assert summary_tuple("654321") == recount("654321")
+    assert database.get_patron_borrow_count("654321") == 2
+
+    assert library_service.return_book_by_patron("654321", 1)[0]
+    assert summary_tuple("654321") == recount("654321")
+    assert library_service.return_book_by_patron("654321", 2)[0]
+    assert summary_tuple("654321") == (0, 2, None)
+
+
+def test_earliest_due_date_tracks_open_loans():
+    now = datetime(2025, 3, 1)
+    database.insert_borrow_record("222222", 1, now, now + timedelta(days=14))
+    database.insert_borrow_record("222222", 2, now, now + timedelta(days=3))
+    assert get_summary("222222")["earliest_due_date"] == (now + timedelta(days=3)).isoformat()
+    database.update_borrow_record_return_date("222222", 2, now + timedelta(days=2))
+    assert get_summary("222222")["earliest_due_date"] == (now + timedelta(days=14)).isoformat()
+
+    with database.db_connection() as conn:
+        conn.execute("DELETE FROM borrow_records WHERE patron_id = ? AND book_id = 1", ("222222",))
+        conn.commit()
+    assert summary_tuple("222222") == (0, 1, None)
+
+
+def test_borrow_limit_uses_summary():
+    for book_id in range(5):
+        database.insert_borrow_record("333333", 100 + book_id, datetime.now(), datetime.now())
+    ok, message = library_service.borrow_book_by_patron("333333", 1)
+    assert not ok and "maximum borrowing limit" in message
+
+
+def test_backfill_migration_rebuilds_existing_loans():
+    with database.db_connection() as conn:
+        conn.execute("DELETE FROM patron_summary")
+        conn.commit()
+    assert get_summary("123456") is None
+    with database.db_connection() as conn:
+        database.rebuild_patron_summary(conn)
+        conn.commit()
+    assert summary_tuple("123456") == recount("123456")
+
+
+def test_swept_fees_are_cleared_by_loan_changes():
+    now = datetime(2025, 3, 20)
+    database.insert_borrow_record("444444", 1, now - timedelta(days=30), now - timedelta(days=10))
+    overdue.sweep(now)
+    summary = get_summary("444444")
+    assert summary["late_fees"] == 6.5
+    assert summary["fees_as_of"] == now.isoformat()
+
+    database.insert_borrow_record("444444", 2, now, now + timedelta(days=14))
+    assert get_summary("444444")["fees_as_of"] is None
+
+
+def test_summary_lookup_is_a_primary_key_search():
+    with database.db_connection() as conn:
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT active_count FROM patron_summary WHERE patron_id = ?",
+                            ("123456",)).fetchall()
+    detail = " ".join(row["detail"] for row in plan)
+    assert "PRIMARY KEY" in detail
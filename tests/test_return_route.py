@@ -0,0 +1,26 @@
+import pytest
+
+import services.library_service as library_service
+
+
+@pytest.fixture(autouse=True)
+def seeded_catalog():
+    library_service.reset_globals()
+    library_service.add_book_to_catalog("Route Book", "Author", "9780306406157", 1)
+    yield
+    library_service.reset_globals()
+
+
+def test_successful_return_is_not_a_server_error(client):
+    form = {"patron_id": "123456", "book_id": "1"}
+    assert client.post("/borrow", data=form).status_code == 302
+    response = client.post("/return", data=form)
+    assert response.status_code == 200
+    assert "Book returned successfully." in response.get_data(as_text=True)
+
+
+def test_failed_return_reports_the_reason(client):
+    response = client.post("/return", data={"patron_id": "123456", "book_id": "1"})
+    assert response.status_code == 200
+    assert "Book not borrowed by this patron." in response.get_data(as_text=True)
+
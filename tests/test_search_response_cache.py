@@ -0,0 +1,102 @@
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+import database
+import routes.api_routes as api_routes
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Count searches that actually reach the search function."""
+    made = []
+    search = api_routes.search_books_in_catalog
+
+    def counting(term, typ):
+        made.append((term, typ))
+        return search(term, typ)
+
+    monkeypatch.setattr(api_routes, "search_books_in_catalog", counting)
+    return made
+
+
+def test_normalized_repeats_are_served_from_cache(app, calls):
+    client = app.test_client()
+    first = client.get("/api/search?q=Gatsby&type=title").get_json()
+    second = client.get("/api/search?q=gATSBY&type=title").get_json()
+    assert len(calls) == 1
+    assert first["results"] == second["results"] and first["count"] == 1
+    # The echoed term is the caller's own
+    assert second["search_term"] == "gATSBY"
+    assert app.extensions["search_cache"].stats["hits"] == 1
+
+
+def test_isbn_and_type_are_part_of_the_key(app, calls):
+    client = app.test_client()
+    client.get("/api/search?q=9780743273565&type=isbn")
+    client.get("/api/search?q=9780743273565&type=title")
+    client.get("/api/search?q=gatsby&type=author")
+    assert len(calls) == 3
+
+
+def test_catalog_mutation_invalidates(app, calls):
+    client = app.test_client()
+    assert client.get("/api/search?q=orwell&type=author").get_json()["count"] == 1
+    database.insert_book("Animal Farm", "George Orwell", "9780451526342", 1, 1)
+    assert client.get("/api/search?q=orwell&type=author").get_json()["count"] == 2
+    assert len(calls) == 2
+
+
+def test_results_computed_before_a_change_are_not_served_after_it(app, monkeypatch):
+    client = app.test_client()
+    search = api_routes.search_books_in_catalog
+
+    def search_then_change(term, typ):
+        # The catalog changes, and another request sees the new version,
+        # after this search ran but before its result is stored
+        results = search(term, typ)
+        monkeypatch.setattr(api_routes, "search_books_in_catalog", search)
+        database.insert_book("Animal Farm", "George Orwell", "9780451526342", 1, 1)
+        client.get("/api/search?q=gatsby&type=title")
+        return results
+
+    monkeypatch.setattr(api_routes, "search_books_in_catalog", search_then_change)
+    assert client.get("/api/search?q=orwell&type=author").get_json()["count"] == 1
+    assert client.get("/api/search?q=orwell&type=author").get_json()["count"] == 2
+
+
+def test_body_matches_jsonify_byte_for_byte(app):
+    client = app.test_client()
+    for _ in range(2):  # miss, then hit
+        body = client.get("/api/search?q=Ünï “gatsby”&type=title").data
+        with app.app_context():
+            expected = jsonify({"search_term": "Ünï “gatsby”", "search_type": "title",
+                                "results": [], "count": 0}).get_data()
+        assert body == expected
+    body = client.get("/api/search?q=the&type=title")
+    assert body.mimetype == "application/json"
+    data = json.loads(body.data)
+    with app.app_context():
+        assert body.data == jsonify(data).get_data()
+
+
+def test_cache_can_be_disabled(monkeypatch):
+    app = Flask(__name__)
+    app.config["SEARCH_CACHE_ENABLED"] = False
+    app.register_blueprint(api_routes.api_bp)
+    made = []
+    monkeypatch.setattr(api_routes, "search_books_in_catalog", lambda term, typ: made.append(term) or [])
+    client = app.test_client()
+    client.get("/api/search?q=x&type=title")
+    client.get("/api/search?q=x&type=title")
+    assert len(made) == 2
+
+
+def test_cache_size_is_bounded(app):
+    app.extensions["search_cache"].max_size = 2
+    client = app.test_client()
+    for term in ("aa", "bb", "cc"):
+        client.get(f"/api/search?q={term}&type=title")
+    assert len(app.extensions["search_cache"]) == 2
+    assert app.extensions["search_cache"].stats["evictions"] == 1
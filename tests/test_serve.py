@@ -0,0 +1,152 @@
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import catalog_version
+import database
+import overdue
+import serve
+import sql_trace
+
+
+@pytest.fixture(autouse=True)
+def isolated(temp_db, monkeypatch):
+    monkeypatch.setattr(database, "CHECK_EXTERNAL_WRITES", False)
+
+
+def test_options_recycle_workers_and_hook_the_fork():
+    options = serve.gunicorn_options(bind="127.0.0.1:8000", workers=3, threads=4, max_requests=500)
+    assert options["bind"] == ["127.0.0.1:8000"]
+    assert (options["workers"], options["threads"], options["worker_class"]) == (3, 4, "gthread")
+    assert options["preload_app"] is True
+    assert (options["max_requests"], options["max_requests_jitter"]) == (500, serve.DEFAULT_MAX_REQUESTS_JITTER)
+    assert options["post_fork"] is serve.post_fork
+    assert options["post_worker_init"] is serve.post_worker_init
+    assert options["worker_exit"] is serve.worker_exit
+    assert "pidfile" not in options
+
+    single = serve.gunicorn_options(workers=1, threads=1, preload=False, pidfile="/tmp/x.pid")
+    assert single["worker_class"] == "sync" and single["preload_app"] is False
+    assert single["pidfile"] == "/tmp/x.pid"
+
+
+def test_default_workers_honours_web_concurrency(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "7")
+    assert serve.default_workers() == 7
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert serve.default_workers() == 1
+    assert serve.gunicorn_options()["worker_class"] == "gthread"
+
+
+def test_several_workers_are_warned_about(caplog):
+    with caplog.at_level("WARNING", logger="serve"):
+        assert serve.warn_if_multiprocess(1) is False
+        assert not caplog.records
+        assert serve.warn_if_multiprocess(4) is True
+    assert "library_service" in caplog.records[0].getMessage()
+
+
+def test_app_config_checks_external_writes_only_with_several_workers():
+    assert serve.app_config(1) == {"DEBUG": False, "CATALOG_CHECK_EXTERNAL_WRITES": False}
+    assert serve.app_config(4, "/srv/library.db")["CATALOG_CHECK_EXTERNAL_WRITES"] is True
+    assert serve.app_config(4, "/srv/library.db")["DATABASE"] == "/srv/library.db"
+
+
+def test_preloaded_app_holds_no_connections_and_no_sweeper():
+    app = serve.load_app({"DATABASE": database.DATABASE})
+    assert database._pool is None
+    sweeper = app.extensions["overdue"]
+    assert sweeper._thread is None
+    assert app.config["OVERDUE_SWEEP_BACKGROUND"] is True
+
+
+def test_worker_hooks_reset_state_and_run_the_sweeper(monkeypatch):
+    app = serve.load_app({"DATABASE": database.DATABASE, "OVERDUE_SWEEP_INTERVAL": 3600})
+    database.get_pool()
+    epoch = catalog_version.EPOCH
+    catalog_version.bump(database.DATABASE)
+    monkeypatch.setattr(catalog_version, "_new_epoch", lambda: "worker-epoch")
+    worker = SimpleNamespace(wsgi=app)
+
+    serve.post_fork(None, worker)
+    assert database._pool is None
+    assert catalog_version.EPOCH == "worker-epoch" != epoch
+    assert catalog_version.current(database.DATABASE)[0] == 0
+
+    serve.post_worker_init(worker)
+    sweeper = app.extensions["overdue"]
+    try:
+        assert sweeper._thread is not None and sweeper._thread.is_alive()
+    finally:
+        serve.worker_exit(None, worker)
+    assert sweeper._thread is None
+    assert database._pool is None
+
+
+def test_sweeper_stays_off_when_disabled():
+    app = serve.load_app({"DATABASE": database.DATABASE, "OVERDUE_SWEEP_BACKGROUND": False})
+    serve.post_worker_init(SimpleNamespace(wsgi=app))
+    assert app.extensions["overdue"]._thread is None
+
+
+def test_writes_from_another_process_invalidate_catalog_validators():
+    app = serve.load_app(dict(serve.app_config(2), DATABASE=database.DATABASE,
+                              OVERDUE_SWEEP_BACKGROUND=False))
+    client = app.test_client()
+    first = client.get("/catalog")
+    etag = first.headers["ETag"]
+    assert client.get("/catalog", headers={"If-None-Match": etag}).status_code == 304
+
+    # Another worker commits through its own connection
+    other = sqlite3.connect(database.DATABASE)
+    other.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                  "VALUES ('Elsewhere', 'Someone', '9781111111111', 1, 1)")
+    other.commit()
+    other.close()
+
+    response = client.get("/catalog", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Elsewhere" in response.data
+    assert client.get("/catalog", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_the_check_works_on_plain_sqlite_connections(monkeypatch):
+    monkeypatch.setattr(database, "InstrumentedConnection", sqlite3.Connection)
+    serve.load_app(dict(serve.app_config(2), DATABASE=database.DATABASE, SQL_TRACE_ENABLED=True,
+                        OVERDUE_SWEEP_BACKGROUND=False))
+    try:
+        with database.get_pool().connection() as conn:
+            assert type(conn) is sqlite3.Connection
+        assert database.sync_catalog_version() is True
+        assert database.sync_catalog_version() is False
+
+        other = sqlite3.connect(database.DATABASE)
+        other.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                      "VALUES ('Elsewhere', 'Someone', '9781111111111', 1, 1)")
+        other.commit()
+        other.close()
+        assert database.sync_catalog_version() is True
+
+        database.reset_pool()
+        assert database._data_versions == {}
+    finally:
+        sql_trace.install(None)
+
+
+def test_single_process_apps_skip_the_check():
+    serve.load_app({"DATABASE": database.DATABASE, "OVERDUE_SWEEP_BACKGROUND": False})
+    assert database.sync_catalog_version() is False
+
+
+def test_gunicorn_application_uses_the_options(monkeypatch):
+    pytest.importorskip("gunicorn")
+    from gunicorn.app.base import BaseApplication
+
+    captured = {}
+    monkeypatch.setattr(BaseApplication, "run", lambda self: captured.update(cfg=self.cfg, app=self.load()))
+    serve.run(serve.gunicorn_options(workers=2, threads=3), {"DATABASE": database.DATABASE,
+                                                            "OVERDUE_SWEEP_BACKGROUND": False})
+    assert captured["cfg"].workers == 2 and captured["cfg"].threads == 3
+    assert captured["cfg"].preload_app is True
+    assert captured["app"].config["DATABASE"] == database.DATABASE
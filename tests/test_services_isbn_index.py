@@ -0,0 +1,74 @@
+import pytest
+
+import services.library_service as ls
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalog():
+    ls.reset_globals()
+    yield
+    ls.reset_globals()
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("0306406152", "9780306406157"),
+    ("0-306-40615-2", "9780306406157"),
+    ("9780306406157", "9780306406157"),
+    ("978-0-306-40615-7", "9780306406157"),
+    ("080442957X", "9780804429573"),
+    ("123", "123"),
+    ("0306406153", "0306406153"),      # wrong check digit: not an ISBN-10
+    ("123456789x", "9781234567897"),
+    (None, ""),
+])
+def test_normalize_isbn(raw, expected):
+    assert ls.normalize_isbn(raw) == expected
+
+
+def test_isbn10_and_isbn13_hit_same_book():
+    ls.add_book_to_catalog("Lab Notes", "Author", "9780306406157", 1)
+    assert ls.get_book_by_isbn("0306406152")["title"] == "Lab Notes"
+    assert ls.get_book_by_isbn("9780306406157")["title"] == "Lab Notes"
+
+    success, message = ls.add_book_to_catalog("Same Book", "Author", "0306406152", 1)
+    assert not success and "already exists" in message
+
+
+def test_isbns_differing_in_the_last_digit_stay_distinct():
+    assert ls.add_book_to_catalog("A", "B", "1234567890", 1) == (True, "Book added successfully.")
+    assert ls.add_book_to_catalog("C", "D", "1234567891", 1) == (True, "Book added successfully.")
+    assert ls.get_book_by_isbn("1234567890")["title"] == "A"
+    assert ls.get_book_by_isbn("1234567891")["title"] == "C"
+    assert ls.get_book_by_isbn("1234567892") is None
+
+
+def test_unknown_isbn_misses():
+    ls.add_book_to_catalog("Lab Notes", "Author", "9780306406157", 1)
+    assert ls.get_book_by_isbn("9780306406158") is None
+    assert ls.get_book_by_isbn("") is None
+
+
+def test_every_mutation_path_updates_index():
+    ls.insert_book({"title": "Inserted", "author": "A", "isbn": "1111111111111"})
+    assert ls.get_book_by_isbn("1111111111111")["title"] == "Inserted"
+
+    ls.reset_globals()
+    assert ls.isbn_index == {}
+    assert ls.get_book_by_isbn("1111111111111") is None
+
+    ls.catalog[50] = {"book_id": 50, "title": "Direct", "author": "A", "isbn": "2222222222222"}
+    assert ls.get_book_by_isbn("2222222222222")["book_id"] == 50
+
+
+def test_search_by_isbn_uses_normalized_index():
+    ls.add_book_to_catalog("Lab Notes", "Author", "9780306406157", 1)
+    ls.add_book_to_catalog("Other", "Author", "9781111111111", 1)
+    assert [b["title"] for b in ls.search_books_in_catalog(isbn="0-306-40615-2")] == ["Lab Notes"]
+    assert ls.search_books_in_catalog(isbn="0306406152", title="other") == []
+
+
+def test_bulk_load_checks_duplicates_through_index():
+    for i in range(3000):
+        assert ls.add_book_to_catalog(f"Book {i}", "Author", f"{9790000000000 + i}", 1)[0]
+    assert len(ls.isbn_index) == 3000
+    assert ls.add_book_to_catalog("Dup", "Author", "9790000000042", 1)[0] is False
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.library_service as ls
+
+
+@pytest.fixture(autouse=True)
+def fresh_state():
+    ls.reset_globals()
+    yield
+    ls.reset_globals()
+
+
+def add_books(count):
+    for i in range(count):
+        ls.add_book_to_catalog(f"Book {i}", "Author", f"{9780000000000 + i}", 2)
+    return list(ls.catalog)
+
+
+def test_borrow_and_return_move_loans_between_sets():
+    first, second = add_books(2)
+    assert ls.borrow_book_by_patron("123456", first)[0]
+    assert ls.borrow_book_by_patron("123456", second)[0]
+    assert ls.borrow_book_by_patron("654321", first)[0]
+
+    assert [r["book_id"] for r in ls.get_patron_borrowed_books("123456")] == [first, second]
+    assert ls.get_patron_borrow_count("123456") == 2
+    assert ls.get_patron_borrow_count("654321") == 1
+
+    assert ls.return_book_by_patron("123456", first)[0]
+    assert list(ls.patron_loans["123456"]["active"]) == [f"123456_{second}"]
+    assert list(ls.patron_loans["123456"]["returned"]) == [f"123456_{first}"]
+    assert [r["book_id"] for r in ls.get_patron_borrowed_books("123456")] == [second]
+    assert ls.get_patron_borrow_count("123456") == 1
+
+
+def test_insert_borrow_record_is_indexed():
+    ls.insert_borrow_record({"patron_id": "111111", "book_id": 7, "due_date": datetime.now()})
+    ls.insert_borrow_record({"patron_id": "111111", "book_id": 8, "returned": True})
+    assert [r["book_id"] for r in ls.get_patron_borrowed_books("111111")] == [7]
+    assert list(ls.patron_loans["111111"]["returned"]) == ["111111_8"]
+
+
+def test_unknown_patron_has_no_loans():
+    add_books(1)
+    assert ls.get_patron_borrowed_books("999999") == []
+    assert ls.get_patron_borrow_count("999999") == 0
+
+
+def test_late_fee_and_report_use_index():
+    (book_id,) = add_books(1)
+    ls.borrow_book_by_patron("222222", book_id)
+    ls.borrowed_books[f"222222_{book_id}"]["due_date"] = datetime.now() - timedelta(days=4, hours=1)
+    assert ls.calculate_late_fee_for_book("222222", book_id)["fee_amount"] == 2.0
+    report = ls.get_patron_status_report("222222")
+    assert report["books_currently_borrowed"] == 1
+    assert report["total_late_fees"] == 2.0
+
+
+def test_direct_changes_to_borrowed_books_trigger_rebuild():
+    ls.borrowed_books["333333_1"] = {"patron_id": "333333", "book_id": 1, "returned": False}
+    assert ls.get_patron_borrow_count("333333") == 1
+    ls.borrowed_books.clear()
+    assert ls.get_patron_borrow_count("333333") == 0
+
+
+def test_replacing_a_record_in_place_triggers_rebuild():
+    ls.insert_borrow_record({"patron_id": "333333", "book_id": 1})
+    assert ls.get_patron_borrow_count("333333") == 1
+    # Same key, same number of records, different patron
+    ls.borrowed_books["333333_1"] = {"patron_id": "444444", "book_id": 1, "returned": False}
+    assert ls.get_patron_borrowed_books("333333") == []
+    assert [r["book_id"] for r in ls.get_patron_borrowed_books("444444")] == [1]
+
+
+def test_lookup_only_touches_that_patrons_records():
+    for i in range(2000):
+        ls.insert_borrow_record({"patron_id": f"{100000 + i}", "book_id": 1})
+    ls.insert_borrow_record({"patron_id": "999999", "book_id": 2})
+    assert len(ls.patron_loans["999999"]["active"]) == 1
+    assert [r["book_id"] for r in ls.get_patron_borrowed_books("999999")] == [2]
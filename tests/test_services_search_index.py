@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+import services.library_service as ls
+
+WORDS = ["python", "gatsby", "great", "tale", "cities", "orwell", "dickens", "ann", "zoë", "data"]
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalog():
+    ls.reset_globals()
+    yield
+    ls.reset_globals()
+
+
+def reference_search(query=None, author=None, title=None, isbn=None):
+    """The original linear scan."""
+    results = []
+    for book in ls.catalog.values():
+        if query and not any(query.lower() in book[k].lower() for k in ("title", "author", "isbn")):
+            continue
+        if author and author.lower() not in book["author"].lower():
+            continue
+        if title and title.lower() not in book["title"].lower():
+            continue
+        if isbn and isbn != book["isbn"]:
+            continue
+        results.append(book)
+    return results
+
+
+def seed(count=300):
+    rng = random.Random(7)
+    for i in range(count):
+        title = " ".join(rng.choice(WORDS).title() for _ in range(3))
+        author = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).upper()}"
+        ls.add_book_to_catalog(title, author, f"{9780000000000 + i}", 1)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"query": "great"}, {"query": "GREAT"}, {"query": "py"}, {"query": "z"},
+    {"query": "97800000001"}, {"title": "tale cit"}, {"author": "orwell"},
+    {"author": "ZOË"}, {"query": "data", "author": "ann"},
+    {"title": "gatsby", "isbn": "9780000000042"}, {"isbn": "9780000000007"},
+    {"query": "no such words"}, {},
+])
+def test_index_matches_linear_scan(kwargs):
+    seed()
+    assert ls.search_books_in_catalog(**kwargs) == reference_search(**kwargs)
+
+
+def test_non_string_filters_match_nothing():
+    seed(5)
+    assert ls.search_books_in_catalog(query=123) == []
+    assert ls.search_books_in_catalog(author=["x"]) == []
+
+
+def test_candidates_scale_with_matches_not_catalog():
+    seed()
+    ls.add_book_to_catalog("Unique Quokka Story", "Someone", "1234567890", 1)
+    assert ls._substring_candidates("quokka") == {ls.catalog_id_counter}
+
+
+def test_insert_book_is_indexed():
+    book_id = ls.insert_book({"title": "Direct Insert", "author": "Tester", "isbn": "1111111111"})
+    assert [b["book_id"] for b in ls.search_books_in_catalog(title="insert")] == [book_id]
+
+
+def test_reset_and_direct_catalog_changes_rebuild_index():
+    seed(10)
+    ls.reset_globals()
+    assert ls.trigram_index == {}
+    assert ls.search_books_in_catalog(query="a") == []
+
+    ls.catalog[99] = {"book_id": 99, "title": "Sneaky", "author": "Direct", "isbn": "5555555555"}
+    assert ls.search_books_in_catalog(query="sneaky") == [ls.catalog[99]]
+
+
+def test_replacing_an_entry_in_place_rebuilds_index():
+    ls.add_book_to_catalog("Old Title", "Someone", "9780306406157", 1)
+    book_id = ls.catalog_id_counter
+    ls.catalog[book_id] = {"book_id": book_id, "title": "New Title", "author": "Someone",
+                           "isbn": "9781111111111", "total_copies": 1, "available_copies": 1}
+    assert [b["title"] for b in ls.search_books_in_catalog(title="new")] == ["New Title"]
+    assert ls.search_books_in_catalog(title="old") == []
+    assert ls.get_book_by_isbn("9781111111111")["title"] == "New Title"
+    assert ls.get_book_by_isbn("9780306406157") is None
+    assert ls.add_book_to_catalog("Old Title", "Someone", "9780306406157", 1)[0] is True
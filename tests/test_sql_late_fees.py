@@ -0,0 +1,56 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import library_service
+
+
+pytestmark = pytest.mark.usefixtures("sample_db")
+
+
+def test_sql_fees_match_python_calculator():
+    now = datetime(2025, 6, 1, 9, 30, 15, 250000)
+    rng = random.Random(11)
+    offsets = [timedelta(seconds=rng.randint(-30 * 86400, 40 * 86400), microseconds=rng.randint(0, 999) * 1000)
+               for _ in range(300)]
+    offsets += [timedelta(days=d) for d in (0, 1, 7, 8, 19, 20)]  # exact day boundaries
+    for offset in offsets:
+        database.insert_borrow_record("777777", 1, now - timedelta(days=50), now - offset)
+
+    loans, total = database.get_patron_loans_with_fees("777777", now)
+    assert len(loans) == len(offsets)
+    expected_total = 0.0
+    for loan in loans:
+        expected = library_service._late_fee_for_due_date(loan["due_date"], now)
+        assert loan["days_overdue"] == expected["days_overdue"], loan["due_date"]
+        assert loan["late_fee"] == expected["fee_amount"], loan["due_date"]
+        expected_total += expected["fee_amount"]
+    assert total == round(expected_total, 2)
+
+
+def test_returned_loans_owe_nothing_and_unknown_patron_is_empty():
+    now = datetime.now()
+    database.insert_borrow_record("888888", 1, now - timedelta(days=40), now - timedelta(days=26))
+    database.update_borrow_record_return_date("888888", 1, now)
+    loans, total = database.get_patron_loans_with_fees("888888")
+    assert [(l["late_fee"], l["return_date"] is not None) for l in loans] == [(0.0, True)]
+    assert total == 0.0
+    assert database.get_patron_loans_with_fees("000000") == ([], 0.0)
+
+
+def test_status_report_in_one_query():
+    now = datetime.now()
+    database.insert_borrow_record("123456", 1, now - timedelta(days=30), now - timedelta(days=10, hours=1))
+    database.insert_borrow_record("123456", 2, now - timedelta(days=60), now - timedelta(days=46))
+    database.update_borrow_record_return_date("123456", 2, now - timedelta(days=44))
+
+    report = library_service.get_patron_status_report("123456")
+
+    assert report["num_currently_borrowed"] == 2
+    assert {b["book_id"]: b["late_fee"] for b in report["current_borrowed"]} == {1: 6.5, 3: 0.0}
+    assert report["total_late_fees"] == 6.5
+    history = {b["book_id"]: b for b in report["borrow_history"]}
+    assert set(history) == {1, 2, 3}
+    assert history[2]["return_date"] is not None and history[2]["late_fee"] == 0.0
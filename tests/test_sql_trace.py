@@ -0,0 +1,150 @@
+import logging
+import sqlite3
+
+import pytest
+
+import database
+import metrics
+import sql_trace
+from app import create_app
+
+
+@pytest.fixture
+def app_config():
+    return {"SQL_TRACE_ENABLED": True, "SQL_SLOW_QUERY_MS": 1000.0}
+
+
+@pytest.fixture
+def app(app):
+    yield app
+    sql_trace.install(None)
+
+
+@pytest.fixture
+def tracer(app):
+    tracer = app.extensions["sql_trace"]
+    tracer.reset()
+    return tracer
+
+
+def entry(tracer, fingerprint):
+    return next((row for row in tracer.report() if row["fingerprint"] == fingerprint), None)
+
+
+def test_fingerprint_replaces_literals_and_placeholders():
+    assert sql_trace.fingerprint("SELECT * FROM books\n  WHERE id = 12 AND title = 'It''s'") == \
+        "select * from books where id = ? and title = ?"
+    assert sql_trace.fingerprint("SELECT * FROM books WHERE id = :id -- by id") == \
+        "select * from books where id = ?"
+    assert sql_trace.fingerprint("SELECT * FROM books WHERE id IN (1, 2, 3)") == \
+        sql_trace.fingerprint("SELECT * FROM books WHERE id IN (?, ?)") == \
+        "select * from books where id in (?, ...)"
+    assert sql_trace.fingerprint("SELECT col1 FROM t2 LIMIT -1;") == "select col1 from t2 limit ?"
+
+
+def test_full_scans_resolve_aliases_and_skip_index_scans():
+    sql = "SELECT * FROM borrow_records br JOIN books AS b ON br.book_id = b.id"
+    assert sql_trace.full_scans(sql, ["SCAN br", "SEARCH b USING INTEGER PRIMARY KEY (rowid=?)"]) == \
+        ["borrow_records"]
+    assert sql_trace.full_scans("SELECT count(*) FROM books", ["SCAN books USING COVERING INDEX ix"]) == []
+    assert sql_trace.full_scans("SELECT * FROM patrons", ["SCAN patrons"]) == []
+
+
+def test_statements_are_aggregated_by_fingerprint(app, tracer):
+    for book_id in (1, 2, 3):
+        database.book_cache.clear()
+        database.get_book_by_id(book_id)
+
+    row = entry(tracer, "select * from books where id = ?")
+    assert row["count"] == row["timed"] == 3
+    assert row["total_ms"] >= row["max_ms"] > 0
+    assert row["mean_ms"] == pytest.approx(row["total_ms"] / 3)
+    # The example is the expanded statement from the trace callback
+    assert row["example"] == "SELECT * FROM books WHERE id = 1"
+    assert row["plan"] == ["SEARCH books USING INTEGER PRIMARY KEY (rowid=?)"]
+    assert row["full_scans"] == []
+
+
+def test_implicit_transaction_statements_are_counted_untimed(app, tracer):
+    assert database.insert_borrow_record("123456", 1, database.datetime(2024, 1, 1),
+                                         database.datetime(2024, 1, 15))
+    database.get_book_by_id(1)
+    insert = next(row for row in tracer.report() if row["fingerprint"].startswith("insert into borrow_records"))
+    # The patron_summary trigger's steps are not counted as extra inserts
+    assert insert["count"] == insert["timed"] == 1
+    assert entry(tracer, "begin")["timed"] == 0
+    commit = entry(tracer, "commit")
+    assert commit["count"] >= 1 and commit["timed"] == 0
+
+
+def test_full_scans_of_watched_tables_are_logged_once(app, tracer, caplog):
+    caplog.set_level(logging.WARNING, logger="sql_trace")
+    with database.db_connection() as conn:
+        for _ in range(2):
+            conn.execute("SELECT count(*) FROM borrow_records WHERE current_fee > ?", (0,)).fetchone()
+
+    row = entry(tracer, "select count(*) from borrow_records where current_fee > ?")
+    assert row["count"] == 2
+    assert row["full_scans"] == ["borrow_records"]
+    warnings = [r for r in caplog.records if "Full scan of borrow_records" in r.getMessage()]
+    assert len(warnings) == 1
+    # The EXPLAIN is run outside the timing wrapper and not traced itself
+    assert not any(r["fingerprint"].startswith("explain") for r in tracer.report())
+
+
+def test_slow_queries_are_logged(app, tracer, caplog):
+    caplog.set_level(logging.WARNING, logger="sql_trace")
+    tracer.slow_query_ms = 0
+    database.get_patron_borrow_count("123456")
+    assert tracer.slow_queries == 1
+    assert any("Slow query" in r.getMessage() and "'123456'" in r.getMessage() for r in caplog.records)
+
+
+def test_failed_explain_does_not_break_the_statement(app, tracer):
+    with database.db_connection() as conn:
+        conn.execute("CREATE TEMP TABLE scratch (x)")
+        conn.executemany("INSERT INTO scratch VALUES (?)", [(1,), (2,)])
+        assert conn.execute("SELECT sum(x) FROM scratch").fetchone()[0] == 3
+    assert entry(tracer, "insert into scratch values (?)")["plan"] is None
+    assert entry(tracer, "create temp table scratch (x)")["plan"] is None
+
+
+def test_fingerprints_beyond_the_limit_share_one_entry():
+    tracer = sql_trace.SQLTracer(explain=False, max_fingerprints=2)
+    conn = sqlite3.connect(":memory:")
+    for sql in ("SELECT 1", "SELECT 1 + 1 AS a", "SELECT 2 AS b", "SELECT 3 AS c"):
+        tracer.observe(conn, sql, (), 0.001)
+    assert [row["fingerprint"] for row in tracer.report()] == \
+        ["<other>", "select ?", "select ? + ? as a"]
+    other = next(row for row in tracer.report() if row["fingerprint"] == "<other>")
+    assert other["count"] == 2
+
+
+def test_tracer_keeps_no_state_on_the_connection():
+    tracer = sql_trace.SQLTracer(explain=False)
+    conn = sqlite3.connect(":memory:")
+    tracer.attach(conn)
+    conn.execute("CREATE TABLE t (x)")
+    tracer.observe(conn, "INSERT INTO t VALUES (?)", (1,), 0.001)
+    assert entry(tracer, "create table t (x)")["count"] == 1
+    tracer.detach(conn)
+    assert tracer._pending == {}
+    conn.close()
+    tracer.detach(conn)
+
+
+def test_debug_endpoint_reports_aggregates(app, tracer):
+    response = app.test_client().get("/api/books?limit=2")
+    assert response.status_code == 200
+    data = app.test_client().get("/debug/sql").get_json()
+    assert data["slow_query_ms"] == 1000.0
+    assert any(row["fingerprint"].startswith("select") and "from books" in row["fingerprint"]
+               for row in data["statements"])
+
+
+def test_tracing_is_off_by_default(temp_db):
+    app = create_app({"TESTING": True, "DATABASE": temp_db})
+    assert sql_trace.get_tracer() is None
+    assert "sql_trace" not in app.extensions
+    assert metrics._sql_observers == []
+    assert app.test_client().get("/debug/sql").status_code == 404